@@ -1,27 +1,83 @@
 
-from django.contrib import admin
-from .models import QueueSlot, Token, VisitHistory, CanteenBooking, ActivityLog, Notification
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from .dates import request_dates
+from .events import transition_many
+from .forms import CsvImportForm, QueueSlotForm
+from .importer import import_csv, open_upload
+from .search import FullTextSearchMixin
+from .models import Service, QueueSlot, Token, VisitHistory, CanteenBooking, ActivityLog, DailyRollup, Notification, WaitlistEntry, IdempotencyKey, CanteenSlotCapacity, PriorityPass, NotificationCounter, UserStats, TokenEvent, ProjectorCheckpoint
 from django.urls import path
 from django.shortcuts import render
+from django.db import transaction
 from django.db.models import Count, Avg
-import datetime
+from .waitlist import promote_next
 
 # Customize Admin Headers
 admin.site.site_header = "Digital Queue Token System Admin"
 admin.site.site_title = "Queue System Admin Portal"
 admin.site.index_title = "Welcome to Queue System Admin Panel"
 
+# Staff search users by any indexed field from the standard user admin too
+admin.site.unregister(User)
+
+@admin.register(User)
+class IndexedUserAdmin(FullTextSearchMixin, UserAdmin):
+    pass
+
 @admin.register(Token)
-class TokenAdmin(admin.ModelAdmin):
-    list_display = ('number', 'user', 'slot_service', 'service', 'status', 'issued_at')
-    list_filter = ('status', 'service', 'issued_at')
-    search_fields = ('user__username', 'number', 'slot__service')
-    readonly_fields = ('issued_at',)
+class TokenAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('number', 'user', 'slot_service', 'service', 'lane', 'status', 'issued_at')
+    list_filter = ('status', 'service', 'lane', 'issued_at')
+    search_fields = ('user__username', 'number')
+    # Status only changes through Token.TRANSITIONS, via the actions below
+    readonly_fields = ('status', 'issued_at')
+    fulltext_through = ('user',)
+    actions = ('mark_completed', 'mark_skipped', 'mark_cancelled')
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip().isdigit():
+            results = results | queryset.filter(number=int(search_term))
+        return results, may_have_duplicates
+
+    def save_model(self, request, obj, form, change):
+        # Tokens booked through the site get their service from issue_token()
+        if not obj.service:
+            obj.service = obj.slot.service
+        super().save_model(request, obj, form, change)
 
     def slot_service(self, obj):
         return obj.slot.service if obj.slot else '-'
     slot_service.short_description = 'Slot Service'
 
+    def _transition(self, request, queryset, new_status):
+        with transaction.atomic():
+            tokens = list(queryset.select_related('slot'))
+            moved = transition_many(tokens, new_status, source="staff")
+            for token in moved:
+                promote_next(token.slot)
+        self.message_user(request, f"{len(moved)} token(s) marked {new_status}.", messages.SUCCESS)
+        if len(moved) < len(tokens):
+            self.message_user(
+                request,
+                f"{len(tokens) - len(moved)} token(s) were not active and were left unchanged.",
+                messages.WARNING,
+            )
+
+    @admin.action(description="Mark selected tokens completed")
+    def mark_completed(self, request, queryset):
+        self._transition(request, queryset, "completed")
+
+    @admin.action(description="Mark selected tokens skipped")
+    def mark_skipped(self, request, queryset):
+        self._transition(request, queryset, "skipped")
+
+    @admin.action(description="Mark selected tokens cancelled")
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, "cancelled")
+
 class ReportsAdmin(admin.ModelAdmin):
     
     def get_urls(self):
@@ -33,11 +89,9 @@ class ReportsAdmin(admin.ModelAdmin):
 
     def reports_view(self, request):
         # Generate report data
-        today = datetime.date.today()
-        
         # Example report data
         total_tokens = Token.objects.count()
-        today_tokens = Token.objects.filter(issued_at__date=today).count()
+        today_tokens = Token.objects.filter(**request_dates(request).today_window.lookup('issued_at')).count()
         completed_visits = VisitHistory.objects.filter(outcome='completed').count()
         
         context = {
@@ -48,17 +102,52 @@ class ReportsAdmin(admin.ModelAdmin):
         }
         return render(request, 'admin/core/reports.html', context)
 
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'is_active', 'default_max_tokens', 'average_service_minutes', 'opens_at', 'closes_at', 'position')
+    list_editable = ('is_active', 'position')
+    prepopulated_fields = {'code': ('name',)}
+
 @admin.register(QueueSlot)
 class QueueSlotAdmin(admin.ModelAdmin):
+    form = QueueSlotForm
     list_display = ('id', 'service', 'date', 'start_time', 'end_time', 'max_tokens', 'tokens_count')
     list_filter = ('service', 'date')
     search_fields = ('service',)
     date_hierarchy = 'date'
+    change_list_template = 'admin/core/queueslot/change_list.html'
 
     def tokens_count(self, obj):
         return obj.tokens.count()
     tokens_count.short_description = 'Tokens Booked'
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='core_queueslot_import'),
+        ]
+        return custom_urls + urls
+
+    def import_view(self, request):
+        # Users, slots and pre-booked tokens all come in through here
+        result = None
+        form = CsvImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            result = import_csv(
+                form.cleaned_data['kind'],
+                open_upload(form.cleaned_data['csv_file']),
+                dry_run=form.cleaned_data['dry_run'],
+            )
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'result': result,
+            'errors': result['errors'][:200] if result else [],
+            'title': 'Import CSV',
+        }
+        return render(request, 'admin/core/import_csv.html', context)
+
 @admin.register(VisitHistory)
 class VisitHistoryAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "slot_info", "token_number", "outcome", "timestamp")
@@ -80,20 +169,94 @@ class CanteenBookingAdmin(admin.ModelAdmin):
         return obj.purpose[:50] + "..." if len(obj.purpose) > 50 else obj.purpose
     purpose_preview.short_description = 'Purpose'
 
+@admin.register(CanteenSlotCapacity)
+class CanteenSlotCapacityAdmin(admin.ModelAdmin):
+    list_display = ("id", "date", "time_slot", "booked", "capacity")
+    list_filter = ("time_slot", "date")
+    date_hierarchy = 'date'
+
 @admin.register(ActivityLog)
-class ActivityLogAdmin(admin.ModelAdmin):
+class ActivityLogAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("id", "user", "action", "object_type", "timestamp", "message_preview")
     list_filter = ("action", "object_type", "timestamp")
     search_fields = ("user__username", "message")
     readonly_fields = ('timestamp',)
+    fulltext_through = (None, 'user')
 
     def message_preview(self, obj):
         return obj.message[:50] + "..." if len(obj.message) > 50 else obj.message
     message_preview.short_description = 'Message'
 
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ("day", "table", "kind", "count")
+    list_filter = ("table", "kind")
+    date_hierarchy = 'day'
+    readonly_fields = ("table", "kind", "day", "count")
+
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("id", "user", "title", "notification_type", "is_read", "created_at")
     list_filter = ("notification_type", "is_read", "created_at")
     search_fields = ("user__username", "title", "message")
     readonly_fields = ('created_at',)
+    fulltext_through = (None, 'user')
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "slot", "joined_at")
+    list_filter = ("slot__service", "joined_at")
+    search_fields = ("user__username",)
+    readonly_fields = ('joined_at',)
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "endpoint", "key", "status_code", "created_at")
+    list_filter = ("endpoint", "status_code")
+    search_fields = ("key",)
+    readonly_fields = ('created_at',)
+
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ("user", "unread")
+    search_fields = ("user__username",)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ("user", "service", "period", "issued", "active", "completed", "cancelled", "skipped", "expired", "bookings")
+    list_filter = ("service",)
+    search_fields = ("user__username", "period")
+    readonly_fields = ("issued", "active", "completed", "cancelled", "skipped", "expired", "bookings")
+
+
+@admin.register(TokenEvent)
+class TokenEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "number", "service", "user", "source", "created_at")
+    list_filter = ("kind", "source", "service")
+    search_fields = ("user__username",)
+    readonly_fields = [field.name for field in TokenEvent._meta.fields]
+
+    # Append-only: rows are written by core.events, never edited by hand
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProjectorCheckpoint)
+class ProjectorCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("name", "position", "updated_at")
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(PriorityPass)
+class PriorityPassAdmin(admin.ModelAdmin):
+    list_display = ("user", "lane", "reason", "service", "valid_from", "valid_until")
+    list_filter = ("lane", "reason", "service")
+    search_fields = ("user__username", "note")
+    raw_id_fields = ("user",)
@@ -0,0 +1,175 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dates import local_window
+from .models import Token, VisitHistory
+
+try:
+    import numpy as np
+except ImportError:  # the analytics page explains the missing dependency
+    np = None
+
+FETCH_CHUNK_SIZE = 20000
+PERCENTILES = (50, 75, 90, 95, 99)
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def numpy_available():
+    return np is not None
+
+
+def columns(queryset, fields):
+    """Stream `fields` through values_list().iterator() into one list per column."""
+    data = [[] for _ in fields]
+    appenders = [column.append for column in data]
+    for row in queryset.values_list(*fields).iterator(chunk_size=FETCH_CHUNK_SIZE):
+        for append, value in zip(appenders, row):
+            append(value)
+    return data
+
+
+def _keys(slot_ids, numbers):
+    """One int64 per (slot, token number) pair."""
+    return (np.array(slot_ids, dtype=np.int64) << 32) | np.array(numbers, dtype=np.int64)
+
+
+def epoch_seconds(datetimes):
+    return np.fromiter(
+        (value.timestamp() if value is not None else np.nan for value in datetimes),
+        dtype=np.float64, count=len(datetimes),
+    )
+
+
+def _local_seconds(epoch):
+    """UTC epoch seconds -> local wall-clock seconds, resolving the offset once per distinct hour."""
+    if not len(epoch):
+        return epoch
+    tz = timezone.get_current_timezone()
+    hours, inverse = np.unique(epoch // 3600, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(hour * 3600, dt_timezone.utc).astimezone(tz).utcoffset().total_seconds()
+        for hour in hours
+    ])
+    return epoch + offsets[inverse]
+
+
+def _wait_summary(waits):
+    if not len(waits):
+        return {"count": 0, "mean": None, **{f"p{p}": None for p in PERCENTILES}}
+    values = np.percentile(waits, PERCENTILES)
+    return {
+        "count": int(len(waits)),
+        "mean": round(float(waits.mean()), 1),
+        **{f"p{p}": round(float(value), 1) for p, value in zip(PERCENTILES, values)},
+    }
+
+
+def compute_analytics(start, end):
+    """
+    Wait-time percentiles (issued to completed, in minutes), mean arrivals per
+    hour of day and per-service weekday x hour arrival heatmaps for tokens
+    issued on the local dates start..end inclusive. Everything after the two
+    column pulls is vectorized.
+    """
+    started = time.monotonic()
+    window_start, window_end = local_window(start, end)
+    days = (end - start).days + 1
+
+    # Arrivals: one row per token issued in the window
+    token_slots, token_numbers, services, issued = columns(
+        Token.objects.filter(issued_at__gte=window_start, issued_at__lt=window_end)
+        .annotate(service_name=Coalesce("service", "slot__service"))
+        .order_by(),
+        ("slot_id", "number", "service_name", "issued_at"),
+    )
+    issued_epoch = epoch_seconds(issued)
+    issued_local = _local_seconds(issued_epoch)
+    hour = (issued_local // 3600 % 24).astype(np.int64)
+    weekday = ((issued_local // 86400 + 3) % 7).astype(np.int64)  # 1970-01-01 was a Thursday
+    service_names, service_codes = np.unique(np.array(services, dtype=str), return_inverse=True)
+
+    arrivals_per_hour = np.bincount(hour, minlength=24) / days
+    weekday_days = np.bincount((np.arange(days) + start.weekday()) % 7, minlength=7)
+    cells = np.bincount(
+        (service_codes * 7 + weekday) * 24 + hour, minlength=len(service_names) * 7 * 24
+    ).reshape(len(service_names), 7, 24)
+    heatmaps = cells / np.maximum(weekday_days, 1)[None, :, None]
+
+    # Waits: completed visits matched to those tokens on (slot, number) with a
+    # sorted-key search instead of a per-row SQL join. A day of slack catches
+    # tokens issued late on the last day.
+    visit_slots, visit_numbers, completed = columns(
+        VisitHistory.objects.filter(
+            outcome="completed", slot__isnull=False,
+            timestamp__gte=window_start, timestamp__lt=window_end + timedelta(days=1),
+        ).order_by(),
+        ("slot_id", "token_number", "timestamp"),
+    )
+    token_keys = _keys(token_slots, token_numbers)
+    visit_keys = _keys(visit_slots, visit_numbers)
+    order = np.argsort(token_keys)
+    positions = np.minimum(np.searchsorted(token_keys[order], visit_keys), max(len(order) - 1, 0))
+    matched = token_keys[order][positions] == visit_keys if len(order) else np.zeros(len(visit_keys), bool)
+    token_index = order[positions[matched]]
+
+    waits = (epoch_seconds(completed)[matched] - issued_epoch[token_index]) / 60
+    wait_codes = service_codes[token_index]
+    valid = waits >= 0
+    waits, wait_codes = waits[valid], wait_codes[valid]
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": days,
+        "tokens": int(len(issued)),
+        "completed": int(len(waits)),
+        "wait_minutes": {
+            "overall": _wait_summary(waits),
+            "by_service": {
+                service_names[code].item(): _wait_summary(waits[wait_codes == code])
+                for code in np.unique(wait_codes).tolist()
+            },
+        },
+        "arrivals_per_hour": np.round(arrivals_per_hour, 2).tolist(),
+        "peak_hour": int(arrivals_per_hour.argmax()) if len(issued) else None,
+        "heatmaps": {
+            service: np.round(heatmaps[index], 2).tolist()
+            for index, service in enumerate(service_names.tolist())
+        },
+        "elapsed": round(time.monotonic() - started, 3),
+    }
+
+
+def get_analytics(start, end):
+    """compute_analytics, cached per date range for ANALYTICS_CACHE_SECONDS."""
+    key = f"analytics:{start.isoformat()}:{end.isoformat()}"
+    result = cache.get(key)
+    if result is None:
+        result = compute_analytics(start, end)
+        cache.set(key, result, settings.ANALYTICS_CACHE_SECONDS)
+    return result
+
+
+def arrival_bars(result):
+    """(hour, rate, width %) rows for the hourly arrivals chart."""
+    rates = result["arrivals_per_hour"]
+    peak = max(rates) or 1
+    return [(hour, rate, round(rate / peak * 100)) for hour, rate in enumerate(rates)]
+
+
+def heatmap_tables(result):
+    """{service: [(weekday, [(value, opacity), ...24]), ...7]} for the template."""
+    tables = {}
+    for service, grid in result["heatmaps"].items():
+        peak = max(max(row) for row in grid) or 1
+        tables[service] = [
+            (WEEKDAYS[day], [(value, round(math.sqrt(value / peak), 2)) for value in row])
+            for day, row in enumerate(grid)
+        ]
+    return tables
@@ -1,6 +1,30 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if settings.TOKEN_EXPIRY_SWEEP_INTERVAL and _is_serving_process():
+            from .expiry import start_expiry_scheduler
+            start_expiry_scheduler()
+        if settings.REPLICA_REFRESH_INTERVAL and _is_serving_process():
+            from .replica import start_replica_refresher
+            start_replica_refresher()
+        if settings.TOKEN_EVENT_PROJECTION_INTERVAL and _is_serving_process():
+            from .events import start_event_projector
+            start_event_projector()
+
+
+def _is_serving_process():
+    """True for WSGI/ASGI workers and the reloaded runserver child, not other commands."""
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    return sys.argv[1:2] == ['runserver'] and os.environ.get('RUN_MAIN') == 'true'
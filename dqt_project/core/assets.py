@@ -0,0 +1,142 @@
+import gzip
+import mimetypes
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".map")
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# (Content-Encoding, file suffix), in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def compress_variants(data):
+    """Return {suffix: compressed bytes} for every encoding that actually saves bytes."""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes precompressed .gz (and .br, if brotli
+    is installed) siblings for every hashed text asset during collectstatic.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for hashed_name in sorted(hashed_names):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.write_compressed(hashed_name)
+
+    def write_compressed(self, name):
+        path = self.path(name)
+        with open(path, "rb") as source:
+            data = source.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, body in compress_variants(data).items():
+            with open(path + suffix, "wb") as target:
+                target.write(body)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected yet (a DEBUG checkout): serve the source name.
+            # Anywhere else a missing or stale manifest must fail loudly.
+            if settings.DEBUG:
+                return name
+            raise
+
+
+def accepts_encoding(header, coding):
+    """
+    Whether an Accept-Encoding header allows `coding`: listed (or covered by
+    "*") with a q-value above zero, so "gzip;q=0" refuses gzip.
+    """
+    qualities = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    quality = qualities.get(coding, qualities.get("*", 0.0))
+    return quality > 0
+
+
+@lru_cache(maxsize=1)
+def immutable_names():
+    """Hashed names from the manifest; these never change content, so cache them forever."""
+    return frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+
+def serve_static(request, path):
+    """
+    Serve a collected asset from STATIC_ROOT, picking a precompressed variant
+    the client accepts. Hashed names get a one-year immutable Cache-Control.
+    """
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid path")
+    if not os.path.isfile(fullpath):
+        raise Http404("Asset not found")
+
+    content_type, _ = mimetypes.guess_type(path)
+    accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    encoding, served_path = None, fullpath
+    for token, suffix in ENCODINGS:
+        if accepts_encoding(accepted, token) and os.path.isfile(fullpath + suffix):
+            encoding, served_path = token, fullpath + suffix
+            break
+
+    stat = os.stat(served_path)
+    etag = f'"{int(stat.st_mtime)}-{stat.st_size}{"-" + encoding if encoding else ""}"'
+    if request.META.get("HTTP_IF_NONE_MATCH") == etag:
+        response = HttpResponseNotModified()
+    else:
+        with open(served_path, "rb") as asset:
+            response = HttpResponse(asset.read(), content_type=content_type or "application/octet-stream")
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if path in immutable_names():
+        response["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={settings.STATIC_UNHASHED_MAX_AGE}"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
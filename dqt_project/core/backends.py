@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+# Caches that live in one process: another worker could not invalidate them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def user_cache_enabled():
+    return bool(settings.AUTH_USER_CACHE_SECONDS) and (
+        settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+    )
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class EmailBackend(ModelBackend):
+    """
+    ModelBackend that also signs users in by email, and caches the user that
+    every authenticated request loads from the session.
+
+    Email lookups use the auth_user.email index (migration 0012) and cost one
+    query. Users are cached only when the default cache is shared by every
+    worker (Redis, Memcached, database): saving or deleting a User drops the
+    cached copy for all of them (see core/signals.py), so a changed password,
+    deactivation or revoked is_staff applies on the next request. With a
+    per-process cache such as LocMemCache other workers could keep a stale
+    user, so every request loads the user from the database instead.
+
+    QuerySet.update() sends no signals: code that updates User rows that way
+    must call forget_user() for each of them.
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        if email is None:
+            return super().authenticate(request, username=username, password=password, **kwargs)
+        if password is None:
+            return None
+        UserModel = get_user_model()
+        # email is not unique; accept whichever account the password belongs to
+        candidates = list(UserModel._default_manager.filter(email=email).order_by('pk'))
+        if not candidates:
+            # Hash anyway, so unknown addresses take as long as wrong passwords
+            UserModel().set_password(password)
+            return None
+        for user in candidates:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
+
+    def get_user(self, user_id):
+        if not user_cache_enabled():
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_SECONDS)
+        return user
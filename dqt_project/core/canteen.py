@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import changes, stats
+from .models import ActivityLog, CanteenBooking, CanteenSlotCapacity
+
+AVAILABILITY_VERSION_KEY = "canteen:availability:version"
+
+TIME_SLOTS = [value for value, _ in CanteenBooking.TIME_SLOT_CHOICES]
+TIME_SLOT_LABELS = dict(CanteenBooking.TIME_SLOT_CHOICES)
+
+
+class SeatBookingError(Exception):
+    pass
+
+
+def window_end(time_slot):
+    """Local end time of a window, from its label ('12:00-1:00 PM' ends at 13:00)."""
+    return datetime.strptime(TIME_SLOT_LABELS[time_slot].split('-')[1], '%I:%M %p').time()
+
+
+def window_ended(date, time_slot, now=None):
+    now = timezone.localtime(now)
+    return date < now.date() or (date == now.date() and window_end(time_slot) <= now.time())
+
+
+def window_capacity(time_slot):
+    capacities = settings.CANTEEN_SLOT_CAPACITY
+    return capacities.get(time_slot, capacities['default'])
+
+
+def booking_dates(start=None):
+    start = start or timezone.localdate()
+    return [start + timedelta(days=i) for i in range(settings.CANTEEN_BOOKING_DAYS_AHEAD)]
+
+
+def _ensure_counter(date, time_slot):
+    """Create the counter row on first use, seeded from any existing bookings."""
+    if CanteenSlotCapacity.objects.filter(date=date, time_slot=time_slot).exists():
+        return
+    booked = CanteenBooking.objects.filter(date=date, time_slot=time_slot, status='confirmed').count()
+    try:
+        with transaction.atomic():
+            CanteenSlotCapacity.objects.create(
+                date=date, time_slot=time_slot, capacity=window_capacity(time_slot), booked=booked
+            )
+    except IntegrityError:
+        pass  # Another request created it first
+
+
+def reserve_seat(date, time_slot):
+    """Take one seat with a single conditional UPDATE. Returns True if admitted."""
+    _ensure_counter(date, time_slot)
+    return CanteenSlotCapacity.objects.filter(
+        date=date, time_slot=time_slot, booked__lt=F('capacity')
+    ).update(booked=F('booked') + 1) == 1
+
+
+def release_seat(date, time_slot):
+    CanteenSlotCapacity.objects.filter(
+        date=date, time_slot=time_slot, booked__gt=0
+    ).update(booked=F('booked') - 1)
+
+
+def candidate_windows(time_slot, flexible):
+    """The requested window first, then (if flexible) the others nearest in time."""
+    if not flexible:
+        return [time_slot]
+    index = TIME_SLOTS.index(time_slot)
+    return sorted(TIME_SLOTS, key=lambda slot: (abs(TIME_SLOTS.index(slot) - index), TIME_SLOTS.index(slot)))
+
+
+def book_seat(user, date, time_slot, purpose="", flexible=False):
+    """
+    Book a canteen seat, spilling over to the nearest window with room when
+    `flexible` so peak-hour demand spreads across windows.
+
+    One confirmed seat per user per window: windows the user already holds,
+    and windows that have already ended, are never booked. Raises
+    SeatBookingError if the requested window is one of them; returns the
+    booking, or None if every candidate window is full.
+    """
+    if window_ended(date, time_slot):
+        raise SeatBookingError(f"The {TIME_SLOT_LABELS[time_slot]} window on {date} has already ended.")
+    with transaction.atomic():
+        held = set(
+            CanteenBooking.objects.filter(user=user, date=date, status='confirmed').values_list('time_slot', flat=True)
+        )
+        if time_slot in held:
+            raise SeatBookingError(f"You already have a seat for {date} @ {TIME_SLOT_LABELS[time_slot]}.")
+        for window in candidate_windows(time_slot, flexible):
+            if window in held or window_ended(date, window) or not reserve_seat(date, window):
+                continue
+            try:
+                with transaction.atomic():
+                    booking = CanteenBooking.objects.create(
+                        user=user, date=date, time_slot=window, purpose=purpose, status='confirmed'
+                    )
+            except IntegrityError:
+                # A concurrent request from the same user took this window first;
+                # raising rolls the seat reservation back with it
+                raise SeatBookingError(f"You already have a seat for {date} @ {TIME_SLOT_LABELS[window]}.")
+            stats.booking_made(booking)
+            ActivityLog.objects.create(
+                user=user,
+                action='booking_made',
+                message=f'Canteen seat booked for {date} @ {TIME_SLOT_LABELS[window]}',
+                object_type='CanteenBooking'
+            )
+            break
+        else:
+            return None
+    invalidate_availability()
+    return booking
+
+
+def cancel_seat(booking):
+    with transaction.atomic():
+        updated = CanteenBooking.objects.filter(id=booking.id, status='confirmed').update(status='cancelled')
+        if updated:
+            release_seat(booking.date, booking.time_slot)
+            changes.record(CanteenBooking, [booking.id])
+    if updated:
+        invalidate_availability()
+    return bool(updated)
+
+
+def invalidate_availability():
+    try:
+        cache.incr(AVAILABILITY_VERSION_KEY)
+    except ValueError:
+        cache.set(AVAILABILITY_VERSION_KEY, 1, None)
+
+
+def availability(start=None):
+    """
+    Seats per window for the bookable days, as
+    [{'date': date, 'windows': [{'time_slot', 'label', 'capacity', 'booked', 'remaining'}]}].
+
+    Built from one query over the counters (windows without a counter row
+    fall back to one grouped count over bookings) and cached until the next
+    booking or cancellation.
+    """
+    dates = booking_dates(start)
+    version = cache.get_or_set(AVAILABILITY_VERSION_KEY, 1, None)
+    cache_key = f"canteen:availability:{version}:{dates[0].isoformat()}:{len(dates)}"
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    counters = {
+        (date, slot): (capacity, booked)
+        for date, slot, capacity, booked in CanteenSlotCapacity.objects.filter(
+            date__range=(dates[0], dates[-1])
+        ).values_list('date', 'time_slot', 'capacity', 'booked')
+    }
+    if len(counters) < len(dates) * len(TIME_SLOTS):
+        booked_counts = {
+            (row['date'], row['time_slot']): row['total']
+            for row in CanteenBooking.objects.filter(
+                date__range=(dates[0], dates[-1]), status='confirmed'
+            ).values('date', 'time_slot').annotate(total=Count('id')).order_by()
+        }
+    else:
+        booked_counts = {}
+
+    result = []
+    for date in dates:
+        windows = []
+        for slot in TIME_SLOTS:
+            capacity, booked = counters.get(
+                (date, slot), (window_capacity(slot), booked_counts.get((date, slot), 0))
+            )
+            windows.append({
+                'time_slot': slot,
+                'label': TIME_SLOT_LABELS[slot],
+                'capacity': capacity,
+                'booked': booked,
+                'remaining': max(0, capacity - booked),
+            })
+        result.append({'date': date, 'windows': windows})
+
+    cache.set(cache_key, result, settings.CANTEEN_AVAILABILITY_CACHE_SECONDS)
+    return result
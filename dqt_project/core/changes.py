@@ -0,0 +1,124 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, F, Max, OuterRef
+from django.utils import timezone
+
+from .models import CanteenBooking, Change, QueueSlot, Token
+
+# Feed table -> (model, fields sent for a changed row); `user` goes out as "username".
+FEEDS = {
+    "token": (Token, ("id", "number", "status", "service", "lane", "slot_id", "user", "issued_at")),
+    "slot": (QueueSlot, ("id", "service", "date", "start_time", "end_time", "max_tokens")),
+    "booking": (CanteenBooking, ("id", "user", "date", "time_slot", "status")),
+}
+TABLES = {model: table for table, (model, _) in FEEDS.items()}
+
+COMPACT_CHUNK_SIZE = 1000
+# Rows can be created a moment before the cursor that follows them is
+# issued (the transaction is still open), so cursors expire this much early.
+CURSOR_SLACK = timedelta(minutes=1)
+
+
+def record(model, ids, deleted=False):
+    """Append one change per id. Call from every write path that skips the model signals."""
+    table = TABLES[model]
+    Change.objects.bulk_create([Change(table=table, object_id=pk, deleted=deleted) for pk in ids])
+
+
+def _retention():
+    return timedelta(hours=settings.CHANGE_FEED_RETENTION_HOURS)
+
+
+def make_cursor(seq, now=None):
+    """Opaque "<seq>.<issued epoch>" cursor; the time tells how old the reader's view is."""
+    return f"{seq}.{int((now or timezone.now()).timestamp())}"
+
+
+def parse_cursor(cursor, now=None):
+    """The sequence number to read after, or None when the reader must reload in full."""
+    try:
+        seq, issued = (int(part) for part in cursor.split("."))
+    except (AttributeError, ValueError):
+        return None
+    now = now or timezone.now()
+    # Older cursors may predate rows compaction has since removed
+    if issued < (now - _retention() + CURSOR_SLACK).timestamp():
+        return None
+    return seq
+
+
+def current_cursor(now=None):
+    """Cursor for a page rendered now: the reader starts from the feed's head."""
+    return make_cursor(Change.objects.aggregate(head=Max("id"))["head"] or 0, now)
+
+
+def _rows(model, fields, ids):
+    queryset = model.objects.filter(id__in=ids).order_by()
+    if "user" in fields:
+        queryset = queryset.annotate(username=F("user__username"))
+        fields = tuple("username" if field == "user" else field for field in fields)
+    return {row["id"]: row for row in queryset.values(*fields)}
+
+
+def changes_since(cursor, limit=None, now=None):
+    """
+    Everything written after `cursor`, at most `limit` change rows per call:
+    {'cursor', 'reset', 'more', 'changes': {table: {'upserted': [row, ...],
+    'deleted': [id, ...]}}}. Several writes to one object collapse into its
+    current row. 'reset' means the cursor is missing, malformed or older
+    than the retained history and the reader should reload its whole view.
+    """
+    now = now or timezone.now()
+    limit = limit or settings.CHANGE_FEED_PAGE_SIZE
+    since = parse_cursor(cursor, now)
+    if since is None:
+        return {"cursor": current_cursor(now), "reset": True, "more": False, "changes": {}}
+
+    rows = list(Change.objects.filter(id__gt=since).order_by("id").values_list("id", "table", "object_id")[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    touched = {}
+    for _, table, object_id in rows:
+        touched.setdefault(table, set()).add(object_id)
+
+    changes = {}
+    for table, ids in touched.items():
+        model, fields = FEEDS[table]
+        current = _rows(model, fields, ids)
+        changes[table] = {
+            "upserted": [current[pk] for pk in sorted(current)],
+            # Gone from the table, whatever the last change said
+            "deleted": sorted(ids - current.keys()),
+        }
+    head = rows[-1][0] if rows else since
+    return {"cursor": make_cursor(head, now), "reset": False, "more": more, "changes": changes}
+
+
+def compact(now=None, chunk_size=COMPACT_CHUNK_SIZE):
+    """
+    Drop rows older than CHANGE_FEED_RETENTION_HOURS (their cursors are
+    reset anyway) and, within the window, every row superseded by a newer
+    one for the same object. Returns {'expired', 'superseded', 'elapsed'}.
+    """
+    started = time.monotonic()
+    now = now or timezone.now()
+    expired = superseded = 0
+
+    old = Change.objects.filter(created_at__lt=now - _retention())
+    while True:
+        ids = list(old.order_by("id").values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            break
+        expired += Change.objects.filter(id__in=ids).delete()[0]
+
+    newer = Change.objects.filter(table=OuterRef("table"), object_id=OuterRef("object_id"), id__gt=OuterRef("id"))
+    stale = Change.objects.filter(Exists(newer))
+    while True:
+        ids = list(stale.order_by("id").values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            break
+        superseded += Change.objects.filter(id__in=ids).delete()[0]
+
+    return {"expired": expired, "superseded": superseded, "elapsed": time.monotonic() - started}
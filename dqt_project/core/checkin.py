@@ -0,0 +1,77 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .events import transition_many
+from .models import Token
+from .waitlist import promote_next
+
+SALT = "core.checkin"
+
+_signer = signing.Signer(salt=SALT)
+
+
+class CheckinError(Exception):
+    pass
+
+
+def _window(slot):
+    """(not before, expires) epoch seconds around the slot's local start and end."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(slot.date, slot.start_time), tz)
+    end = timezone.make_aware(datetime.combine(slot.date, slot.end_time), tz)
+    return (
+        int((start - timedelta(minutes=settings.CHECKIN_EARLY_MINUTES)).timestamp()),
+        int((end + timedelta(minutes=settings.CHECKIN_GRACE_MINUTES)).timestamp()),
+    )
+
+
+def checkin_payload(token):
+    """
+    Compact signed string for the token's QR code: [id, slot, number,
+    service, not before, expires] plus an HMAC under SECRET_KEY. The slot
+    must be loaded (select_related) so this costs no query.
+    """
+    not_before, expires = _window(token.slot)
+    return _signer.sign_object([token.pk, token.slot_id, token.number, token.service, not_before, expires])
+
+
+def verify_payload(payload, service=None, now=None):
+    """
+    Check a scanned payload with nothing but the secret and the clock.
+    Returns the decoded fields or raises CheckinError with a reason a person
+    at the counter can act on.
+    """
+    try:
+        token_id, slot_id, number, token_service, not_before, expires = _signer.unsign_object(payload)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise CheckinError("Not a valid token code.")
+    now = (now or timezone.now()).timestamp()
+    if service and token_service != service:
+        raise CheckinError(f"Token #{number} is for {token_service}, not this counter.")
+    if now < not_before:
+        raise CheckinError(f"Token #{number} is for a later slot.")
+    if now > expires:
+        raise CheckinError(f"Token #{number} has expired.")
+    return {"token_id": token_id, "slot_id": slot_id, "number": number, "service": token_service}
+
+
+def complete_checkins(token_ids):
+    """
+    Complete a scanner's batch of verified tokens in one transaction, then
+    hand each freed seat to its waitlist. Returns the ids that were completed;
+    the rest had already left the queue.
+    """
+    with transaction.atomic():
+        tokens = list(Token.objects.filter(id__in=token_ids, status="active").select_related("slot"))
+        completed = transition_many(tokens, "completed", source="staff")
+        slots = {token.slot_id: token.slot for token in completed}
+        for slot_id, freed in Counter(token.slot_id for token in completed).items():
+            for _ in range(freed):
+                if promote_next(slots[slot_id]) is None:
+                    break
+    return [token.pk for token in completed]
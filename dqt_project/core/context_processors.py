@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .notifications import unread_count
+from .services import active_services
+
+
+def notifications(request):
+    """Unread badge count, only queried if a template actually renders it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications': SimpleLazyObject(lambda: unread_count(user))}
+
+
+def layout_cache(request):
+    """Timeout for the {% cache %} fragments around shared layout blocks."""
+    return {'layout_cache_seconds': settings.LAYOUT_FRAGMENT_CACHE_SECONDS}
+
+
+def services(request):
+    """Active services from the in-process registry, for menus and quick actions."""
+    return {'services': SimpleLazyObject(active_services)}
@@ -0,0 +1,61 @@
+from datetime import datetime, time as dtime, timedelta
+from typing import NamedTuple
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Window(NamedTuple):
+    """
+    Aware [start, end) bounds of a run of local calendar days. Filtering a
+    timestamp column against them compares the bare column, so its index is
+    used; `__date`/`__year`/`__day` lookups wrap the column in a time zone
+    conversion that no index can serve.
+    """
+    start: datetime
+    end: datetime
+
+    def lookup(self, field):
+        return {f'{field}__gte': self.start, f'{field}__lt': self.end}
+
+    def q(self, field):
+        return Q(**self.lookup(field))
+
+
+def local_window(first, last):
+    """The window covering the local dates first..last inclusive."""
+    tz = timezone.get_current_timezone()
+    return Window(
+        timezone.make_aware(datetime.combine(first, dtime.min), tz),
+        timezone.make_aware(datetime.combine(last + timedelta(days=1), dtime.min), tz),
+    )
+
+
+class RequestDates:
+    """Today's local date and the windows a request asks for, each computed once."""
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.today = timezone.localdate(self.now)
+        self._windows = {}
+
+    def days(self, first, last):
+        key = (first, last)
+        if key not in self._windows:
+            self._windows[key] = local_window(first, last)
+        return self._windows[key]
+
+    @property
+    def today_window(self):
+        return self.days(self.today, self.today)
+
+    def since(self, days_ago):
+        """From the start of the local day `days_ago` days back to the end of today."""
+        return self.days(self.today - timedelta(days=days_ago), self.today)
+
+
+def request_dates(request):
+    dates = getattr(request, '_dates', None)
+    if dates is None:
+        dates = request._dates = RequestDates()
+    return dates
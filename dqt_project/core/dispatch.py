@@ -0,0 +1,208 @@
+import heapq
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .changes import changes_since, current_cursor
+from .models import PriorityPass, QueueSlot, Token
+from .services import service_minutes
+
+DISPATCH_DEFAULTS = {
+    # Share of desk time each lane gets while it has tokens waiting
+    'LANE_WEIGHTS': {'priority': 3, 'standard': 1},
+    # Share of desk time per service when desks serve several (default 1)
+    'SERVICE_WEIGHTS': {},
+    # A token that has waited this long is called next whatever its lane
+    'MAX_WAIT_MINUTES': 30,
+}
+
+
+def dispatch_settings():
+    return {**DISPATCH_DEFAULTS, **getattr(settings, 'DISPATCH', {})}
+
+
+def lanes_for(user_ids, service, today=None):
+    """{user_id: lane} for users holding a current PriorityPass for `service`; everyone else is standard."""
+    today = today or timezone.localdate()
+    passes = PriorityPass.objects.filter(
+        Q(service="") | Q(service=service),
+        Q(valid_until__isnull=True) | Q(valid_until__gte=today),
+        user_id__in=user_ids, valid_from__lte=today,
+    ).values_list("user_id", "lane")
+    weights = dispatch_settings()['LANE_WEIGHTS']
+    lanes = {}
+    for user_id, lane in passes:
+        # Several passes: the heaviest lane wins
+        if weights.get(lane, 1) > weights.get(lanes.get(user_id), 0):
+            lanes[user_id] = lane
+    return lanes
+
+
+def _slot_start(slot_date, start_time):
+    return timezone.make_aware(datetime.combine(slot_date, start_time))
+
+
+def waiting_since(token):
+    """A token booked ahead starts waiting when its slot opens, not when it was issued."""
+    return max(_slot_start(token.slot.date, token.slot.start_time), token.issued_at)
+
+
+def _waiting_since(entry):
+    slot_start, issued_at, _ = entry
+    return max(slot_start, issued_at)
+
+
+class Dispatcher:
+    """
+    Picks the next tokens for a desk with start-time fair queuing across
+    (service, lane) queues.
+
+    Each queue is a heap of its active tokens ordered by slot start, then
+    issue time. A queue's virtual time advances by service minutes / weight
+    each time one of its tokens is served or skipped, and the ready queue
+    with the lowest virtual time goes next, so a lane of weight 3 gets three
+    times the desk time of a lane of weight 1 while both have tokens
+    waiting. A queue that empties and refills restarts at the current
+    virtual time rather than cashing in the time it sat idle. Any token that
+    has waited past MAX_WAIT_MINUTES since its slot opened (or since it was
+    issued, if later) goes first, longest-waiting first, so no lane can
+    starve another.
+
+    The heaps live in process memory and follow Token through the change
+    feed: each call applies what changed since the last one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self._heaps = defaultdict(list)   # (service, lane) -> [(slot start, issued_at, id)]
+        self._entries = {}                # token id -> ((service, lane), heap entry)
+        self._slots = {}                  # slot id -> aware slot start
+        self._vtime = defaultdict(float)
+        self._virtual_now = 0.0
+
+    # -- keeping the heaps in step with Token --
+
+    def _load(self):
+        # Read the head first: anything written while loading is replayed, harmlessly
+        self._cursor = current_cursor()
+        self._heaps.clear()
+        self._entries.clear()
+        rows = Token.objects.filter(status="active").order_by().values_list(
+            "id", "service", "lane", "slot_id", "issued_at", "slot__date", "slot__start_time",
+        )
+        for token_id, service, lane, slot_id, issued_at, slot_date, start_time in rows:
+            self._slots[slot_id] = _slot_start(slot_date, start_time)
+            self._push(token_id, service, lane, slot_id, issued_at)
+
+    def _push(self, token_id, service, lane, slot_id, issued_at):
+        key = (service, lane)
+        if not self._backlogged(key):
+            self._vtime[key] = max(self._vtime[key], self._virtual_now)
+        entry = (self._slots[slot_id], issued_at, token_id)
+        self._entries[token_id] = (key, entry)
+        heapq.heappush(self._heaps[key], entry)
+
+    def _backlogged(self, key):
+        heap = self._heaps[key]
+        while heap and self._entries.get(heap[0][-1], (None, None))[1] != heap[0]:
+            heapq.heappop(heap)
+        return bool(heap)
+
+    def _charge(self, key):
+        self._virtual_now = max(self._virtual_now, self._vtime[key])
+        self._vtime[key] += self._cost(key)
+
+    def _cost(self, key):
+        service, lane = key
+        config = dispatch_settings()
+        weight = config['LANE_WEIGHTS'].get(lane, 1) * config['SERVICE_WEIGHTS'].get(service, 1)
+        return service_minutes(service) / max(weight, 0.01)
+
+    def _apply(self, feed):
+        for slot in feed.get("slot", {}).get("upserted", ()):
+            self._slots[slot["id"]] = _slot_start(slot["date"], slot["start_time"])
+        tokens = feed.get("token")
+        if not tokens:
+            return
+        missing = {row["slot_id"] for row in tokens["upserted"] if row["slot_id"] not in self._slots}
+        if missing:
+            for slot_id, slot_date, start_time in QueueSlot.objects.filter(id__in=missing).values_list(
+                "id", "date", "start_time"
+            ):
+                self._slots[slot_id] = _slot_start(slot_date, start_time)
+        for row in tokens["upserted"]:
+            queued = self._entries.get(row["id"])
+            if row["status"] == "active":
+                if queued is None and row["slot_id"] in self._slots:
+                    self._push(row["id"], row["service"], row["lane"], row["slot_id"], row["issued_at"])
+            elif queued is not None:
+                del self._entries[row["id"]]
+                # Served and skipped tokens used the desk; cancelled and expired ones did not
+                if row["status"] in ("completed", "skipped"):
+                    self._charge(queued[0])
+        for token_id in tokens["deleted"]:
+            self._entries.pop(token_id, None)
+
+    def sync(self):
+        if self._cursor is None:
+            self._load()
+            return
+        while True:
+            feed = changes_since(self._cursor)
+            if feed["reset"]:
+                self._load()
+                return
+            self._cursor = feed["cursor"]
+            self._apply(feed["changes"])
+            if not feed["more"]:
+                return
+
+    # -- picking --
+
+    def next_tokens(self, services=None, count=1, now=None):
+        """Ids of the next `count` tokens a desk serving `services` (default: all) should call, in order."""
+        now = timezone.localtime(now)
+        config = dispatch_settings()
+        overdue = now - timedelta(minutes=config['MAX_WAIT_MINUTES'])
+        with self._lock:
+            self.sync()
+            queues = {}
+            for key, heap in self._heaps.items():
+                if (services and key[0] not in services) or not self._backlogged(key):
+                    continue
+                entries = heapq.nsmallest(
+                    count, (entry for entry in heap if self._entries.get(entry[-1], (None, None))[1] == entry)
+                )
+                ready = [entry for entry in entries if entry[0] <= now]
+                if ready:
+                    queues[key] = ready
+            vtime = {key: self._vtime[key] for key in queues}
+
+        picked = []
+        while len(picked) < count and queues:
+            waits = ((_waiting_since(entries[0]), key) for key, entries in queues.items())
+            starving = [(since, key) for since, key in waits if since <= overdue]
+            if starving:
+                key = min(starving)[1]
+            else:
+                # Equal start tags: the queue that would finish its token first, then the longest wait
+                key = min(queues, key=lambda key: (
+                    vtime[key], vtime[key] + self._cost(key), _waiting_since(queues[key][0]),
+                ))
+            picked.append(queues[key].pop(0)[-1])
+            vtime[key] += self._cost(key)
+            if not queues[key]:
+                del queues[key]
+        return picked
+
+
+_dispatcher = Dispatcher()
+
+
+def next_tokens(services=None, count=1, now=None):
+    return _dispatcher.next_tokens(services=services, count=count, now=now)
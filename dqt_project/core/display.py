@@ -0,0 +1,77 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Token
+from .services import get_service, registry, service_minutes
+
+QUEUE_PREVIEW_LENGTH = 10
+
+
+def _version_key(service):
+    return f"display:version:{service}"
+
+
+def mark_queue_changed(service=None):
+    """Invalidate the display snapshot for one service (or all of them)."""
+    services = [service] if service else list(registry())
+    for name in services:
+        try:
+            cache.incr(_version_key(name))
+        except ValueError:
+            cache.set(_version_key(name), 1, None)
+
+
+def build_snapshot_context(service):
+    """Queue state for one service: now serving, the next tokens and their ETA."""
+    now = timezone.localtime()
+    queue = list(
+        Token.objects.filter(
+            slot__service=service,
+            slot__date=now.date(),
+            slot__end_time__gt=now.time(),
+            status="active",
+        ).select_related("slot").order_by("slot__start_time", "number")[:QUEUE_PREVIEW_LENGTH + 1]
+    )
+    minutes = service_minutes(service)
+    upcoming = [
+        {
+            "number": token.number,
+            "slot_time": token.slot.start_time,
+            "eta_minutes": position * minutes,
+        }
+        for position, token in enumerate(queue[1:], start=1)
+    ]
+    return {
+        "service": service,
+        "service_label": get_service(service).name,
+        "now_serving": queue[0] if queue else None,
+        "upcoming": upcoming,
+        "generated_at": now,
+        "refresh_seconds": settings.DISPLAY_BOARD_TICK_SECONDS,
+    }
+
+
+def get_snapshot(service):
+    """
+    The pre-rendered display page for a service, shared by every screen.
+
+    Returns {'body', 'gzip_body', 'etag'}. A snapshot lives for one tick and
+    is rebuilt early when the service's queue changes.
+    """
+    version = cache.get_or_set(_version_key(service), 1, None)
+    cache_key = f"display:snapshot:{service}:{version}"
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        body = render_to_string("core/monitor.html", build_snapshot_context(service)).encode()
+        snapshot = {
+            "body": body,
+            "gzip_body": gzip.compress(body),
+            "etag": '"%s"' % hashlib.md5(body).hexdigest(),
+        }
+        cache.set(cache_key, snapshot, settings.DISPLAY_BOARD_TICK_SECONDS)
+    return snapshot
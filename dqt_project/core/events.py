@@ -0,0 +1,384 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import changes
+from .dispatch import lanes_for
+from .display import mark_queue_changed
+from .models import (
+    ActivityLog, Notification, ProjectorCheckpoint, QueueSlot, Token, TokenEvent, UserStats, VisitHistory,
+)
+from .notifications import adjust_unread, rebuild_unread_counters
+from .retention import retention_cutoffs
+from .stats import apply_token_deltas, period_for
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_BATCH_SIZE = 500
+TOKEN_NOTIFICATION_TYPES = ('token_ready', 'waitlist_promoted')
+
+_projection_lock = threading.Lock()
+_projector_thread = None
+
+
+# -------------------------
+# WRITE SIDE
+# -------------------------
+
+def _project_after_commit():
+    """Register one projection run per transaction, however many events it appends."""
+    pending = transaction.get_connection().run_on_commit
+    if not any(func is schedule_projection for _, func, _ in pending):
+        transaction.on_commit(schedule_projection)
+
+
+def _event_for(token, kind, source, previous_status=""):
+    return TokenEvent(
+        token_id=token.pk,
+        slot_id=token.slot_id,
+        user_id=token.user_id,
+        service=token.service,
+        number=token.number,
+        issued_at=token.issued_at,
+        kind=kind,
+        previous_status=previous_status,
+        source=source,
+    )
+
+
+def issue_token(slot, user, source="booking"):
+    """Insert the token and its 'issued' event. Call inside the booking transaction."""
+    token = Token.objects.create(
+        slot=slot,
+        user=user,
+        service=slot.service,
+        number=slot.next_token_number(),
+        status="active",
+        lane=lanes_for([user.pk], slot.service).get(user.pk, "standard"),
+    )
+    _event_for(token, "issued", source).save()
+    _project_after_commit()
+    return token
+
+
+def _update_returning():
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def set_status(ids, allowed, new_status):
+    """
+    Move the tokens among `ids` whose status is still in `allowed` to
+    `new_status` with one UPDATE. Returns the ids that actually moved, so
+    callers write events only for those and not for rows another request
+    changed after they were read. Call inside a transaction.
+    """
+    ids = list(ids)
+    if not ids:
+        return []
+    if not _update_returning():
+        # Lock the rows still in `allowed` first: rows another request already
+        # moved to `new_status` must not be reported as moved by this call
+        movable = list(
+            Token.objects.select_for_update().filter(pk__in=ids, status__in=allowed).values_list("pk", flat=True)
+        )
+        Token.objects.filter(pk__in=movable).update(status=new_status)
+        return movable
+    quote = connection.ops.quote_name
+    sql = "UPDATE {} SET {status} = %s WHERE {id} IN ({}) AND {status} IN ({}) RETURNING {id}".format(
+        quote(Token._meta.db_table),
+        ", ".join(["%s"] * len(ids)),
+        ", ".join(["%s"] * len(allowed)),
+        status=quote("status"),
+        id=quote("id"),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [new_status, *ids, *allowed])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def transition(token, new_status, source):
+    """
+    Move the token to `new_status` if Token.TRANSITIONS allows it from the
+    status it was read with: one `UPDATE ... SET status WHERE id AND status
+    IN (allowed)`, then the event insert only if a row changed. Returns
+    False, writing nothing, if the move is not allowed or another request
+    changed the token first.
+    """
+    previous_status = token.status
+    if not token.can_become(new_status):
+        return False
+    allowed = Token.TRANSITIONS[new_status]
+    if not Token.objects.filter(pk=token.pk, status__in=allowed).update(status=new_status):
+        return False
+    token.status = new_status
+    _event_for(token, new_status, source, previous_status).save()
+    changes.record(Token, [token.pk])
+    mark_queue_changed(token.service)
+    _project_after_commit()
+    return True
+
+
+def transition_many(tokens, new_status, source):
+    """
+    transition() for a batch: one compare-and-set UPDATE for every token,
+    one events insert and one projection run. Call inside a transaction.
+    Returns the tokens that moved.
+    """
+    candidates = [token for token in tokens if token.can_become(new_status)]
+    moved_ids = set(set_status([token.pk for token in candidates], Token.TRANSITIONS[new_status], new_status))
+    moved = [token for token in candidates if token.pk in moved_ids]
+    events = []
+    for token in moved:
+        events.append(_event_for(token, new_status, source, token.status))
+        token.status = new_status
+    if events:
+        TokenEvent.objects.bulk_create(events)
+        changes.record(Token, [token.pk for token in moved])
+        for service in {token.service for token in moved}:
+            mark_queue_changed(service)
+        _project_after_commit()
+    return moved
+
+
+def record_expired(rows):
+    """Bulk events for the expiry sweep; rows are (token_id, user_id, slot_id, number, service, issued_at)."""
+    TokenEvent.objects.bulk_create([
+        TokenEvent(
+            token_id=token_id, slot_id=slot_id, user_id=user_id, service=service, number=number,
+            issued_at=issued_at, kind="expired", previous_status="active", source="sweep",
+        )
+        for token_id, user_id, slot_id, number, service, issued_at in rows
+    ])
+    _project_after_commit()
+
+
+def record_imported(tokens):
+    """Bulk 'issued' events for tokens created by a CSV import."""
+    TokenEvent.objects.bulk_create([_event_for(token, "issued", "import") for token in tokens])
+    _project_after_commit()
+
+
+# -------------------------
+# PROJECTORS
+# -------------------------
+# Each projector applies a batch of events with set-based writes. `slots`
+# maps slot ids to the batch's QueueSlots (deleted ones are missing) and
+# `replaying` is True while rebuilding a projection from the start of the log.
+
+def _backdate(objects, field, events):
+    """bulk_create stamps auto_now_add fields with now(); restore the event times."""
+    for obj, event in zip(objects, events):
+        setattr(obj, field, event.created_at)
+    type(objects[0]).objects.bulk_update(objects, [field])
+
+
+def project_visit_history(events, slots, replaying=False):
+    events = [event for event in events if event.kind != "issued"]
+    if not events:
+        return
+    visits = VisitHistory.objects.bulk_create([
+        VisitHistory(
+            user_id=event.user_id,
+            slot_id=event.slot_id if event.slot_id in slots else None,
+            token_number=event.number,
+            outcome=event.kind,
+        )
+        for event in events
+    ])
+    _backdate(visits, 'timestamp', events)
+
+
+def _activity_message(event, slot):
+    if event.kind == "cancelled":
+        return 'token_cancelled', f'Token #{event.number} cancelled'
+    if event.source == "waitlist":
+        return 'token_booked', f'Token #{event.number} issued from the waitlist for {slot}'
+    return 'token_booked', f'Token #{event.number} booked for {slot or event.service.capitalize()}'
+
+
+def _pruned(event, kind, cutoffs):
+    """True if retention has already deleted the row this replayed event would recreate."""
+    cutoff = cutoffs[kind]
+    return cutoff is not None and event.created_at < cutoff
+
+
+def project_activity_log(events, slots, replaying=False):
+    events = [event for event in events if event.kind in ("issued", "cancelled")]
+    if not events:
+        return
+    cutoffs = retention_cutoffs('activity', ('token_booked', 'token_cancelled')) if replaying else None
+    entries, kept = [], []
+    for event in events:
+        action, message = _activity_message(event, slots.get(event.slot_id))
+        if replaying and _pruned(event, action, cutoffs):
+            continue
+        entries.append(ActivityLog(user_id=event.user_id, action=action, message=message, object_type='Token'))
+        kept.append(event)
+    if entries:
+        _backdate(ActivityLog.objects.bulk_create(entries), 'timestamp', kept)
+
+
+def project_notifications(events, slots, replaying=False):
+    events = [
+        event for event in events
+        if event.kind == "completed" or (event.kind == "issued" and event.source == "waitlist")
+    ]
+    if not events:
+        return
+    # Replayed notifications are created read, so read-notification retention applies
+    cutoffs = retention_cutoffs('notification', ('token_ready', 'waitlist_promoted')) if replaying else None
+    notifications, kept = [], []
+    for event in events:
+        if event.kind == "completed":
+            title = "Token Completed"
+            message = f"Your token #{event.number} has been completed."
+            notification_type = 'token_ready'
+        else:
+            title = "You're off the waitlist"
+            message = f"A seat opened up. Token #{event.number} has been issued for {slots.get(event.slot_id)}."
+            notification_type = 'waitlist_promoted'
+        if replaying and _pruned(event, notification_type, cutoffs):
+            continue
+        kept.append(event)
+        # Users have already seen the originals of replayed notifications
+        notifications.append(Notification(
+            user_id=event.user_id, title=title, message=message,
+            notification_type=notification_type, is_read=replaying,
+        ))
+    if notifications:
+        _backdate(Notification.objects.bulk_create(notifications), 'created_at', kept)
+    if not replaying:
+        # bulk_create skips the post_save counter signal
+        for user_id, unread in Counter(event.user_id for event in events).items():
+            adjust_unread(user_id, unread)
+
+
+def project_user_stats(events, slots, replaying=False):
+    deltas = defaultdict(Counter)
+    for event in events:
+        counter = deltas[(event.user_id, event.service, period_for(event.issued_at))]
+        if event.kind == "issued":
+            counter["issued"] += 1
+            counter["active"] += 1
+        else:
+            counter[event.previous_status] -= 1
+            counter[event.kind] += 1
+    apply_token_deltas(deltas)
+
+
+def _reset_notifications():
+    Notification.objects.filter(notification_type__in=TOKEN_NOTIFICATION_TYPES).delete()
+
+
+PROJECTORS = {
+    'visit_history': (project_visit_history, lambda: VisitHistory.objects.all().delete()),
+    'activity_log': (project_activity_log, lambda: ActivityLog.objects.filter(object_type='Token').delete()),
+    'notifications': (project_notifications, _reset_notifications),
+    'user_stats': (project_user_stats, lambda: UserStats.objects.update(
+        issued=0, active=0, completed=0, cancelled=0, skipped=0, expired=0,
+    )),
+}
+
+
+class _CheckpointMoved(Exception):
+    pass
+
+
+def run_projections(names=None, batch_size=PROJECTION_BATCH_SIZE, replaying=False):
+    """
+    Apply every event past each projector's checkpoint, a batch at a time.
+
+    Each batch is one transaction covering the projected rows and the
+    checkpoint advance, so an event is applied exactly once. Checkpoints
+    advance with a compare-and-set; if another process got there first the
+    batch rolls back and this run stops.
+    """
+    names = list(names or PROJECTORS)
+    started = time.monotonic()
+    applied = 0
+    with _projection_lock:
+        while True:
+            try:
+                with transaction.atomic():
+                    positions = dict(
+                        ProjectorCheckpoint.objects.filter(name__in=names).values_list('name', 'position')
+                    )
+                    low = min(positions.get(name, 0) for name in names)
+                    events = list(TokenEvent.objects.filter(id__gt=low).order_by('id')[:batch_size])
+                    if not events:
+                        break
+                    slots = QueueSlot.objects.in_bulk({event.slot_id for event in events})
+                    for name in names:
+                        position = positions.get(name, 0)
+                        pending = [event for event in events if event.id > position]
+                        if not pending:
+                            continue
+                        PROJECTORS[name][0](pending, slots, replaying=replaying)
+                        if name not in positions:
+                            ProjectorCheckpoint.objects.create(name=name, position=events[-1].id)
+                        elif not ProjectorCheckpoint.objects.filter(
+                            name=name, position=position
+                        ).update(position=events[-1].id, updated_at=timezone.now()):
+                            raise _CheckpointMoved(name)
+            except _CheckpointMoved:
+                break
+            applied += len(events)
+            if len(events) < batch_size:
+                break
+    return {'events': applied, 'elapsed': time.monotonic() - started}
+
+
+def replay_projections(names=None, batch_size=PROJECTION_BATCH_SIZE):
+    """
+    Wipe the derived rows of the given projectors and rebuild them from the
+    whole log. Rows older than their retention cutoff are not rebuilt, so a
+    replay does not bring back what apply_retention() pruned.
+    """
+    names = list(names or PROJECTORS)
+    with _projection_lock, transaction.atomic():
+        for name in names:
+            PROJECTORS[name][1]()
+            ProjectorCheckpoint.objects.update_or_create(name=name, defaults={'position': 0})
+    result = run_projections(names, batch_size=batch_size, replaying=True)
+    if 'notifications' in names:
+        rebuild_unread_counters()
+    return result
+
+
+def schedule_projection():
+    """After a commit: project inline, unless the background projector owns it."""
+    if settings.TOKEN_EVENT_PROJECTION_INTERVAL:
+        return
+    try:
+        run_projections()
+    except Exception:
+        # The events are committed; the next run picks them up.
+        logger.exception("Inline token event projection failed")
+
+
+def _run_projector(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            run_projections()
+        except Exception:
+            logger.exception("Token event projection failed")
+
+
+def start_event_projector(interval=None):
+    """Start the background projector thread once per process."""
+    global _projector_thread
+    interval = interval or settings.TOKEN_EVENT_PROJECTION_INTERVAL
+    if not interval or _projector_thread is not None:
+        return
+    _projector_thread = threading.Thread(
+        target=_run_projector, args=(interval,), name="token-event-projector", daemon=True
+    )
+    _projector_thread.start()
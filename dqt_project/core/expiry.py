@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import changes
+from .display import mark_queue_changed
+from .events import record_expired, set_status
+from .models import Token, WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+_scheduler_thread = None
+
+
+def stale_slot_q(cutoff, prefix=""):
+    """Q matching slots whose end time is at or before `cutoff` (an aware datetime)."""
+    local = timezone.localtime(cutoff)
+    return (
+        Q(**{f"{prefix}date__lt": local.date()})
+        | Q(**{f"{prefix}date": local.date(), f"{prefix}end_time__lte": local.time()})
+    )
+
+
+def sweep_expired_tokens(now=None, grace_minutes=None, chunk_size=None):
+    """
+    Expire every active token whose slot ended more than the grace period ago.
+
+    Works in chunks of `chunk_size` tokens, each in its own transaction: one
+    UPDATE flips the chunk to "expired" and one bulk INSERT appends the
+    matching TokenEvents, from which VisitHistory and user stats are
+    projected. Safe to run repeatedly; already expired tokens are never
+    touched again. Waitlist entries for those slots are dropped as well.
+    """
+    started = time.monotonic()
+    now = now or timezone.now()
+    if grace_minutes is None:
+        grace_minutes = settings.TOKEN_EXPIRY_GRACE_MINUTES
+    chunk_size = chunk_size or settings.TOKEN_EXPIRY_CHUNK_SIZE
+    cutoff = now - timedelta(minutes=grace_minutes)
+
+    stale_tokens = Token.objects.filter(stale_slot_q(cutoff, "slot__"), status="active")
+
+    swept = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                stale_tokens.select_for_update()
+                .order_by("id")
+                .values_list("id", "user_id", "slot_id", "number", "service", "issued_at")[:chunk_size]
+            )
+            if not rows:
+                break
+
+            # Tokens cancelled or completed since the SELECT keep their status and get no event
+            moved = set(set_status([row[0] for row in rows], Token.TRANSITIONS["expired"], "expired"))
+            rows = [row for row in rows if row[0] in moved]
+            if rows:
+                record_expired(rows)
+                changes.record(Token, moved)
+        swept += len(rows)
+
+    if swept:
+        mark_queue_changed()
+
+    waitlist_cleared, _ = WaitlistEntry.objects.filter(stale_slot_q(cutoff, "slot__")).delete()
+
+    return {
+        "tokens": swept,
+        "waitlist_entries": waitlist_cleared,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+def _run_scheduler(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            result = sweep_expired_tokens()
+            if result["tokens"]:
+                logger.info(
+                    "Expired %s tokens in %.3fs", result["tokens"], result["elapsed"]
+                )
+        except Exception:
+            logger.exception("Token expiry sweep failed")
+
+
+def start_expiry_scheduler(interval=None):
+    """Start the background sweeper thread once per process."""
+    global _scheduler_thread
+    interval = interval or settings.TOKEN_EXPIRY_SWEEP_INTERVAL
+    if not interval or _scheduler_thread is not None:
+        return
+    _scheduler_thread = threading.Thread(
+        target=_run_scheduler, args=(interval,), name="token-expiry-sweeper", daemon=True
+    )
+    _scheduler_thread.start()
@@ -1,8 +1,12 @@
+from datetime import timedelta
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.utils import timezone
 from .models import QueueSlot, CanteenBooking
+from .services import active_services, get_service, service_choices
 
 
 # ----------------------------
@@ -66,22 +70,42 @@ class BookingForm(forms.Form):
 # QueueSlot Management Form
 # ----------------------------
 class QueueSlotForm(forms.ModelForm):
+    service = forms.ChoiceField(choices=service_choices, widget=forms.Select(attrs={'class': 'form-select'}))
+    max_tokens = forms.IntegerField(
+        min_value=1,
+        required=False,
+        help_text="Leave blank for the service's default capacity.",
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1'})
+    )
+
     class Meta:
         model = QueueSlot
         fields = ["service", "date", "start_time", "end_time", "max_tokens"]
         widgets = {
-            'service': forms.Select(attrs={'class': 'form-select'}),
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'start_time': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
             'end_time': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
-            'max_tokens': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        service = get_service(cleaned_data.get('service'))
+        if service and cleaned_data.get('max_tokens') is None:
+            cleaned_data['max_tokens'] = service.default_max_tokens
+        return cleaned_data
+
 
 # ----------------------------
 # Canteen Time Slot Booking Form
 # ----------------------------
 class CanteenTimeSlotBookingForm(forms.ModelForm):
+    flexible = forms.BooleanField(
+        required=False,
+        initial=True,
+        label="Any nearby time window is fine if this one is full",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
     class Meta:
         model = CanteenBooking
         fields = ['date', 'time_slot', 'purpose']
@@ -107,6 +131,9 @@ class CanteenTimeSlotBookingForm(forms.ModelForm):
         date = self.cleaned_data.get('date')
         if date and date < timezone.localdate():
             raise forms.ValidationError("Cannot book for past dates.")
+        last_day = timezone.localdate() + timedelta(days=settings.CANTEEN_BOOKING_DAYS_AHEAD - 1)
+        if date and date > last_day:
+            raise forms.ValidationError(f"Seats can only be booked up to {last_day}.")
         return date
 
 
@@ -126,4 +153,66 @@ class CanteenQueueBookingForm(forms.Form):
         self.fields['slot'].queryset = QueueSlot.objects.filter(
             service='canteen',
             date__gte=today
-        ).order_by('date', 'start_time')
\ No newline at end of file
+        ).order_by('date', 'start_time')
+
+# ----------------------------
+# Staff Analytics Date Range Form
+# ----------------------------
+class AnalyticsRangeForm(forms.Form):
+    start = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    end = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+    def __init__(self, data=None, *args, **kwargs):
+        today = timezone.localdate()
+        defaults = {
+            'start': (today - timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1)).isoformat(),
+            'end': today.isoformat(),
+        }
+        # Missing fields fall back to the default range
+        super().__init__({**defaults, **{k: v for k, v in (data or {}).items() if v}}, *args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end:
+            if start > end:
+                raise forms.ValidationError("The start date must be on or before the end date.")
+            if (end - start).days + 1 > settings.ANALYTICS_MAX_DAYS:
+                raise forms.ValidationError(f"Choose a range of at most {settings.ANALYTICS_MAX_DAYS} days.")
+        return cleaned_data
+
+
+# ----------------------------
+# Staff Capacity Planning Form
+# ----------------------------
+class CapacityPlanForm(forms.Form):
+    service = forms.ChoiceField(
+        choices=service_choices,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    target_minutes = forms.IntegerField(
+        min_value=1,
+        max_value=240,
+        label="p95 target (minutes)",
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, data=None, *args, **kwargs):
+        defaults = {
+            'service': next((service.code for service in active_services()), None),
+            'target_minutes': settings.SIMULATION_P95_TARGET_MINUTES,
+        }
+        super().__init__({**defaults, **{k: v for k, v in (data or {}).items() if v}}, *args, **kwargs)
+
+
+# ----------------------------
+# Admin CSV Import Form
+# ----------------------------
+class CsvImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[
+        ('users', 'Users (username, email, password, first_name, last_name)'),
+        ('slots', 'Queue slots (service, date, start_time, end_time, max_tokens)'),
+        ('tokens', 'Pre-booked tokens (username, service, date, start_time)'),
+    ])
+    csv_file = forms.FileField(label="CSV file")
+    dry_run = forms.BooleanField(required=False, initial=True, help_text="Validate every row but write nothing.")
@@ -0,0 +1,128 @@
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_FIELD = "idempotency_key"
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+
+# How long a retry waits for the first request to finish before giving up
+IN_FLIGHT_WAIT_SECONDS = 2.0
+IN_FLIGHT_POLL_SECONDS = 0.1
+# A first request still unfinished after this long died with its worker
+IN_FLIGHT_TIMEOUT_SECONDS = 30
+
+
+def get_idempotency_key(request):
+    key = request.POST.get(IDEMPOTENCY_FIELD) or request.META.get(IDEMPOTENCY_HEADER)
+    if key and len(key) <= 64:
+        return key
+    return None
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def _abandoned(record):
+    return record.created_at < timezone.now() - timedelta(seconds=IN_FLIGHT_TIMEOUT_SECONDS)
+
+
+def _snapshot_messages(request):
+    storage = messages.get_messages(request)
+    current = [(m.level, str(m.message)) for m in storage]
+    # Reading the storage marks it as consumed; keep the messages for the response.
+    storage.used = False
+    return current
+
+
+def _replay(request, record):
+    for level, text in record.messages:
+        messages.add_message(request, level, text)
+    response = HttpResponseRedirect(record.location)
+    response.status_code = record.status_code
+    return response
+
+
+def _wait_for_result(record_id):
+    """The finished record, the unfinished one if the wait runs out, or None if the first request dropped it."""
+    deadline = time.monotonic() + IN_FLIGHT_WAIT_SECONDS
+    while True:
+        record = IdempotencyKey.objects.filter(id=record_id).first()
+        if record is None or record.status_code is not None or time.monotonic() >= deadline:
+            return record
+        time.sleep(IN_FLIGHT_POLL_SECONDS)
+
+
+def idempotent(view_func):
+    """
+    Make a POST view safe to retry.
+
+    The first request carrying a given idempotency key (hidden form field or
+    Idempotency-Key header) runs the view. If it redirects, its status,
+    target and flashed messages are stored and replays of the same key get
+    that redirect back without running the view again. Any other response
+    (a form re-rendered with errors, a 409 or 429) did not complete the
+    action and has a body worth seeing, so the key is released and a retry
+    runs the view again. So is a key whose first request is still
+    unfinished after IN_FLIGHT_TIMEOUT_SECONDS (its worker was killed).
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = get_idempotency_key(request) if request.method == "POST" else None
+        if key is None or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+
+        endpoint = view_func.__name__
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user=request.user, endpoint=endpoint, key=key)
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, endpoint=endpoint, key=key)
+            if record.created_at < _expiry_cutoff():
+                record.delete()
+                return wrapper(request, *args, **kwargs)
+            if record.status_code is None and _abandoned(record):
+                # Only one retry wins the delete; any other finds the new placeholder
+                IdempotencyKey.objects.filter(id=record.id, status_code__isnull=True).delete()
+                return wrapper(request, *args, **kwargs)
+            if record.status_code is None:
+                record = _wait_for_result(record.id)
+                if record is None:
+                    return wrapper(request, *args, **kwargs)
+            if record.status_code is None:
+                response = HttpResponse("This request is still being processed.", status=409)
+                response["Retry-After"] = "1"
+                return response
+            return _replay(request, record)
+
+        before = len(_snapshot_messages(request))
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            # Let the client retry a request that failed outright
+            record.delete()
+            raise
+
+        if not 300 <= response.status_code < 400 or not response.has_header("Location"):
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.location = response["Location"][:255]
+        record.messages = _snapshot_messages(request)[before:]
+        record.save(update_fields=["status_code", "location", "messages"])
+        return response
+    return wrapper
+
+
+def prune_idempotency_keys():
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=_expiry_cutoff()).delete()
+    return deleted
@@ -0,0 +1,348 @@
+import csv
+import io
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time as dtime
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from . import changes
+from .dispatch import lanes_for
+from .display import mark_queue_changed
+from .events import record_imported
+from .models import QueueSlot, Token
+from .services import get_service
+
+IMPORT_BATCH_SIZE = 1000
+HASH_CHUNK_SIZE = 32
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def _parse_date(value):
+    return date.fromisoformat(value.strip())
+
+
+def _parse_time(value):
+    return dtime.fromisoformat(value.strip())
+
+
+class CsvImport:
+    """
+    One kind of import. prepare() validates a batch of (line, row) pairs with
+    set-based checks against the database and the rows seen so far, and
+    returns (objects, errors); save() writes the objects.
+    """
+    kind = None
+    columns = ()
+    required = ()
+
+    def __init__(self, dry_run=False, workers=None):
+        self.dry_run = dry_run
+        self.workers = workers
+
+    def close(self):
+        pass
+
+    def prepare(self, batch):
+        raise NotImplementedError
+
+    def save(self, objects):
+        raise NotImplementedError
+
+
+class UserImport(CsvImport):
+    """
+    username,email,password,first_name,last_name. A blank password gives an
+    unusable one (the student sets it through password reset); an already
+    hashed value is stored as is; anything else is hashed in a process pool.
+    """
+    kind = "users"
+    columns = ("username", "email", "password", "first_name", "last_name")
+    required = ("username", "email")
+
+    def __init__(self, dry_run=False, workers=None):
+        super().__init__(dry_run, workers)
+        self.usernames = set()
+        self.emails = set()
+        self._pool = None
+        self.validate_username = UnicodeUsernameValidator()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def _hash(self, passwords):
+        if not passwords:
+            return []
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers or os.cpu_count(), initializer=_setup_worker)
+        return list(self._pool.map(make_password, passwords, chunksize=HASH_CHUNK_SIZE))
+
+    def prepare(self, batch):
+        errors = []
+        usernames = {row["username"].strip() for _, row in batch}
+        emails = {row["email"].strip().lower() for _, row in batch}
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        taken_emails = {email.lower() for email in User.objects.filter(email__in=emails).values_list("email", flat=True)}
+
+        users, to_hash = [], []
+        for line, row in batch:
+            username, email = row["username"].strip(), row["email"].strip().lower()
+            try:
+                self.validate_username(username)
+                validate_email(email)
+            except ValidationError as e:
+                errors.append((line, " ".join(e.messages)))
+                continue
+            if username in taken_usernames or username in self.usernames:
+                errors.append((line, f"Username {username!r} already exists."))
+                continue
+            if email in taken_emails or email in self.emails:
+                errors.append((line, f"Email {email!r} is already registered."))
+                continue
+            self.usernames.add(username)
+            self.emails.add(email)
+
+            user = User(
+                username=username, email=email,
+                first_name=(row.get("first_name") or "").strip(), last_name=(row.get("last_name") or "").strip(),
+            )
+            password = row.get("password") or ""
+            if not password:
+                user.set_unusable_password()
+            else:
+                try:
+                    identify_hasher(password)
+                    user.password = password
+                except ValueError:
+                    to_hash.append((user, password))
+            users.append(user)
+
+        if not self.dry_run:
+            for (user, _), hashed in zip(to_hash, self._hash([password for _, password in to_hash])):
+                user.password = hashed
+        return users, errors
+
+    def save(self, objects):
+        User.objects.bulk_create(objects, batch_size=IMPORT_BATCH_SIZE)
+
+
+class SlotImport(CsvImport):
+    """service,date,start_time,end_time,max_tokens (blank: the service's default capacity)."""
+    kind = "slots"
+    columns = ("service", "date", "start_time", "end_time", "max_tokens")
+    required = ("service", "date", "start_time", "end_time")
+
+    def __init__(self, dry_run=False, workers=None):
+        super().__init__(dry_run, workers)
+        self.seen = set()
+
+    def prepare(self, batch):
+        errors, slots = [], []
+        parsed = []
+        for line, row in batch:
+            try:
+                slot = QueueSlot(
+                    service=row["service"].strip(),
+                    date=_parse_date(row["date"]),
+                    start_time=_parse_time(row["start_time"]),
+                    end_time=_parse_time(row["end_time"]),
+                )
+                max_tokens = (row.get("max_tokens") or "").strip()
+                service = get_service(slot.service)
+                if service is None:
+                    raise ValueError(f"Unknown service {slot.service!r}.")
+                slot.max_tokens = int(max_tokens) if max_tokens else service.default_max_tokens
+                if slot.max_tokens < 1:
+                    raise ValueError("max_tokens must be at least 1.")
+                slot.clean()
+            except ValidationError as e:
+                errors.append((line, " ".join(e.messages)))
+                continue
+            except ValueError as e:
+                errors.append((line, str(e)))
+                continue
+            parsed.append((line, slot))
+
+        existing = set(
+            QueueSlot.objects.filter(
+                service__in={slot.service for _, slot in parsed},
+                date__in={slot.date for _, slot in parsed},
+            ).values_list("service", "date", "start_time")
+        )
+        for line, slot in parsed:
+            key = (slot.service, slot.date, slot.start_time)
+            if key in existing or key in self.seen:
+                errors.append((line, f"A {slot.service} slot at {slot.date} {slot.start_time:%H:%M} already exists."))
+                continue
+            self.seen.add(key)
+            slots.append(slot)
+        return slots, errors
+
+    def save(self, objects):
+        slots = QueueSlot.objects.bulk_create(objects, batch_size=IMPORT_BATCH_SIZE)
+        changes.record(QueueSlot, [slot.pk for slot in slots])
+
+
+class TokenImport(CsvImport):
+    """
+    username,service,date,start_time: a pre-booked active token on an
+    existing slot, numbered after the slot's current tokens. Rows over the
+    slot's capacity, or for a user who already holds an active token for the
+    service, are rejected.
+    """
+    kind = "tokens"
+    columns = ("username", "service", "date", "start_time")
+    required = columns
+
+    def __init__(self, dry_run=False, workers=None):
+        super().__init__(dry_run, workers)
+        self.holders = set()      # (user_id, service) with an active token, including this import's
+        self.next_number = {}     # slot_id -> next token number
+        self.active = Counter()   # slot_id -> active tokens
+
+    def prepare(self, batch):
+        errors, parsed = [], []
+        for line, row in batch:
+            try:
+                key = (row["service"].strip(), _parse_date(row["date"]), _parse_time(row["start_time"]))
+            except ValueError as e:
+                errors.append((line, str(e)))
+                continue
+            parsed.append((line, row["username"].strip(), key))
+
+        users = dict(User.objects.filter(username__in={username for _, username, _ in parsed}).values_list("username", "id"))
+        slots = {
+            (slot.service, slot.date, slot.start_time): slot
+            for slot in QueueSlot.objects.filter(
+                service__in={key[0] for _, _, key in parsed}, date__in={key[1] for _, _, key in parsed}
+            )
+        }
+        new_slot_ids = {slot.id for slot in slots.values()} - set(self.next_number)
+        if new_slot_ids:
+            counts = (
+                Token.objects.filter(slot_id__in=new_slot_ids).order_by().values("slot_id")
+                .annotate(last=Max("number"), active=Count("id", filter=Q(status="active")))
+            )
+            for slot_id in new_slot_ids:
+                self.next_number[slot_id] = 1
+            for row in counts:
+                self.next_number[row["slot_id"]] = row["last"] + 1
+                self.active[row["slot_id"]] = row["active"]
+        self.holders |= set(
+            Token.objects.filter(
+                user_id__in=set(users.values()), status="active",
+                service__in={key[0] for _, _, key in parsed},
+            ).values_list("user_id", "service")
+        )
+
+        tokens = []
+        for line, username, key in parsed:
+            user_id, slot = users.get(username), slots.get(key)
+            if user_id is None:
+                errors.append((line, f"No user named {username!r}."))
+            elif slot is None:
+                errors.append((line, f"No {key[0]} slot at {key[1]} {key[2]:%H:%M}."))
+            elif (user_id, slot.service) in self.holders:
+                errors.append((line, f"{username} already has an active {slot.service} token."))
+            elif self.active[slot.id] >= slot.max_tokens:
+                errors.append((line, f"The {slot.service} slot at {key[1]} {key[2]:%H:%M} is full."))
+            else:
+                self.holders.add((user_id, slot.service))
+                self.active[slot.id] += 1
+                tokens.append(Token(
+                    slot=slot, user_id=user_id, service=slot.service,
+                    number=self.next_number[slot.id], status="active",
+                ))
+                self.next_number[slot.id] += 1
+        return tokens, errors
+
+    def save(self, objects):
+        by_service = defaultdict(list)
+        for token in objects:
+            by_service[token.service].append(token)
+        for service, tokens in by_service.items():
+            lanes = lanes_for({token.user_id for token in tokens}, service)
+            for token in tokens:
+                token.lane = lanes.get(token.user_id, "standard")
+        tokens = Token.objects.bulk_create(objects, batch_size=IMPORT_BATCH_SIZE)
+        record_imported(tokens)
+        changes.record(Token, [token.pk for token in tokens])
+        for service in {token.service for token in tokens}:
+            mark_queue_changed(service)
+
+
+IMPORTS = {importer.kind: importer for importer in (UserImport, SlotImport, TokenImport)}
+
+
+def _batches(reader, size):
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_csv(kind, stream, dry_run=False, workers=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Stream a CSV (text stream, header row first) into the database a batch
+    at a time. Each batch is validated as a whole, then written with
+    bulk_create in its own transaction, so a bad row never blocks the rest.
+    Returns {'kind', 'rows', 'created', 'errors': [(line, message)], 'dry_run', 'elapsed'}.
+    """
+    started = time.monotonic()
+    importer = IMPORTS[kind](dry_run=dry_run, workers=workers)
+    reader = csv.DictReader(stream)
+    missing = set(importer.required) - set(reader.fieldnames or ())
+    if missing:
+        return {
+            "kind": kind, "rows": 0, "created": 0, "dry_run": dry_run,
+            "errors": [(1, f"Missing column(s): {', '.join(sorted(missing))}")],
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+
+    rows = created = 0
+    errors = []
+    try:
+        for batch in _batches(reader, batch_size):
+            rows += len(batch)
+            complete = []
+            for line, row in batch:
+                blank = [column for column in importer.required if not (row.get(column) or "").strip()]
+                if blank:
+                    errors.append((line, f"Missing value for {', '.join(blank)}."))
+                else:
+                    complete.append((line, row))
+            objects, batch_errors = importer.prepare(complete)
+            errors += batch_errors
+            if objects and not dry_run:
+                with transaction.atomic():
+                    importer.save(objects)
+            created += len(objects)
+    finally:
+        importer.close()
+    return {
+        "kind": kind, "rows": rows, "created": created, "dry_run": dry_run,
+        "errors": sorted(errors),
+        "elapsed": round(time.monotonic() - started, 3),
+    }
+
+
+def open_upload(uploaded_file):
+    """A text stream over an uploaded file, read in chunks rather than all at once."""
+    return io.TextIOWrapper(uploaded_file.file, encoding="utf-8-sig", newline="")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete activity log rows and read notifications older than their RETENTION TTLs, "
+        "in paced chunks, rolling them up into daily counts first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", choices=["activity", "notification"], help="Prune just one table.")
+        parser.add_argument("--dry-run", action="store_true", help="Count what would be deleted.")
+
+    def handle(self, *args, **options):
+        result = apply_retention(tables=[options["only"]] if options["only"] else None, dry_run=options["dry_run"])
+        for table, kinds in result["deleted"].items():
+            for kind, rows in sorted(kinds.items()):
+                self.stdout.write(f"  {table:<12} {kind:<20} {rows}")
+
+        verb = "Would delete" if result["dry_run"] else "Deleted"
+        rate = f", {result['rows_per_second']:.0f} rows/s" if result["rows_per_second"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['total']} rows in {result['elapsed']:.3f}s{rate}"
+        ))
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import Client
+from django.urls import reverse
+
+ANONYMOUS_VIEWS = ("home", "login", "register")
+USER_VIEWS = ("dashboard", "my_reports", "notifications", "book_token", "book_library", "book_canteen")
+
+
+def _reset_template_caches():
+    """Drop parsed templates and cached fragments/pages, like a process that never cached."""
+    for loader in engines["django"].engine.template_loaders:
+        if hasattr(loader, "reset"):
+            loader.reset()
+    cache.clear()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time each view with cold template/fragment/page caches against warm ones. "
+        "Clears the default cache; run it against a development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", help="Also benchmark signed-in views as this user.")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--host", default=(settings.ALLOWED_HOSTS or ["localhost"])[0])
+
+    def _time(self, client, url, iterations, cold):
+        elapsed = 0.0
+        for _ in range(iterations):
+            if cold:
+                _reset_template_caches()
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed += time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+        return elapsed / iterations * 1000
+
+    def handle(self, *args, **options):
+        host = options["host"].lstrip(".")
+        runs = [(Client(HTTP_HOST=host), name) for name in ANONYMOUS_VIEWS]
+        if options["username"]:
+            try:
+                user = User.objects.get(username=options["username"])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['username']!r}")
+            client = Client(HTTP_HOST=host)
+            client.force_login(user)
+            runs += [(client, name) for name in USER_VIEWS]
+
+        self.stdout.write(f"{'view':<16} {'cold ms':>9} {'warm ms':>9} {'speedup':>8}")
+        for client, name in runs:
+            url = reverse(name)
+            cold = self._time(client, url, options["iterations"], cold=True)
+            self._time(client, url, 1, cold=False)
+            warm = self._time(client, url, options["iterations"], cold=False)
+            self.stdout.write(f"{name:<16} {cold:>9.2f} {warm:>9.2f} {cold / warm:>7.1f}x")
@@ -0,0 +1,53 @@
+import os
+
+from django.contrib.staticfiles.finders import FileSystemFinder, get_finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.assets import COMPRESSIBLE_EXTENSIONS, brotli
+
+
+def _size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else None
+
+
+def _kb(size):
+    return "-" if size is None else f"{size / 1024:.1f}K"
+
+
+class Command(BaseCommand):
+    help = "Collect static files (hashed + precompressed) and report the size of each project bundle."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-collect", action="store_true",
+            help="Only report sizes from the existing STATIC_ROOT.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["no_collect"]:
+            call_command("collectstatic", interactive=False, verbosity=0)
+
+        names = sorted(
+            path
+            for finder in get_finders()
+            if isinstance(finder, FileSystemFinder)
+            for path, _ in finder.list([])
+            if path.endswith(COMPRESSIBLE_EXTENSIONS)
+        )
+
+        self.stdout.write(f"{'bundle':<40} {'raw':>8} {'gzip':>8} {'brotli':>8}")
+        totals = [0, 0, 0]
+        for name in names:
+            hashed = staticfiles_storage.stored_name(name)
+            path = staticfiles_storage.path(hashed)
+            sizes = [_size(path), _size(path + ".gz"), _size(path + ".br")]
+            # Files too small to compress are served raw
+            for index, size in enumerate(sizes):
+                totals[index] += size or sizes[0] or 0
+            self.stdout.write(f"{hashed:<40} {_kb(sizes[0]):>8} {_kb(sizes[1]):>8} {_kb(sizes[2]):>8}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(names)} bundles: {_kb(totals[0])} raw, {_kb(totals[1])} gzip"
+            + (f", {_kb(totals[2])} brotli" if brotli else " (install brotli for .br variants)")
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.changes import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete change feed rows older than CHANGE_FEED_RETENTION_HOURS and rows "
+        "superseded by a newer change to the same object."
+    )
+
+    def handle(self, *args, **options):
+        result = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {result['expired']} expired and {result['superseded']} superseded changes "
+            f"in {result['elapsed']:.3f}s"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.expiry import sweep_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Expire active tokens whose slot ended more than the grace period ago."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-minutes", type=int, default=None,
+            help="Minutes after a slot's end time before its tokens expire (default: TOKEN_EXPIRY_GRACE_MINUTES).",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=None,
+            help="Tokens expired per transaction (default: TOKEN_EXPIRY_CHUNK_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        result = sweep_expired_tokens(
+            grace_minutes=options["grace_minutes"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {result['tokens']} tokens and cleared {result['waitlist_entries']} "
+            f"waitlist entries in {result['elapsed']:.3f}s"
+        ))
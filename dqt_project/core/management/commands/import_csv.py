@@ -0,0 +1,50 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importer import IMPORT_BATCH_SIZE, IMPORTS, import_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV of users, queue slots or pre-booked tokens into the database "
+        "in batches, skipping (and reporting) rows that fail validation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTS))
+        parser.add_argument("path", help="CSV file with a header row.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate every row but write nothing.")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Processes for hashing plaintext passwords (default: one per CPU).")
+        parser.add_argument("--errors", metavar="REPORT", help="Write rejected rows to this CSV (line,error).")
+
+    def handle(self, *args, **options):
+        try:
+            stream = open(options["path"], encoding="utf-8-sig", newline="")
+        except OSError as e:
+            raise CommandError(e)
+        with stream:
+            result = import_csv(
+                options["kind"], stream, dry_run=options["dry_run"],
+                workers=options["workers"], batch_size=options["batch_size"],
+            )
+
+        for line, message in result["errors"][:20]:
+            self.stdout.write(self.style.WARNING(f"  line {line}: {message}"))
+        if len(result["errors"]) > 20:
+            self.stdout.write(self.style.WARNING(f"  ... and {len(result['errors']) - 20} more"))
+        if options["errors"] and result["errors"]:
+            with open(options["errors"], "w", newline="") as report:
+                writer = csv.writer(report)
+                writer.writerow(["line", "error"])
+                writer.writerows(result["errors"])
+            self.stdout.write(f"Wrote {len(result['errors'])} rejected rows to {options['errors']}")
+
+        verb = "Would import" if result["dry_run"] else "Imported"
+        rate = result["rows"] / result["elapsed"] if result["elapsed"] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} of {result['rows']} {result['kind']} rows "
+            f"({len(result['errors'])} rejected) in {result['elapsed']:.2f}s, {rate:.0f} rows/s"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.events import PROJECTORS, run_projections
+from core.models import ProjectorCheckpoint, TokenEvent
+
+
+class Command(BaseCommand):
+    help = "Apply pending token events to their projections and show each projector's checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "projectors", nargs="*", metavar="projector",
+            help=f"Projectors to run (default: all of {', '.join(PROJECTORS)}).",
+        )
+
+    def handle(self, *args, **options):
+        names = options["projectors"] or list(PROJECTORS)
+        unknown = set(names) - set(PROJECTORS)
+        if unknown:
+            raise CommandError(f"Unknown projector(s): {', '.join(sorted(unknown))}")
+        result = run_projections(names)
+        self.stdout.write(self.style.SUCCESS(
+            f"Projected {result['events']} events in {result['elapsed']:.3f}s"
+        ))
+
+        head = TokenEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        positions = dict(ProjectorCheckpoint.objects.values_list('name', 'position'))
+        for name in names:
+            position = positions.get(name, 0)
+            self.stdout.write(f"  {name:<15} @ {position} ({head - position} behind)")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.notifications import rebuild_unread_counters
+from core.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = "Delete read notifications older than their RETENTION TTL (NOTIFICATION_READ_TTL_DAYS by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help="Keep read notifications of every type newer than this many days (default: the configured TTLs).",
+        )
+        parser.add_argument(
+            "--rebuild-counters", action="store_true",
+            help="Also recompute every user's unread counter from the notifications table.",
+        )
+
+    def handle(self, *args, **options):
+        result = apply_retention(tables=["notification"], ttl_days=options["days"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {result['total']} read notifications in {result['elapsed']:.3f}s"
+        ))
+        if options["rebuild_counters"]:
+            users = rebuild_unread_counters()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt unread counters for {users} users"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replica import refresh_replica
+
+
+class Command(BaseCommand):
+    help = "Refresh the local read replica from the primary SQLite database."
+
+    def handle(self, *args, **options):
+        try:
+            elapsed = refresh_replica()
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Replica refreshed in {elapsed:.3f}s"))
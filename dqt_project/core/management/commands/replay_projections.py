@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.events import PROJECTORS, replay_projections
+
+
+class Command(BaseCommand):
+    help = "Delete the rows derived from token events and rebuild them from the whole event log."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "projectors", nargs="*", metavar="projector",
+            help=f"Projections to rebuild (default: all of {', '.join(PROJECTORS)}).",
+        )
+
+    def handle(self, *args, **options):
+        names = options["projectors"] or list(PROJECTORS)
+        unknown = set(names) - set(PROJECTORS)
+        if unknown:
+            raise CommandError(f"Unknown projector(s): {', '.join(sorted(unknown))}")
+        result = replay_projections(names)
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {result['events']} events into {', '.join(names)} in {result['elapsed']:.3f}s"
+        ))
@@ -0,0 +1,262 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.shortcuts import render
+
+from .profiling import profiling_settings, run_profiled, should_profile
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_DEFAULTS = {
+    'VIEWS': ['book_token', 'book_service', 'book_library', 'book_canteen', 'book_canteen_seat'],
+    'METHODS': ['POST'],
+    # Sustained requests per second and burst size, per user and across everyone
+    'USER_RATE': 0.2,
+    'USER_BURST': 3,
+    'GLOBAL_RATE': 50.0,
+    'GLOBAL_BURST': 100,
+    # Booking writes allowed to run at once in this process
+    'MAX_IN_FLIGHT': 8,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def admission_settings():
+    return {**ADMISSION_DEFAULTS, **getattr(settings, 'ADMISSION_CONTROL', {})}
+
+
+# A bucket's lock expires after this, in case its holder died holding it
+BUCKET_LOCK_TIMEOUT = 2
+# How long take() waits for a contended bucket before treating it as busy
+BUCKET_LOCK_WAIT = 0.05
+
+
+class BucketStore:
+    """
+    Bucket state kept in the shared cache, with a process-local fallback.
+
+    Each read-modify-write of a bucket runs under locked(): a cache.add()
+    lock shared by every worker, or a process lock when the cache is down,
+    so concurrent requests cannot both spend the same token.
+    """
+
+    def __init__(self, cache_alias):
+        self.cache_alias = cache_alias
+        self._local = {}
+        self._lock = threading.Lock()
+        self._fallback_lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            return caches[self.cache_alias].get(key)
+        except Exception:
+            with self._lock:
+                return self._local.get(key)
+
+    def set(self, key, value, timeout):
+        try:
+            caches[self.cache_alias].set(key, value, timeout)
+        except Exception:
+            with self._lock:
+                self._local[key] = value
+
+    def _acquire(self, lock_key, wait):
+        """True once held, False if still busy after `wait` seconds, None if the cache is down."""
+        deadline = time.monotonic() + wait
+        try:
+            cache = caches[self.cache_alias]
+            while not cache.add(lock_key, 1, BUCKET_LOCK_TIMEOUT):
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.001)
+        except Exception:
+            return None
+        return True
+
+    @contextmanager
+    def locked(self, key, wait=BUCKET_LOCK_WAIT):
+        """Hold `key`'s lock for the block. Yields False if it could not be taken in time."""
+        lock_key = f"{key}:lock"
+        acquired = self._acquire(lock_key, wait)
+        if acquired is None:
+            with self._fallback_lock:
+                yield True
+            return
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    caches[self.cache_alias].delete(lock_key)
+                except Exception:
+                    pass
+
+
+class TokenBucket:
+    def __init__(self, store, key, rate, burst):
+        self.store = store
+        self.key = f"admission:bucket:{key}"
+        self.rate = rate
+        self.burst = burst
+
+    def _refill(self, now):
+        state = self.store.get(self.key)
+        if state is None:
+            return float(self.burst)
+        tokens, updated_at = state
+        return min(float(self.burst), tokens + (now - updated_at) * self.rate)
+
+    def level(self):
+        return self._refill(time.time())
+
+    def _save(self, tokens, now):
+        # Keep the entry around only as long as it takes to refill completely
+        self.store.set(self.key, (tokens, now), math.ceil(self.burst / self.rate) + 1)
+
+    def take(self):
+        """Take one token. Returns (allowed, seconds until a token is available)."""
+        with self.store.locked(self.key) as locked:
+            if not locked:
+                # Too many requests queued on this bucket: that is load too
+                return False, 1
+            now = time.time()
+            tokens = self._refill(now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._save(tokens, now)
+        retry_after = 0 if allowed else (1 - tokens) / self.rate
+        return allowed, retry_after
+
+    def refund(self):
+        """Give back a token taken for a request that a later check rejected."""
+        # Wait out any holder: a lost refund would keep the token spent
+        with self.store.locked(self.key, wait=BUCKET_LOCK_TIMEOUT):
+            now = time.time()
+            self._save(min(float(self.burst), self._refill(now) + 1), now)
+
+
+class AdmissionControlMiddleware:
+    """
+    Shed booking load before it reaches the database.
+
+    Requests to the configured views are checked against a per-user and a
+    global token bucket and a cap on concurrent booking writes. Anything over
+    the limits gets an immediate 429 with Retry-After instead of queueing on
+    SQLite's write lock.
+
+    The user bucket goes first, and tokens taken before a later check
+    rejects the request are refunded, so a client its own bucket is
+    refusing cannot drain the global bucket everyone else shares.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = admission_settings()
+        self.store = BucketStore(self.config['CACHE_ALIAS'])
+        self.in_flight = threading.BoundedSemaphore(self.config['MAX_IN_FLIGHT'])
+        self.in_flight_count = 0
+        self.rejected = 0
+        self._count_lock = threading.Lock()
+        global _active_middleware
+        _active_middleware = self
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, '_admission_slot_held', False):
+            self._release()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match is None or match.url_name not in self.config['VIEWS']:
+            return None
+        if request.method not in self.config['METHODS']:
+            return None
+
+        taken = []
+        for bucket in (self.user_bucket(request), self.global_bucket()):
+            allowed, retry_after = bucket.take()
+            if not allowed:
+                return self._reject(request, retry_after, refund=taken)
+            taken.append(bucket)
+
+        if not self.in_flight.acquire(blocking=False):
+            return self._reject(request, 1, refund=taken)
+        with self._count_lock:
+            self.in_flight_count += 1
+        request._admission_slot_held = True
+        return None
+
+    def global_bucket(self):
+        return TokenBucket(self.store, 'global', self.config['GLOBAL_RATE'], self.config['GLOBAL_BURST'])
+
+    def user_bucket(self, request):
+        if request.user.is_authenticated:
+            identity = f"user:{request.user.pk}"
+        else:
+            identity = f"ip:{request.META.get('REMOTE_ADDR', '')}"
+        return TokenBucket(self.store, identity, self.config['USER_RATE'], self.config['USER_BURST'])
+
+    def status(self):
+        return {
+            'config': self.config,
+            'global_bucket_level': round(self.global_bucket().level(), 2),
+            'in_flight': self.in_flight_count,
+            'rejected': self.rejected,
+        }
+
+    def _release(self):
+        with self._count_lock:
+            self.in_flight_count -= 1
+        self.in_flight.release()
+
+    def _reject(self, request, retry_after, refund=()):
+        for bucket in refund:
+            bucket.refund()
+        retry_after = max(1, math.ceil(retry_after))
+        with self._count_lock:
+            self.rejected += 1
+        logger.info("Admission control rejected %s %s (retry in %ss)", request.method, request.path, retry_after)
+        response = render(request, 'core/too_busy.html', {'retry_after': retry_after}, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile selected requests with cProfile and record their SQL.
+
+    Staff turn it on per request (?profile=1 or X-Profile: 1); PROFILING
+    ['SAMPLE_EVERY'] also samples 1 in N of all requests. Unprofiled
+    requests pay for one settings lookup. See core/profiling.py.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = profiling_settings()
+
+    def __call__(self, request):
+        if not should_profile(request, self.config):
+            return self.get_response(request)
+        return run_profiled(request, self.get_response, self.config)
+
+
+# The instance serving this process, for the status view
+_active_middleware = None
+
+
+def admission_status(request):
+    """Current limits and bucket levels for the requesting user, for the staff status view."""
+    middleware = _active_middleware
+    if middleware is None:
+        return {'enabled': False}
+    status = middleware.status()
+    status['enabled'] = True
+    status['user_bucket_level'] = round(middleware.user_bucket(request).level(), 2)
+    return status
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='action',
+            field=models.CharField(choices=[('token_booked', 'Token Booked'), ('token_cancelled', 'Token Cancelled'), ('token_completed', 'Token Completed'), ('booking_made', 'Booking Made'), ('waitlist_joined', 'Joined Waitlist'), ('login', 'User Login')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('token_ready', 'Your Token is Ready'), ('booking_confirmed', 'Booking Confirmed'), ('waitlist_promoted', 'Promoted from Waitlist'), ('system', 'System Notification')], default='system', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='core.queueslot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist Entries',
+                'ordering': ['id'],
+                'constraints': [models.UniqueConstraint(fields=('slot', 'user'), name='unique_waitlist_entry')],
+            },
+        ),
+    ]
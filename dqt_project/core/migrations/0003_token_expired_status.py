@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='token',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('skipped', 'Skipped'), ('expired', 'Expired')], default='active', max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanteenSlotCapacity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time_slot', models.CharField(choices=[('8:00-9:00', '8:00-9:00 AM'), ('9:00-10:00', '9:00-10:00 AM'), ('12:00-1:00', '12:00-1:00 PM'), ('1:00-2:00', '1:00-2:00 PM')], max_length=50)),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Canteen Slot Capacities',
+                'ordering': ['date', 'time_slot'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'time_slot'), name='unique_canteen_slot_capacity')],
+            },
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:05
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Coalesce, TruncMonth
+
+STATUS_FIELDS = {"active", "completed", "cancelled", "skipped", "expired"}
+
+
+def backfill_user_stats(apps, schema_editor):
+    """
+    core.stats.rebuild_user_stats() against the historical models. It must
+    run here: 0009 marks every historical event as already projected.
+    """
+    Token = apps.get_model('core', 'Token')
+    CanteenBooking = apps.get_model('core', 'CanteenBooking')
+    UserStats = apps.get_model('core', 'UserStats')
+    totals = defaultdict(Counter)
+
+    token_groups = (
+        Token.objects.annotate(month=TruncMonth("issued_at"), service_name=Coalesce("service", "slot__service"))
+        .values("user_id", "service_name", "month", "status")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for row in token_groups:
+        for period in ("", row["month"].strftime("%Y-%m")):
+            key = (row["user_id"], row["service_name"], period)
+            totals[key]["issued"] += row["total"]
+            if row["status"] in STATUS_FIELDS:
+                totals[key][row["status"]] += row["total"]
+
+    booking_groups = (
+        CanteenBooking.objects.annotate(month=TruncMonth("booked_at"))
+        .values("user_id", "month")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for row in booking_groups:
+        for period in ("", row["month"].strftime("%Y-%m")):
+            totals[(row["user_id"], "canteen", period)]["bookings"] += row["total"]
+
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=user_id, service=service, period=period, **counters)
+            for (user_id, service, period), counters in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_notification_inbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=50)),
+                ('period', models.CharField(blank=True, max_length=7)),
+                ('issued', models.IntegerField(default=0)),
+                ('active', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('skipped', models.IntegerField(default=0)),
+                ('expired', models.IntegerField(default=0)),
+                ('bookings', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Stats',
+                'constraints': [models.UniqueConstraint(fields=('user', 'service', 'period'), name='unique_user_stats_period')],
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
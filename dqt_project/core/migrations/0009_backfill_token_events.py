@@ -0,0 +1,49 @@
+from django.db import migrations
+
+PROJECTORS = ('visit_history', 'activity_log', 'notifications', 'user_stats')
+TERMINAL_STATUSES = ('completed', 'cancelled', 'skipped', 'expired')
+
+
+def backfill_events(apps, schema_editor):
+    """
+    Give every existing token an 'issued' event (and a terminal one if it has
+    left the queue), then start the projectors after them: their derived rows
+    already exist, but a replay can now rebuild them from the log.
+    """
+    Token = apps.get_model('core', 'Token')
+    TokenEvent = apps.get_model('core', 'TokenEvent')
+    ProjectorCheckpoint = apps.get_model('core', 'ProjectorCheckpoint')
+
+    events = []
+    tokens = Token.objects.select_related('slot').order_by('issued_at', 'id')
+    for token in tokens.iterator(chunk_size=1000):
+        common = dict(
+            token_id=token.id, slot_id=token.slot_id, user_id=token.user_id,
+            service=token.service or token.slot.service, number=token.number,
+            issued_at=token.issued_at, source='backfill', created_at=token.issued_at,
+        )
+        events.append(TokenEvent(kind='issued', **common))
+        if token.status in TERMINAL_STATUSES:
+            events.append(TokenEvent(kind=token.status, previous_status='active', **common))
+    TokenEvent.objects.bulk_create(events, batch_size=1000)
+
+    head = TokenEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    ProjectorCheckpoint.objects.bulk_create(
+        [ProjectorCheckpoint(name=name, position=head) for name in PROJECTORS]
+    )
+
+
+def remove_events(apps, schema_editor):
+    apps.get_model('core', 'ProjectorCheckpoint').objects.all().delete()
+    apps.get_model('core', 'TokenEvent').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_token_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_events, remove_events),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_backfill_token_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Service',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('icon', models.CharField(default='fas fa-ticket-alt', help_text='Font Awesome classes', max_length=50)),
+                ('color', models.CharField(default='primary', help_text='Bootstrap colour for badges', max_length=20)),
+                ('default_max_tokens', models.PositiveIntegerField(default=10)),
+                ('average_service_minutes', models.PositiveIntegerField(default=5)),
+                ('opens_at', models.TimeField()),
+                ('closes_at', models.TimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['position', 'name'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='queueslot',
+            name='service',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='token',
+            name='service',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
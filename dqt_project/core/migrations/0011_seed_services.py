@@ -0,0 +1,35 @@
+import datetime
+
+from django.db import migrations
+
+SERVICES = [
+    dict(code='library', name='Library', description='Reserve library access slot', icon='fas fa-book',
+         color='info', default_max_tokens=10, average_service_minutes=5, position=0),
+    dict(code='canteen', name='Canteen', description='Food court reservation', icon='fas fa-utensils',
+         color='success', default_max_tokens=10, average_service_minutes=3, position=1),
+]
+
+
+def seed_services(apps, schema_editor):
+    """The two services that used to be hard-coded, plus any other code already on a slot."""
+    Service = apps.get_model('core', 'Service')
+    QueueSlot = apps.get_model('core', 'QueueSlot')
+    hours = dict(opens_at=datetime.time(8, 0), closes_at=datetime.time(20, 0))
+    for values in SERVICES:
+        Service.objects.get_or_create(code=values['code'], defaults={**values, **hours})
+    known = set(Service.objects.values_list('code', flat=True))
+    for position, code in enumerate(
+        sorted(set(QueueSlot.objects.values_list('service', flat=True)) - known), start=len(SERVICES)
+    ):
+        Service.objects.create(code=code, name=code.replace('_', ' ').title(), position=position, **hours)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_services'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_services, migrations.RunPython.noop),
+    ]
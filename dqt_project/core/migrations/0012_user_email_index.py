@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index auth_user.email for EmailBackend; auth.User is not ours to alter, hence raw SQL."""
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0011_seed_services'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS core_auth_user_email_idx ON auth_user (email);',
+            'DROP INDEX IF EXISTS core_auth_user_email_idx;',
+        ),
+    ]
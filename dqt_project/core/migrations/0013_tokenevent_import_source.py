@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tokenevent',
+            name='source',
+            field=models.CharField(choices=[('booking', 'Booking'), ('waitlist', 'Waitlist promotion'), ('user', 'User'), ('staff', 'Staff'), ('sweep', 'Expiry sweep'), ('backfill', 'Backfill'), ('import', 'CSV import')], max_length=20),
+        ),
+    ]
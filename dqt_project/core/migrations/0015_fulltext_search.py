@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# table -> indexed columns. External-content FTS5 tables hold only the
+# index; triggers keep them in step with every write path, bulk ones included.
+INDEXES = {
+    'core_activitylog': ('message',),
+    'core_notification': ('title', 'message'),
+    'auth_user': ('username', 'email', 'first_name', 'last_name'),
+}
+
+
+def _fts_sql(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3');",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END;",
+        # Only the indexed columns: last_login, is_read etc. change far more often
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END;",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild');",
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    # FTS5 is SQLite's; other databases use core.search's fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in INDEXES.items():
+        for statement in _fts_sql(table, columns):
+            schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in INDEXES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix};')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0014_retention'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
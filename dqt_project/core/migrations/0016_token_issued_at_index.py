@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_fulltext_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['issued_at'], name='core_token_issued__791c96_idx'),
+        ),
+    ]
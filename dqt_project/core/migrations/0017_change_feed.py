@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_token_issued_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('table', models.CharField(choices=[('token', 'Token'), ('slot', 'Queue slot'), ('booking', 'Canteen booking')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['table', 'object_id', 'id'], name='core_change_table_cf5153_idx'), models.Index(fields=['created_at'], name='core_change_created_6ef3cf_idx')],
+            },
+        ),
+    ]
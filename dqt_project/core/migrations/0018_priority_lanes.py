@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='lane',
+            field=models.CharField(choices=[('standard', 'Standard'), ('priority', 'Priority')], default='standard', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PriorityPass',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lane', models.CharField(choices=[('standard', 'Standard'), ('priority', 'Priority')], default='priority', max_length=20)),
+                ('reason', models.CharField(choices=[('accessibility', 'Accessibility needs'), ('staff', 'Staff'), ('exam_return', 'Exam-day return'), ('other', 'Other')], max_length=20)),
+                ('service', models.CharField(blank=True, help_text='Blank for every service', max_length=50)),
+                ('valid_from', models.DateField(default=django.utils.timezone.localdate)),
+                ('valid_until', models.DateField(blank=True, null=True)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='priority_passes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Priority Passes',
+            },
+        ),
+    ]
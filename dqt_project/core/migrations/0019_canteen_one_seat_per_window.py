@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def cancel_duplicate_seats(apps, schema_editor):
+    """Keep each user's earliest confirmed booking per window and cancel the rest, freeing their seats."""
+    CanteenBooking = apps.get_model('core', 'CanteenBooking')
+    CanteenSlotCapacity = apps.get_model('core', 'CanteenSlotCapacity')
+    duplicated = (
+        CanteenBooking.objects.filter(status='confirmed')
+        .values('user_id', 'date', 'time_slot').annotate(total=Count('id')).filter(total__gt=1).order_by()
+    )
+    for group in duplicated:
+        extra = list(
+            CanteenBooking.objects.filter(status='confirmed', **{k: group[k] for k in ('user_id', 'date', 'time_slot')})
+            .order_by('id').values_list('id', flat=True)[1:]
+        )
+        CanteenBooking.objects.filter(id__in=extra).update(status='cancelled')
+        CanteenSlotCapacity.objects.filter(
+            date=group['date'], time_slot=group['time_slot'], booked__gte=len(extra)
+        ).update(booked=F('booked') - len(extra))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_priority_lanes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='canteenbooking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'confirmed')), fields=('user', 'date', 'time_slot'), name='one_confirmed_seat_per_window'),
+        ),
+    ]
@@ -1,14 +1,36 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+class Service(models.Model):
+    """
+    A bookable queue (library, canteen, ...). Read through the in-process
+    registry in core/services.py rather than queried per request.
+    """
+    code = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=100)
+    description = models.CharField(max_length=200, blank=True)
+    icon = models.CharField(max_length=50, default='fas fa-ticket-alt', help_text="Font Awesome classes")
+    color = models.CharField(max_length=20, default='primary', help_text="Bootstrap colour for badges")
+    default_max_tokens = models.PositiveIntegerField(default=10)
+    average_service_minutes = models.PositiveIntegerField(default=5)
+    opens_at = models.TimeField()
+    closes_at = models.TimeField()
+    is_active = models.BooleanField(default=True)
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'name']
+
+    def __str__(self):
+        return self.name
+
+
 class QueueSlot(models.Model):
-    SERVICE_CHOICES = [
-        ('library', 'Library'),
-        ('canteen', 'Canteen'),
-    ]
-    service = models.CharField(max_length=50, choices=SERVICE_CHOICES)
+    # A Service.code; kept as plain text so services can be added without a migration
+    service = models.CharField(max_length=50)
     date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
@@ -17,10 +39,39 @@ class QueueSlot(models.Model):
     def __str__(self):
         return f"{self.get_service_display()} - {self.date} {self.start_time}-{self.end_time}"
 
+    def get_service_display(self):
+        from .services import service_label
+        return service_label(self.service)
+
+    @property
+    def service_info(self):
+        from .services import get_service
+        return get_service(self.service)
+
+    def clean(self):
+        from .services import get_service
+        service = get_service(self.service)
+        if service is None:
+            raise ValidationError({'service': "Unknown service."})
+        if self.start_time and self.end_time:
+            if self.start_time >= self.end_time:
+                raise ValidationError("The slot must end after it starts.")
+            if self.start_time < service.opens_at or self.end_time > service.closes_at:
+                raise ValidationError(
+                    f"{service.name} is open {service.opens_at:%H:%M}-{service.closes_at:%H:%M}."
+                )
+
     @property
     def queue_type(self):
         return self.service
 
+    def active_tokens_count(self):
+        return self.tokens.filter(status="active").count()
+
+    def next_token_number(self):
+        last_token = self.tokens.order_by('-number').first()
+        return last_token.number + 1 if last_token else 1
+
 class Slot(models.Model):
     name = models.CharField(max_length=100)
     time = models.DateTimeField()
@@ -28,39 +79,58 @@ class Slot(models.Model):
     def __str__(self):
         return self.name
     
+LANE_CHOICES = [
+    ("standard", "Standard"),
+    ("priority", "Priority"),
+]
+
 class Token(models.Model):
     STATUS_CHOICES = [
         ("active", "Active"),
         ("completed", "Completed"),
         ("cancelled", "Cancelled"),
         ("skipped", "Skipped"),
+        ("expired", "Expired"),
     ]
+    # Target status -> the statuses a token may move to it from. Every
+    # change goes through events.transition(), which applies it as one
+    # conditional UPDATE; anything not listed here is refused.
+    TRANSITIONS = {
+        "completed": ("active",),
+        "skipped": ("active",),
+        "cancelled": ("active",),
+        "expired": ("active",),
+    }
     
     slot = models.ForeignKey(QueueSlot, related_name="tokens", on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     number = models.PositiveIntegerField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     issued_at = models.DateTimeField(auto_now_add=True)
-    service = models.CharField(max_length=50, choices=QueueSlot.SERVICE_CHOICES, blank=True, null=True)
+    service = models.CharField(max_length=50, blank=True, null=True)
+    # Dispatch lane (core/dispatch.py); set from the holder's PriorityPass when issued
+    lane = models.CharField(max_length=20, choices=LANE_CHOICES, default="standard")
 
     class Meta:
         ordering = ['-issued_at']
+        indexes = [
+            # Day and range reports filter on [start, end) bounds (core/dates.py)
+            models.Index(fields=['issued_at']),
+        ]
 
     def __str__(self):
         return f"Token #{self.number} ({self.slot})"
 
-    def save(self, *args, **kwargs):
-        if not self.service and self.slot:
-            self.service = self.slot.service
-        super().save(*args, **kwargs)
+    def can_become(self, status):
+        return self.status in self.TRANSITIONS.get(status, ())
 
-    def mark_served(self):
-        self.status = "completed"
-        self.save()
+    def mark_served(self, source="staff"):
+        from .events import transition
+        return transition(self, "completed", source)
 
-    def mark_skipped(self):
-        self.status = "skipped"
-        self.save()
+    def mark_skipped(self, source="staff"):
+        from .events import transition
+        return transition(self, "skipped", source)
 
 class VisitHistory(models.Model):
     OUTCOME_CHOICES = [
@@ -108,9 +178,39 @@ class CanteenBooking(models.Model):
 
     class Meta:
         ordering = ['-booked_at']
+        constraints = [
+            # One seat per user per window (core/canteen.py book_seat)
+            models.UniqueConstraint(
+                fields=['user', 'date', 'time_slot'],
+                condition=models.Q(status='confirmed'),
+                name='one_confirmed_seat_per_window',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.date} @ {self.time_slot}"
+
+
+class CanteenSlotCapacity(models.Model):
+    """Seat counter for one canteen time window on one day."""
+    date = models.DateField()
+    time_slot = models.CharField(max_length=50, choices=CanteenBooking.TIME_SLOT_CHOICES)
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'time_slot']
+        verbose_name_plural = "Canteen Slot Capacities"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'time_slot'], name='unique_canteen_slot_capacity'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} @ {self.time_slot}: {self.booked}/{self.capacity}"
+
+    @property
+    def remaining(self):
+        return max(0, self.capacity - self.booked)
     
     
 class ActivityLog(models.Model):
@@ -119,6 +219,7 @@ class ActivityLog(models.Model):
         ('token_cancelled', 'Token Cancelled'),
         ('token_completed', 'Token Completed'),
         ('booking_made', 'Booking Made'),
+        ('waitlist_joined', 'Joined Waitlist'),
         ('login', 'User Login'),
     ]
     
@@ -130,6 +231,11 @@ class ActivityLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp']),
+            # Retention deletes walk each action's rows oldest first
+            models.Index(fields=['action', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -138,6 +244,7 @@ class Notification(models.Model):
     TYPE_CHOICES = [
         ('token_ready', 'Your Token is Ready'),
         ('booking_confirmed', 'Booking Confirmed'),
+        ('waitlist_promoted', 'Promoted from Waitlist'),
         ('system', 'System Notification'),
     ]
     
@@ -150,6 +257,217 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['is_read', 'created_at']),
+            models.Index(fields=['notification_type', 'is_read', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.title}"
+
+
+class NotificationCounter(models.Model):
+    """Denormalized unread count per user, kept in step with Notification writes."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.unread} unread"
+
+
+class PriorityPass(models.Model):
+    """Entitles a user's tokens to a dispatch lane, for one service or all of them."""
+    REASON_CHOICES = [
+        ("accessibility", "Accessibility needs"),
+        ("staff", "Staff"),
+        ("exam_return", "Exam-day return"),
+        ("other", "Other"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='priority_passes')
+    lane = models.CharField(max_length=20, choices=LANE_CHOICES, default="priority")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    service = models.CharField(max_length=50, blank=True, help_text="Blank for every service")
+    valid_from = models.DateField(default=timezone.localdate)
+    valid_until = models.DateField(null=True, blank=True)
+    note = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Priority Passes"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_lane_display()} ({self.get_reason_display()})"
+
+
+class DailyRollup(models.Model):
+    """Per-day row counts kept for ActivityLog and Notification rows removed by retention (core/retention.py)."""
+    TABLE_CHOICES = [
+        ('activity', 'Activity log'),
+        ('notification', 'Notification'),
+    ]
+
+    table = models.CharField(max_length=20, choices=TABLE_CHOICES)
+    kind = models.CharField(max_length=50)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', 'table', 'kind']
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'kind', 'day'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.table} {self.kind} {self.day}: {self.count}"
+
+
+class WaitlistEntry(models.Model):
+    slot = models.ForeignKey(QueueSlot, related_name="waitlist", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = "Waitlist Entries"
+        constraints = [
+            models.UniqueConstraint(fields=['slot', 'user'], name='unique_waitlist_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} waiting for {self.slot}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a POST so client retries replay it instead of re-running."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=64)
+    # Null while the first request is still being processed
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    messages = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.endpoint} - {self.key}"
+
+
+class UserStats(models.Model):
+    """
+    Token and booking counters per user and service, maintained incrementally
+    for my_reports. `period` is "YYYY-MM" for a month row and "" for the
+    lifetime row; month rows count tokens by the month they were issued.
+    """
+    LIFETIME = ""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stats')
+    service = models.CharField(max_length=50)
+    period = models.CharField(max_length=7, blank=True)
+    issued = models.IntegerField(default=0)
+    active = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    expired = models.IntegerField(default=0)
+    bookings = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "User Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'service', 'period'], name='unique_user_stats_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.service} - {self.period or 'lifetime'}"
+
+
+class TokenEvent(models.Model):
+    """
+    Append-only log of token lifecycle changes. VisitHistory, token
+    ActivityLog rows, token notifications and the UserStats token counters
+    are projections of this table (see core/events.py).
+    """
+    KIND_CHOICES = [
+        ("issued", "Issued"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+        ("skipped", "Skipped"),
+        ("expired", "Expired"),
+    ]
+    SOURCE_CHOICES = [
+        ("booking", "Booking"),
+        ("waitlist", "Waitlist promotion"),
+        ("user", "User"),
+        ("staff", "Staff"),
+        ("sweep", "Expiry sweep"),
+        ("backfill", "Backfill"),
+        ("import", "CSV import"),
+    ]
+
+    # Plain references: the log outlives tokens and slots that get deleted.
+    token = models.ForeignKey(Token, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    slot = models.ForeignKey(QueueSlot, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    service = models.CharField(max_length=50)
+    number = models.PositiveIntegerField()
+    issued_at = models.DateTimeField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    previous_status = models.CharField(max_length=20, blank=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} Token #{self.number} {self.kind}"
+
+
+class ProjectorCheckpoint(models.Model):
+    """Id of the last TokenEvent a projector has applied."""
+    name = models.CharField(max_length=50, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class Change(models.Model):
+    """
+    Change feed: one row per write to a token, queue slot or canteen booking.
+    The id is the feed's sequence number; readers ask for everything after
+    the last id they saw (see core/changes.py).
+    """
+    TABLE_CHOICES = [
+        ("token", "Token"),
+        ("slot", "Queue slot"),
+        ("booking", "Canteen booking"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    table = models.CharField(max_length=20, choices=TABLE_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Compaction keeps the newest row per object
+            models.Index(fields=['table', 'object_id', 'id']),
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.title}"
\ No newline at end of file
+        return f"#{self.id} {self.table} {self.object_id}{' deleted' if self.deleted else ''}"
+
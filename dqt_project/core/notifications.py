@@ -0,0 +1,60 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Notification, NotificationCounter
+
+PRUNE_CHUNK_SIZE = 1000
+
+
+def unread_count(user):
+    """O(1): one primary-key lookup on the counter row."""
+    unread = NotificationCounter.objects.filter(user_id=user.pk).values_list('unread', flat=True).first()
+    return unread or 0
+
+
+def adjust_unread(user_id, delta):
+    if not delta:
+        return
+    if delta < 0:
+        # Never let concurrent reads drive the counter below zero
+        NotificationCounter.objects.filter(user_id=user_id, unread__gte=-delta).update(unread=F('unread') + delta)
+        NotificationCounter.objects.filter(user_id=user_id, unread__lt=-delta).update(unread=0)
+        return
+    if NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta):
+        return
+    try:
+        with transaction.atomic():
+            NotificationCounter.objects.create(user_id=user_id, unread=delta)
+    except IntegrityError:
+        NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta)
+
+
+def mark_read(user, notification_ids):
+    updated = Notification.objects.filter(
+        user=user, id__in=notification_ids, is_read=False
+    ).update(is_read=True)
+    adjust_unread(user.pk, -updated)
+    return updated
+
+
+def mark_all_read(user):
+    """One UPDATE over the user's unread rows, then reset the counter."""
+    with transaction.atomic():
+        updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        NotificationCounter.objects.filter(user_id=user.pk).update(unread=0)
+    return updated
+
+
+def rebuild_unread_counters():
+    """Recompute every counter from the notifications table."""
+    counts = dict(
+        Notification.objects.filter(is_read=False)
+        .values_list('user_id').annotate(total=Count('id')).order_by()
+    )
+    with transaction.atomic():
+        NotificationCounter.objects.all().delete()
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id, unread=total) for user_id, total in counts.items()],
+            batch_size=PRUNE_CHUNK_SIZE,
+        )
+    return len(counts)
@@ -0,0 +1,52 @@
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+PAGE_CACHE_PREFIX = "pagecache"
+
+
+def _cacheable(request):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # A flashed message belongs to this visitor only; len() does not consume it.
+    return not len(get_messages(request))
+
+
+def cache_anonymous_page(view_func):
+    """
+    Serve a whole page from the cache for anonymous visitors.
+
+    Signed-in users, non-GET requests and requests carrying flashed messages
+    always reach the view. Responses vary on Cookie so browsers and proxies
+    never hand an anonymous copy to a signed-in session.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            response = view_func(request, *args, **kwargs)
+            patch_vary_headers(response, ["Cookie"])
+            return response
+
+        key = f"{PAGE_CACHE_PREFIX}:{request.get_full_path()}"
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Page-Cache"] = "hit"
+        else:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, (response.content, response["Content-Type"]), settings.PAGE_CACHE_SECONDS)
+            response["X-Page-Cache"] = "miss"
+
+        patch_vary_headers(response, ["Cookie"])
+        patch_cache_control(response, private=True, max_age=settings.PAGE_CACHE_SECONDS)
+        return response
+
+    return wrapper
@@ -0,0 +1,209 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+PROFILING_DEFAULTS = {
+    # Staff can ask for a profile with ?profile=1 or an X-Profile: 1 header
+    'QUERY_PARAM': 'profile',
+    'HEADER': 'X-Profile',
+    # Also profile 1 in SAMPLE_EVERY requests from anyone (0 disables sampling)
+    'SAMPLE_EVERY': 0,
+    'DIRECTORY': None,  # defaults to BASE_DIR / 'profiles'
+    # The directory is a ring: the oldest profiles go once there are more
+    'MAX_PROFILES': 200,
+    # Project frames kept per query to show where it was issued from
+    'STACK_DEPTH': 5,
+}
+
+PROFILE_SUFFIX = '.prof'
+META_SUFFIX = '.json'
+
+_ring_lock = threading.Lock()
+
+
+def profiling_settings():
+    return {**PROFILING_DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def profile_directory():
+    return Path(profiling_settings()['DIRECTORY'] or Path(settings.BASE_DIR) / 'profiles')
+
+
+def should_profile(request, config):
+    """Staff opt in per request; everyone else is only ever sampled."""
+    header = 'HTTP_' + config['HEADER'].upper().replace('-', '_')
+    if request.GET.get(config['QUERY_PARAM']) == '1' or request.META.get(header) == '1':
+        # Only look the user up (a session query) when the flag is present
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+    every = config['SAMPLE_EVERY']
+    return bool(every) and random.random() < 1 / every
+
+
+def _origin(depth):
+    """The innermost project frames (not Django, not site-packages) that led to a query."""
+    root = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(root) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('profiling.py')
+    ]
+    return [f"{os.path.relpath(frame.filename, root)}:{frame.lineno} in {frame.name}" for frame in frames[-depth:]]
+
+
+class QueryRecorder:
+    """execute_wrapper that times every query and remembers where it came from."""
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+                'stack': _origin(self.depth),
+            })
+
+
+def run_profiled(request, get_response, config):
+    """Call get_response under cProfile and the query recorder, then save both."""
+    recorder = QueryRecorder(config['STACK_DEPTH'])
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    elapsed = time.perf_counter() - started
+
+    match = request.resolver_match
+    meta = {
+        'url_name': (match.view_name if match else None) or '(unresolved)',
+        'path': request.path,
+        'method': request.method,
+        'status': response.status_code,
+        'user_id': request.user.pk if getattr(request, 'user', None) and request.user.is_authenticated else None,
+        'started_at': time.time() - elapsed,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'sql_ms': round(sum(query['ms'] for query in recorder.queries), 2),
+        'query_count': len(recorder.queries),
+        'queries': recorder.queries,
+    }
+    response['X-Profile-Id'] = save_profile(profiler, meta)
+    return response
+
+
+def save_profile(profiler, meta):
+    """
+    Write <id>.prof (pstats format: snakeviz, `python -m pstats`) and <id>.json
+    (request metadata and queries), then trim the ring. Returns the id.
+    """
+    directory = profile_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{time.time_ns()}-{meta['url_name'].replace(':', '.')}"
+    meta['id'] = profile_id
+    profiler.dump_stats(directory / f"{profile_id}{PROFILE_SUFFIX}")
+    # The .json is written last and its presence marks a complete profile
+    tmp = directory / f".{profile_id}{META_SUFFIX}"
+    tmp.write_text(json.dumps(meta))
+    tmp.replace(directory / f"{profile_id}{META_SUFFIX}")
+    _trim(directory, profiling_settings()['MAX_PROFILES'])
+    return profile_id
+
+
+def _trim(directory, keep):
+    with _ring_lock:
+        # Ids start with a nanosecond timestamp, so names sort oldest first
+        ids = sorted(path.stem for path in directory.glob(f"*{META_SUFFIX}") if not path.name.startswith('.'))
+        for profile_id in ids[:max(len(ids) - keep, 0)]:
+            for suffix in (META_SUFFIX, PROFILE_SUFFIX):
+                try:
+                    (directory / f"{profile_id}{suffix}").unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def _valid_id(profile_id):
+    return '/' not in profile_id and '\\' not in profile_id and not profile_id.startswith('.')
+
+
+def load_meta(profile_id):
+    path = profile_directory() / f"{profile_id}{META_SUFFIX}"
+    if not _valid_id(profile_id) or not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def profile_path(profile_id):
+    path = profile_directory() / f"{profile_id}{PROFILE_SUFFIX}"
+    return path if _valid_id(profile_id) and path.exists() else None
+
+
+def slowest_by_url(per_url=5):
+    """{url_name: {'count', 'worst': [meta, ...]}}, slowest URL names first."""
+    directory = profile_directory()
+    groups = defaultdict(list)
+    for path in directory.glob(f"*{META_SUFFIX}") if directory.exists() else ():
+        if path.name.startswith('.'):
+            continue
+        try:
+            meta = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # trimmed or being written
+        meta.pop('queries', None)
+        groups[meta['url_name']].append(meta)
+    summary = {
+        name: {
+            'count': len(metas),
+            'worst': sorted(metas, key=lambda meta: -meta['elapsed_ms'])[:per_url],
+        }
+        for name, metas in groups.items()
+    }
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['worst'][0]['elapsed_ms']))
+
+
+def top_functions(profile_id, limit=30, sort='cumulative'):
+    """The pstats table for one profile, as text."""
+    path = profile_path(profile_id)
+    if path is None:
+        return ""
+    stream = io.StringIO()
+    stats = pstats.Stats(str(path), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def queries_by_origin(meta):
+    """The profile's queries grouped by the project line that issued them, costliest first."""
+    groups = defaultdict(lambda: {'count': 0, 'ms': 0.0, 'sql': None})
+    for query in meta['queries']:
+        origin = query['stack'][-1] if query['stack'] else '(outside the project)'
+        group = groups[origin]
+        group['count'] += 1
+        group['ms'] = round(group['ms'] + query['ms'], 3)
+        group['sql'] = group['sql'] or query['sql']
+        group['stack'] = query['stack']
+    return sorted(groups.items(), key=lambda item: -item[1]['ms'])
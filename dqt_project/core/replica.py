@@ -0,0 +1,142 @@
+"""
+Read-replica routing for read-only analytical views.
+
+Views opt in with @read_from_replica (or the replica_reads() context
+manager for part of a view); everything else, including every write, goes
+to the primary. Locally the replica is a periodic copy of the primary SQLite
+file made with the SQLite backup API; when that copy is missing or older than
+REPLICA_MAX_LAG_SECONDS, reads fall back to the primary.
+"""
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DB_ALIAS = 'replica'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_freshness = {'checked_at': 0.0, 'fresh': False}
+_refresher_thread = None
+
+
+def _replica_settings():
+    return settings.DATABASES.get(REPLICA_DB_ALIAS)
+
+
+def replica_lag():
+    """Seconds since the local replica copy was refreshed, or None if there is none."""
+    config = _replica_settings()
+    if not config:
+        return None
+    if config['ENGINE'] != 'django.db.backends.sqlite3':
+        # Server replicas report their own lag; treat them as current.
+        return 0.0
+    try:
+        return max(0.0, time.time() - os.path.getmtime(config['NAME']))
+    except OSError:
+        return None
+
+
+def replica_is_fresh():
+    """Cached for a second so routing doesn't stat the file on every query."""
+    now = time.monotonic()
+    if now - _freshness['checked_at'] > 1.0:
+        lag = replica_lag()
+        _freshness['fresh'] = lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        _freshness['checked_at'] = now
+    return _freshness['fresh']
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_is_fresh():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads():
+    """Route reads inside the block to the replica (querysets must be evaluated inside it)."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view_func):
+    """
+    Serve a read-only view from the replica.
+
+    Place it below @login_required so request.user is still loaded from the
+    primary (a freshly registered user may not be in the replica yet).
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def refresh_replica():
+    """Copy the primary SQLite database over the replica. Returns elapsed seconds."""
+    config = _replica_settings()
+    primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+    if not config or config['ENGINE'] != 'django.db.backends.sqlite3':
+        raise ValueError("refresh_replica() only manages a local SQLite replica")
+
+    started = time.monotonic()
+    target = str(config['NAME'])
+    tmp_target = f"{target}.tmp"
+    source = sqlite3.connect(str(primary['NAME']))
+    dest = sqlite3.connect(tmp_target)
+    try:
+        # Copy in steps so booking writes are not blocked for the whole copy.
+        source.backup(dest, pages=1024, sleep=0.005)
+    finally:
+        dest.close()
+        source.close()
+    # Atomic swap: open replica connections keep reading the previous copy.
+    os.replace(tmp_target, target)
+    _freshness['checked_at'] = 0.0
+    return time.monotonic() - started
+
+
+def _run_refresher(interval):
+    while True:
+        try:
+            refresh_replica()
+        except Exception:
+            logger.exception("Replica refresh failed")
+        time.sleep(interval)
+
+
+def start_replica_refresher(interval=None):
+    """Start the background replica refresh thread once per process."""
+    global _refresher_thread
+    interval = interval or settings.REPLICA_REFRESH_INTERVAL
+    if not interval or _refresher_thread is not None:
+        return
+    _refresher_thread = threading.Thread(
+        target=_run_refresher, args=(interval,), name="replica-refresher", daemon=True
+    )
+    _refresher_thread.start()
@@ -0,0 +1,124 @@
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ActivityLog, DailyRollup, Notification
+
+RETENTION_DEFAULTS = {
+    # Days to keep ActivityLog rows by action; 'default' covers every other
+    # action and None keeps that action forever
+    'ACTIVITY_TTL_DAYS': {'default': 180},
+    # Days to keep read notifications by notification_type ('default' falls
+    # back to NOTIFICATION_READ_TTL_DAYS). Unread ones are never pruned.
+    'NOTIFICATION_TTL_DAYS': {},
+    # Rows deleted per transaction, and the sleep between transactions that
+    # lets booking writes take the database lock in between
+    'CHUNK_SIZE': 500,
+    'PAUSE_SECONDS': 0.1,
+    # Count each day's rows into DailyRollup before deleting them
+    'ROLLUP': True,
+}
+
+
+def retention_settings():
+    return {**RETENTION_DEFAULTS, **getattr(settings, 'RETENTION', {})}
+
+
+def _targets(config):
+    """(table, model, kind field, time field, extra filter, {kind: ttl days})."""
+    return [
+        ('activity', ActivityLog, 'action', 'timestamp', {},
+         {**RETENTION_DEFAULTS['ACTIVITY_TTL_DAYS'], **config['ACTIVITY_TTL_DAYS']}),
+        ('notification', Notification, 'notification_type', 'created_at', {'is_read': True},
+         {'default': settings.NOTIFICATION_READ_TTL_DAYS, **config['NOTIFICATION_TTL_DAYS']}),
+    ]
+
+
+def retention_cutoffs(table, kinds, now=None):
+    """
+    {kind: cutoff} for `table` ('activity' or 'notification'): rows of that
+    kind older than the cutoff are pruned, and kinds kept forever map to
+    None. Rebuilt projections skip what retention has already deleted.
+    """
+    now = now or timezone.now()
+    ttls = next(ttls for name, _, _, _, _, ttls in _targets(retention_settings()) if name == table)
+    cutoffs = {}
+    for kind in kinds:
+        days = ttls.get(kind, ttls['default'])
+        cutoffs[kind] = None if days is None else now - timedelta(days=days)
+    return cutoffs
+
+
+def _roll_up(table, kind, times):
+    per_day = Counter(timezone.localdate(moment) for moment in times)
+    existing = set(
+        DailyRollup.objects.filter(table=table, kind=kind, day__in=per_day).values_list('day', flat=True)
+    )
+    for day in existing:
+        DailyRollup.objects.filter(table=table, kind=kind, day=day).update(count=F('count') + per_day[day])
+    DailyRollup.objects.bulk_create([
+        DailyRollup(table=table, kind=kind, day=day, count=count)
+        for day, count in per_day.items() if day not in existing
+    ])
+
+
+def apply_retention(tables=None, ttl_days=None, dry_run=False, now=None):
+    """
+    Delete ActivityLog rows and read notifications past their TTL. Each
+    (table, kind) is walked oldest first through its (kind, time) index, a
+    chunk per transaction with a pause in between, rolling each chunk up
+    into DailyRollup first. `ttl_days` replaces every TTL for this run;
+    `dry_run` only counts. Returns {'deleted': {table: {kind: rows}},
+    'total', 'dry_run', 'elapsed', 'rows_per_second'}.
+    """
+    config = retention_settings()
+    now = now or timezone.now()
+    chunk_size, pause = config['CHUNK_SIZE'], config['PAUSE_SECONDS']
+    started = time.monotonic()
+    deleted = defaultdict(dict)
+
+    for table, model, kind_field, time_field, extra, ttls in _targets(config):
+        if tables and table not in tables:
+            continue
+        if ttl_days is not None:
+            ttls = {'default': ttl_days}
+        kinds = model.objects.filter(**extra).order_by().values_list(kind_field, flat=True).distinct()
+        for kind in kinds:
+            days = ttls.get(kind, ttls['default'])
+            if days is None:
+                continue
+            expired = model.objects.filter(
+                **extra, **{kind_field: kind, f'{time_field}__lt': now - timedelta(days=days)}
+            )
+            if dry_run:
+                deleted[table][kind] = expired.count()
+                continue
+
+            removed = 0
+            while True:
+                with transaction.atomic():
+                    rows = list(expired.order_by(time_field).values_list('id', time_field)[:chunk_size])
+                    if rows:
+                        if config['ROLLUP']:
+                            _roll_up(table, kind, [moment for _, moment in rows])
+                        model.objects.filter(id__in=[pk for pk, _ in rows]).delete()
+                removed += len(rows)
+                if len(rows) < chunk_size:
+                    break
+                time.sleep(pause)
+            deleted[table][kind] = removed
+
+    elapsed = time.monotonic() - started
+    total = sum(sum(kinds.values()) for kinds in deleted.values())
+    return {
+        'deleted': dict(deleted),
+        'total': total,
+        'dry_run': dry_run,
+        'elapsed': elapsed,
+        'rows_per_second': total / elapsed if elapsed and not dry_run else None,
+    }
@@ -0,0 +1,99 @@
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ActivityLog, Notification
+
+# Model -> columns in its full-text index. On SQLite these are the FTS5
+# tables <db_table>_fts created by migration 0015 and kept current by
+# triggers; elsewhere the same columns are searched with the fallback.
+SEARCH_FIELDS = {
+    ActivityLog: ('message',),
+    Notification: ('title', 'message'),
+    User: ('username', 'email', 'first_name', 'last_name'),
+}
+
+_fts_tables = {}
+
+
+def _terms(text):
+    return re.findall(r'\w+', text.lower())[:10]
+
+
+def fts_available(model):
+    """True when `model` has an FTS5 table on its database (checked once per process)."""
+    alias = model.objects.db
+    key = (alias, model._meta.db_table)
+    if key not in _fts_tables:
+        connection = connections[alias]
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [f'{model._meta.db_table}_fts'],
+                )
+                available = cursor.fetchone() is not None
+        _fts_tables[key] = available
+    return _fts_tables[key]
+
+
+def match_expression(text):
+    """FTS5 query for `text`: every word must appear, each as a prefix ("alice" finds "alice2024")."""
+    return ' '.join(f'"{term}"*' for term in _terms(text))
+
+
+def _matching_ids(model, text):
+    """Queryset-compatible expression for the primary keys of `model` rows matching `text`."""
+    if fts_available(model):
+        table = f'{model._meta.db_table}_fts'
+        return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match_expression(text)])
+
+    fields = SEARCH_FIELDS[model]
+    if connections[model.objects.db].vendor == 'postgresql':
+        # Imported here: it needs psycopg, which SQLite installs don't have
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+        query = SearchQuery(' & '.join(f'{term}:*' for term in _terms(text)), search_type='raw', config='simple')
+        return (
+            model.objects.annotate(document=SearchVector(*fields, config='simple'))
+            .filter(document=query).values('pk')
+        )
+    return model.objects.filter(reduce(and_, [
+        reduce(or_, [Q(**{f'{field}__icontains': term}) for field in fields]) for term in _terms(text)
+    ])).values('pk')
+
+
+def search(queryset, text, through=None):
+    """
+    Narrow `queryset` to rows whose indexed text matches every word of
+    `text`. With `through`, the index searched is that of the model the
+    named foreign key points to, e.g. search(Token.objects.all(), "alice",
+    through="user").
+    """
+    if not _terms(text):
+        return queryset.none()
+    if through is None:
+        return queryset.filter(pk__in=_matching_ids(queryset.model, text))
+    model = queryset.model._meta.get_field(through).related_model
+    return queryset.filter(**{f'{through}__in': _matching_ids(model, text)})
+
+
+class FullTextSearchMixin:
+    """
+    ModelAdmin mixin that answers the changelist search box from the
+    full-text indexes instead of icontains over search_fields (which must
+    still be set for the box to show). `fulltext_through` lists the indexes
+    to search: None for the model's own, or a foreign key name for the
+    related model's; a row matching any of them is returned.
+    """
+    fulltext_through = (None,)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return reduce(or_, [search(queryset, search_term, through) for through in self.fulltext_through]), False
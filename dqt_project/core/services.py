@@ -0,0 +1,75 @@
+from django.core.cache import cache
+
+from .models import Service
+
+REGISTRY_VERSION_KEY = "services:registry:version"
+
+# (version, {code: Service}) for this process; replaced wholesale, never mutated
+_registry = (None, {})
+
+
+def _load():
+    return {service.code: service for service in Service.objects.order_by('position', 'name')}
+
+
+def registry():
+    """
+    Every Service by code, in display order, loaded once per process.
+
+    Saving or deleting a Service bumps a version in the shared cache; each
+    process reloads on its next lookup after that, so the registry costs a
+    cache read per call and no queries.
+    """
+    global _registry
+    version = cache.get_or_set(REGISTRY_VERSION_KEY, 1, None)
+    if _registry[0] != version:
+        _registry = (version, _load())
+    return _registry[1]
+
+
+def invalidate_registry():
+    global _registry
+    _registry = (None, {})
+    try:
+        cache.incr(REGISTRY_VERSION_KEY)
+    except ValueError:
+        cache.set(REGISTRY_VERSION_KEY, 1, None)
+
+
+def get_service(code):
+    return registry().get(code)
+
+
+def active_services():
+    return [service for service in registry().values() if service.is_active]
+
+
+def service_label(code):
+    service = get_service(code)
+    return service.name if service else (code or "").capitalize()
+
+
+def service_choices():
+    """(code, name) pairs for forms; callable so new services show up without a restart."""
+    return [(service.code, service.name) for service in active_services()]
+
+
+def service_minutes(code):
+    """Average minutes per token, used for board ETAs and as the simulator's fallback."""
+    service = get_service(code)
+    return service.average_service_minutes if service else Service._meta.get_field('average_service_minutes').default
+
+
+def with_services(counts):
+    """
+    {code: value} from a grouped query -> [(Service, value)] for every active
+    service (0 when absent), followed by any other codes that had rows.
+    """
+    services = registry()
+    rows = [(service, counts.get(service.code, 0)) for service in active_services()]
+    listed = {service.code for service, _ in rows}
+    rows += [
+        (services.get(code) or Service(code=code, name=service_label(code), color='secondary'), value)
+        for code, value in counts.items() if code not in listed
+    ]
+    return rows
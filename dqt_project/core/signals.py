@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import forget_user
+from .changes import record
+from .display import mark_queue_changed
+from .models import CanteenBooking, Notification, QueueSlot, Service, Token
+from .notifications import adjust_unread
+from .services import invalidate_registry
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    mark_queue_changed(instance.service)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_save, sender=QueueSlot)
+@receiver(post_save, sender=CanteenBooking)
+def feed_saved(sender, instance, **kwargs):
+    record(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_delete, sender=QueueSlot)
+@receiver(post_delete, sender=CanteenBooking)
+def feed_deleted(sender, instance, **kwargs):
+    record(sender, [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=Notification)
+def notification_created(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(instance.user_id, -1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    # After commit, so no process reloads the old rows under the new version
+    transaction.on_commit(invalidate_registry)
@@ -0,0 +1,182 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .analytics import columns, epoch_seconds, np
+from .dates import local_window
+from .models import Token, VisitHistory
+from .services import service_minutes
+
+DEFAULT_SLOT_LENGTHS = (15, 30, 45, 60, 90, 120)
+MIN_SERVICE_SAMPLES = 30
+MAX_SERVICE_GAP_MINUTES = 60
+
+
+def fit_service(service, days=None):
+    """
+    Fit the inputs for one service from the last `days` of history:
+
+    - arrival rate: tokens issued per hour, over the hours that saw any tokens
+    - service times: gaps between consecutive completions within a slot (a
+      busy counter completes back to back), falling back to an exponential
+      with the service's average_service_minutes mean when there are too few samples
+    """
+    days = days or settings.SIMULATION_HISTORY_DAYS
+    end = timezone.localdate()
+    window_start, window_end = local_window(end - timedelta(days=days - 1), end)
+
+    (issued,) = columns(
+        Token.objects.filter(issued_at__gte=window_start, issued_at__lt=window_end)
+        .annotate(service_name=Coalesce("service", "slot__service"))
+        .filter(service_name=service)
+        .order_by(),
+        ("issued_at",),
+    )
+    issued_epoch = epoch_seconds(issued)
+    active_hours = np.unique(issued_epoch // 3600).size
+
+    slot_ids, completed = columns(
+        VisitHistory.objects.filter(
+            outcome="completed", slot__service=service,
+            timestamp__gte=window_start, timestamp__lt=window_end,
+        ).order_by("slot_id", "timestamp"),
+        ("slot_id", "timestamp"),
+    )
+    slot_ids = np.array(slot_ids, dtype=np.int64)
+    gaps = np.diff(epoch_seconds(completed)) / 60
+    gaps = gaps[(slot_ids[1:] == slot_ids[:-1]) & (gaps > 0) & (gaps <= MAX_SERVICE_GAP_MINUTES)]
+
+    empirical = len(gaps) >= MIN_SERVICE_SAMPLES
+    return {
+        "service": service,
+        "days": days,
+        "tokens": int(len(issued_epoch)),
+        "arrivals_per_hour": len(issued_epoch) / active_hours if active_hours else 0.0,
+        "service_samples": gaps if empirical else np.empty(0),
+        "mean_service_minutes": float(gaps.mean()) if empirical else float(service_minutes(service)),
+        "empirical_service": empirical,
+    }
+
+
+def simulate_slot_length(arrivals_per_hour, service_samples, mean_service_minutes,
+                         slot_minutes, max_tokens, replications, seed):
+    """
+    Simulate one slot length for every max_tokens in 1..max_tokens at once.
+
+    Arrivals are Poisson over the slot and served FIFO by one counter. The
+    Lindley recursion runs over customers with all replications as one
+    vector. Because admitting more tokens never changes the waits of earlier
+    ones, a single pass covers every cap. Times are issue to completion.
+    """
+    rng = np.random.default_rng(seed)
+    rate = arrivals_per_hour / 60
+    expected = rate * slot_minutes
+    # Enough draws that demand beyond the last one is negligible
+    draws = max(max_tokens, math.ceil(expected + 6 * math.sqrt(expected) + 1))
+    if rate > 0:
+        arrival = np.cumsum(rng.exponential(1 / rate, size=(replications, draws)), axis=1)
+    else:
+        arrival = np.full((replications, draws), np.inf)
+    demand = (arrival <= slot_minutes).sum(axis=1)
+
+    arrival = arrival[:, :max_tokens]
+    if len(service_samples):
+        service = rng.choice(service_samples, size=(replications, max_tokens))
+    else:
+        service = rng.exponential(mean_service_minutes, size=(replications, max_tokens))
+
+    start = np.empty_like(arrival)
+    free = np.zeros(replications)
+    for k in range(max_tokens):
+        start[:, k] = np.maximum(arrival[:, k], free)
+        free = start[:, k] + service[:, k]
+    sojourn = start + service - arrival
+    arrived = arrival <= slot_minutes
+
+    rows = []
+    total_demand = max(int(demand.sum()), 1)
+    for cap in range(1, max_tokens + 1):
+        admitted = arrived[:, :cap]
+        served = sojourn[:, :cap][admitted]
+        rows.append({
+            "slot_minutes": slot_minutes,
+            "max_tokens": cap,
+            "p95_minutes": round(float(np.percentile(served, 95)), 1) if len(served) else 0.0,
+            "overrun": round(float((start[:, :cap][admitted] > slot_minutes).mean()), 3) if len(served) else 0.0,
+            "turned_away": round(float(np.maximum(demand - cap, 0).sum() / total_demand), 3),
+            "served_per_hour": round(len(served) / replications / (slot_minutes / 60), 2),
+        })
+    return rows
+
+
+def _simulate_task(args):
+    return simulate_slot_length(*args)
+
+
+def sweep(fit, slot_lengths=DEFAULT_SLOT_LENGTHS, max_tokens=None, replications=None, seed=0, workers=1):
+    """Every (slot length, max_tokens) configuration; slot lengths go to a process pool when workers > 1."""
+    max_tokens = max_tokens or settings.SIMULATION_MAX_TOKENS
+    replications = replications or settings.SIMULATION_REPLICATIONS
+    tasks = [
+        (fit["arrivals_per_hour"], fit["service_samples"], fit["mean_service_minutes"],
+         slot_minutes, max_tokens, replications, seed + index)
+        for index, slot_minutes in enumerate(slot_lengths)
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_task, tasks))
+    else:
+        results = [_simulate_task(task) for task in tasks]
+    return [row for rows in results for row in rows]
+
+
+def recommend(rows, target_minutes, max_overrun=None):
+    """
+    Per slot length, the largest max_tokens whose p95 stays under the target
+    without overrunning the slot too often; overall, the one serving the most
+    tokens per hour (shorter slots win ties).
+    """
+    max_overrun = settings.SIMULATION_MAX_OVERRUN if max_overrun is None else max_overrun
+    per_length = {}
+    for row in rows:
+        if row["p95_minutes"] <= target_minutes and row["overrun"] <= max_overrun:
+            best = per_length.get(row["slot_minutes"])
+            if best is None or row["max_tokens"] > best["max_tokens"]:
+                per_length[row["slot_minutes"]] = row
+    options = sorted(per_length.values(), key=lambda row: row["slot_minutes"])
+    best = max(options, key=lambda row: (row["served_per_hour"], -row["slot_minutes"]), default=None)
+    return {"per_slot_length": options, "best": best}
+
+
+def plan_capacity(service, target_minutes=None, slot_lengths=DEFAULT_SLOT_LENGTHS,
+                  replications=None, workers=1, seed=0):
+    """Fit, sweep and recommend for one service. Returns plain data (JSON-safe)."""
+    started = time.monotonic()
+    target_minutes = target_minutes or settings.SIMULATION_P95_TARGET_MINUTES
+    fit = fit_service(service)
+    # Without any history there is nothing to size against
+    rows = sweep(fit, slot_lengths, replications=replications, seed=seed, workers=workers) if fit["tokens"] else []
+    return {
+        "service": service,
+        "target_minutes": target_minutes,
+        "fit": {key: value for key, value in fit.items() if key != "service_samples"},
+        "configurations": len(rows),
+        "recommendation": recommend(rows, target_minutes),
+        "elapsed": round(time.monotonic() - started, 3),
+    }
+
+
+def get_capacity_plan(service, target_minutes):
+    """plan_capacity with default sweep settings, cached like the analytics page."""
+    key = f"capacity-plan:{service}:{target_minutes}"
+    plan = cache.get(key)
+    if plan is None:
+        plan = plan_capacity(service, target_minutes)
+        cache.set(key, plan, settings.ANALYTICS_CACHE_SECONDS)
+    return plan
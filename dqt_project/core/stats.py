@@ -0,0 +1,155 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import CanteenBooking, Token, UserStats
+from .services import get_service, service_label
+
+COUNTER_FIELDS = ("issued", "active", "completed", "cancelled", "skipped", "expired", "bookings")
+STATUS_FIELDS = {"active", "completed", "cancelled", "skipped", "expired"}
+BOOKING_SERVICE = "canteen"
+
+
+def period_for(when):
+    return timezone.localtime(when).strftime("%Y-%m")
+
+
+def bump(user_id, service, when, **deltas):
+    """Apply counter deltas to the lifetime row and the month row for `when`."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    for period in (UserStats.LIFETIME, period_for(when)):
+        _bump_period(user_id, service, period, deltas)
+
+
+def apply_token_deltas(deltas):
+    """
+    Apply {(user_id, service, period): Counter} to the month rows and the
+    matching lifetime rows, one UPDATE (or INSERT) per row.
+    """
+    lifetime = defaultdict(Counter)
+    for (user_id, service, period), counter in deltas.items():
+        lifetime[(user_id, service)].update(counter)
+        _bump_period(user_id, service, period, {field: delta for field, delta in counter.items() if delta})
+    for (user_id, service), counter in lifetime.items():
+        _bump_period(user_id, service, UserStats.LIFETIME, {field: delta for field, delta in counter.items() if delta})
+
+
+def _bump_period(user_id, service, period, deltas):
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    rows = UserStats.objects.filter(user_id=user_id, service=service, period=period)
+    if not rows.update(**updates):
+        try:
+            with transaction.atomic():
+                UserStats.objects.create(user_id=user_id, service=service, period=period, **deltas)
+        except IntegrityError:
+            rows.update(**updates)
+
+
+def booking_made(booking):
+    bump(booking.user_id, BOOKING_SERVICE, booking.booked_at, bookings=1)
+
+
+def rebuild_user_stats(batch_size=1000):
+    """Recompute every UserStats row from Token and CanteenBooking with grouped queries."""
+    totals = defaultdict(Counter)
+
+    token_groups = (
+        Token.objects.annotate(
+            month=TruncMonth("issued_at"),
+            service_name=Coalesce("service", "slot__service"),
+        )
+        .values("user_id", "service_name", "month", "status")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for row in token_groups:
+        period = row["month"].strftime("%Y-%m")
+        for key in ((row["user_id"], row["service_name"], UserStats.LIFETIME),
+                    (row["user_id"], row["service_name"], period)):
+            totals[key]["issued"] += row["total"]
+            if row["status"] in STATUS_FIELDS:
+                totals[key][row["status"]] += row["total"]
+
+    booking_groups = (
+        CanteenBooking.objects.annotate(month=TruncMonth("booked_at"))
+        .values("user_id", "month")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for row in booking_groups:
+        period = row["month"].strftime("%Y-%m")
+        for key in ((row["user_id"], BOOKING_SERVICE, UserStats.LIFETIME),
+                    (row["user_id"], BOOKING_SERVICE, period)):
+            totals[key]["bookings"] += row["total"]
+
+    with transaction.atomic():
+        UserStats.objects.all().delete()
+        UserStats.objects.bulk_create(
+            [
+                UserStats(user_id=user_id, service=service, period=period, **counters)
+                for (user_id, service, period), counters in totals.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+def report_for(user, months=6):
+    """Everything my_reports shows: one indexed lookup on UserStats plus a count of recent bookings."""
+    rows = list(UserStats.objects.filter(user=user))
+    lifetime = [row for row in rows if row.period == UserStats.LIFETIME]
+
+    def total(field, source):
+        return sum(getattr(row, field) for row in source)
+
+    monthly = defaultdict(Counter)
+    for row in rows:
+        if row.period != UserStats.LIFETIME:
+            for field in COUNTER_FIELDS:
+                monthly[row.period][field] += getattr(row, field)
+
+    return {
+        "token_stats": {
+            "total_tokens": total("issued", lifetime),
+            "completed_tokens": total("completed", lifetime),
+            "active_tokens": total("active", lifetime),
+            "cancelled_tokens": total("cancelled", lifetime),
+        },
+        "canteen_stats": {
+            "total_bookings": total("bookings", lifetime),
+            # The last 30 days, not the current calendar month
+            "recent_bookings": CanteenBooking.objects.filter(
+                user=user, date__gte=timezone.localdate() - timedelta(days=30)
+            ).count(),
+        },
+        "service_stats": sorted(
+            (
+                {
+                    "service": service_label(row.service),
+                    "icon": getattr(get_service(row.service), "icon", "fas fa-ticket-alt"),
+                    "total": row.issued,
+                    "completed": row.completed,
+                }
+                for row in lifetime if row.issued
+            ),
+            key=lambda stat: -stat["total"],
+        ),
+        "monthly_stats": [
+            {
+                "month": period,
+                "total": counters["issued"],
+                "completed": counters["completed"],
+                "cancelled": counters["cancelled"],
+            }
+            for period, counters in sorted(monthly.items(), reverse=True)
+            if counters["issued"]
+        ][:months],
+    }
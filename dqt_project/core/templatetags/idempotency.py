@@ -0,0 +1,14 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import IDEMPOTENCY_FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key_field():
+    """Hidden input with a fresh key; retries of the rendered form reuse it."""
+    return format_html('<input type="hidden" name="{}" value="{}">', IDEMPOTENCY_FIELD, uuid.uuid4().hex)
@@ -1,3 +1,466 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import idempotency
+from .canteen import SeatBookingError, book_seat
+from .changes import changes_since, compact, current_cursor, make_cursor, parse_cursor
+from .checkin import CheckinError, checkin_payload, complete_checkins, verify_payload
+from .dates import RequestDates, local_window
+from .dispatch import Dispatcher
+from .events import issue_token, replay_projections, transition
+from .expiry import sweep_expired_tokens
+from .importer import import_csv
+from .middleware import ADMISSION_DEFAULTS, BucketStore, TokenBucket
+from .models import (
+    ActivityLog, CanteenBooking, CanteenSlotCapacity, Change, IdempotencyKey, Notification, PriorityPass, QueueSlot,
+    Token, TokenEvent, WaitlistEntry,
+)
+
+
+# Pages render {% static %} without a collectstatic manifest in tests
+plain_static = override_settings(STORAGES={
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+
+
+def query_plan(sql):
+    """EXPLAIN QUERY PLAN for SQL captured from a request (parameters already inlined)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return " | ".join(row[-1] for row in cursor.fetchall())
+
+
+@override_settings(TIME_ZONE="Asia/Kolkata")
+class DateWindowTests(TestCase):
+    def test_local_day_is_utc_half_open_range(self):
+        window = local_window(date(2026, 3, 10), date(2026, 3, 10))
+        self.assertEqual(window.start, datetime(2026, 3, 9, 18, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(window.end - window.start, timedelta(days=1))
+        self.assertEqual(
+            window.lookup("issued_at"), {"issued_at__gte": window.start, "issued_at__lt": window.end}
+        )
+
+    def test_today_follows_local_date_not_utc(self):
+        # 20:00 UTC on the 9th is already the 10th in Kolkata
+        dates = RequestDates(now=datetime(2026, 3, 9, 20, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(dates.today, date(2026, 3, 10))
+        self.assertEqual(dates.since(7).start, local_window(date(2026, 3, 3), date(2026, 3, 3)).start)
+        self.assertIs(dates.today_window, dates.today_window)
+
+    def test_window_matches_tokens_issued_that_local_day(self):
+        user = User.objects.create_user("student", "student@example.com", "pw")
+        slot = QueueSlot.objects.create(
+            service="library", date=date(2026, 3, 10), start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+        inside, before = issue_token(slot, user), issue_token(slot, user)
+        window = local_window(date(2026, 3, 10), date(2026, 3, 10))
+        Token.objects.filter(pk=inside.pk).update(issued_at=window.start)
+        Token.objects.filter(pk=before.pk).update(issued_at=window.start - timedelta(microseconds=1))
+        self.assertQuerySetEqual(Token.objects.filter(**window.lookup("issued_at")), [inside], ordered=False)
+
+
+@plain_static
+class TokenTransitionTests(TestCase):
+    """Status changes follow Token.TRANSITIONS, and a refused move writes no event."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "pw", is_staff=True, is_superuser=True)
+        cls.slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate(), start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+
+    def setUp(self):
+        self.token = issue_token(self.slot, self.staff)
+
+    def events(self, kind):
+        return TokenEvent.objects.filter(token_id=self.token.pk, kind=kind).count()
+
+    def test_cancelled_token_cannot_be_completed(self):
+        self.assertTrue(transition(self.token, "cancelled", "user"))
+        self.assertFalse(transition(self.token, "completed", "staff"))
+        self.assertEqual(Token.objects.get(pk=self.token.pk).status, "cancelled")
+        self.assertEqual(self.events("completed"), 0)
+
+    def test_completed_token_cannot_be_completed_again(self):
+        self.assertTrue(transition(self.token, "completed", "staff"))
+        self.assertFalse(transition(Token.objects.get(pk=self.token.pk), "completed", "staff"))
+        self.assertEqual(self.events("completed"), 1)
+
+    def test_stale_instance_loses_the_race(self):
+        first, second = Token.objects.get(pk=self.token.pk), Token.objects.get(pk=self.token.pk)
+        self.assertTrue(transition(first, "completed", "staff"))
+        # `second` still reads "active", but the conditional UPDATE sees the real row
+        self.assertFalse(transition(second, "skipped", "staff"))
+        self.assertEqual(Token.objects.get(pk=self.token.pk).status, "completed")
+        self.assertEqual(self.events("completed"), 1)
+        self.assertEqual(self.events("skipped"), 0)
+
+    def test_admin_cannot_edit_status_and_actions_follow_transitions(self):
+        self.client.force_login(self.staff)
+        url = reverse("admin:core_token_change", args=[self.token.pk])
+        self.assertNotContains(self.client.get(url), 'name="status"')
+        cancelled = issue_token(self.slot, self.staff)
+        transition(cancelled, "cancelled", "user")
+        self.client.post(reverse("admin:core_token_changelist"), {
+            "action": "mark_completed", "_selected_action": [self.token.pk, cancelled.pk],
+        })
+        self.assertEqual(Token.objects.get(pk=self.token.pk).status, "completed")
+        self.assertEqual(Token.objects.get(pk=cancelled.pk).status, "cancelled")
+        self.assertEqual(self.events("completed"), 1)
+        self.assertFalse(TokenEvent.objects.filter(token_id=cancelled.pk, kind="completed").exists())
+
+
+@plain_static
+class ReplayRetentionTests(TestCase):
+    """Replaying projections does not rebuild rows retention has already pruned."""
+
+    def test_replay_skips_rows_past_their_ttl(self):
+        user = User.objects.create_user("ravi", "ravi@example.com", "pw")
+        slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate(), start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+        old, recent = issue_token(slot, user), issue_token(slot, user)
+        transition(old, "completed", "staff")
+        transition(recent, "completed", "staff")
+        TokenEvent.objects.filter(token_id=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+
+        replay_projections(["activity_log", "notifications"])
+
+        self.assertEqual(ActivityLog.objects.filter(action="token_booked").count(), 1)
+        self.assertEqual(Notification.objects.filter(notification_type="token_ready").count(), 1)
+
+
+class WaitlistViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", "student@example.com", "pw")
+        cls.slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate() + timedelta(days=1),
+            start_time=time(9), end_time=time(10), max_tokens=1,
+        )
+        issue_token(cls.slot, User.objects.create_user("first"))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_full_slot_books_onto_the_waitlist(self):
+        self.client.post(reverse("book_token"), {"slot": self.slot.pk})
+        self.assertEqual(self.slot.tokens.filter(status="active").count(), 1)
+        self.assertTrue(WaitlistEntry.objects.filter(slot=self.slot, user=self.user).exists())
+
+    def test_leaving_the_waitlist_needs_a_post(self):
+        entry = WaitlistEntry.objects.create(slot=self.slot, user=self.user)
+        url = reverse("leave_waitlist", args=[entry.pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertTrue(WaitlistEntry.objects.filter(pk=entry.pk).exists())
+        self.assertRedirects(self.client.post(url), reverse("dashboard"), fetch_redirect_response=False)
+        self.assertFalse(WaitlistEntry.objects.filter(pk=entry.pk).exists())
+
+
+class CanteenSeatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", "student@example.com", "pw")
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+
+    def test_one_seat_per_user_per_window(self):
+        book_seat(self.user, self.tomorrow, "12:00-1:00", flexible=True)
+        with self.assertRaises(SeatBookingError):
+            book_seat(self.user, self.tomorrow, "12:00-1:00", flexible=True)
+        self.assertEqual(CanteenBooking.objects.filter(user=self.user, status="confirmed").count(), 1)
+        counter = CanteenSlotCapacity.objects.get(date=self.tomorrow, time_slot="12:00-1:00")
+        self.assertEqual(counter.booked, 1)
+
+    @override_settings(CANTEEN_SLOT_CAPACITY={"default": 1})
+    def test_spill_skips_windows_the_user_already_holds(self):
+        book_seat(self.user, self.tomorrow, "1:00-2:00")
+        book_seat(User.objects.create_user("other"), self.tomorrow, "12:00-1:00")
+        # 12:00 is full and 1:00 is already theirs, so the next nearest window
+        booking = book_seat(self.user, self.tomorrow, "12:00-1:00", flexible=True)
+        self.assertEqual(booking.time_slot, "9:00-10:00")
+
+    def test_ended_windows_are_refused(self):
+        with self.assertRaises(SeatBookingError):
+            book_seat(self.user, timezone.localdate() - timedelta(days=1), "8:00-9:00")
+        self.assertFalse(CanteenBooking.objects.exists())
+
+
+@plain_static
+class CheckinTests(TestCase):
+    """Signed QR payloads verify offline; a scanned batch completes and refills from the waitlist."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", "student@example.com", "pw")
+        cls.other = User.objects.create_user("other", "other@example.com", "pw")
+        cls.slot = QueueSlot.objects.create(
+            service="library", date=date(2026, 3, 2), start_time=time(9), end_time=time(10), max_tokens=1,
+        )
+
+    def setUp(self):
+        self.token = issue_token(self.slot, self.user)
+        self.payload = checkin_payload(Token.objects.select_related("slot").get(pk=self.token.pk))
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime(2026, 3, 2, hour, minute))
+
+    def test_valid_payload_round_trips(self):
+        self.assertEqual(verify_payload(self.payload, service="library", now=self.at(9, 30)), {
+            "token_id": self.token.pk, "slot_id": self.slot.pk, "number": self.token.number, "service": "library",
+        })
+
+    def test_tampered_signature_is_rejected(self):
+        tampered = self.payload[:-1] + ("A" if self.payload[-1] != "A" else "B")
+        with self.assertRaisesMessage(CheckinError, "Not a valid token code."):
+            verify_payload(tampered, now=self.at(9, 30))
+
+    def test_expired_code_is_rejected(self):
+        late = self.at(10) + timedelta(minutes=settings.CHECKIN_GRACE_MINUTES + 1)
+        with self.assertRaisesMessage(CheckinError, "has expired"):
+            verify_payload(self.payload, now=late)
+
+    def test_code_before_its_window_is_rejected(self):
+        early = self.at(9) - timedelta(minutes=settings.CHECKIN_EARLY_MINUTES + 1)
+        with self.assertRaisesMessage(CheckinError, "later slot"):
+            verify_payload(self.payload, now=early)
+
+    def test_completing_a_batch_promotes_the_waitlist(self):
+        WaitlistEntry.objects.create(slot=self.slot, user=self.other)
+        self.assertEqual(complete_checkins([self.token.pk]), [self.token.pk])
+        self.assertEqual(Token.objects.get(pk=self.token.pk).status, "completed")
+        self.assertTrue(Token.objects.filter(user=self.other, slot=self.slot, status="active").exists())
+        self.assertFalse(WaitlistEntry.objects.exists())
+        # A second scan of the same code finds nothing left to complete
+        self.assertEqual(complete_checkins([self.token.pk]), [])
+
+
+class ChangeFeedTests(TestCase):
+    """The change feed survives compaction and sees writes that bypass the model signals."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", "student@example.com", "pw")
+        cls.slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate() - timedelta(days=1),
+            start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+
+    def upserted(self, feed, table):
+        return {row["id"]: row for row in feed["changes"].get(table, {}).get("upserted", [])}
+
+    def test_cursor_round_trips_until_it_is_too_old(self):
+        now = timezone.now()
+        cursor = make_cursor(42, now)
+        self.assertEqual(parse_cursor(cursor, now), 42)
+        self.assertIsNone(parse_cursor(cursor, now + timedelta(hours=settings.CHANGE_FEED_RETENTION_HOURS)))
+        self.assertIsNone(parse_cursor("not-a-cursor", now))
+        self.assertTrue(changes_since("not-a-cursor")["reset"])
+
+    def test_compacted_feed_still_reports_the_latest_row(self):
+        cursor = current_cursor()
+        token = issue_token(self.slot, self.user)
+        transition(token, "completed", "staff")
+        compact()
+        self.assertEqual(Change.objects.filter(table="token", object_id=token.pk).count(), 1)
+        feed = changes_since(cursor)
+        self.assertFalse(feed["reset"])
+        self.assertEqual(self.upserted(feed, "token")[token.pk]["status"], "completed")
+        # Nothing new after the returned cursor
+        self.assertEqual(changes_since(feed["cursor"])["changes"], {})
+
+    def test_bulk_writes_reach_the_feed(self):
+        token = issue_token(self.slot, self.user)
+        cursor = current_cursor()
+        result = import_csv("slots", StringIO(
+            "service,date,start_time,end_time,max_tokens\n"
+            f"library,{timezone.localdate() + timedelta(days=2)},09:00,10:00,5\n"
+        ))
+        self.assertEqual(result["created"], 1)
+        sweep_expired_tokens()
+
+        feed = changes_since(cursor)
+        imported = QueueSlot.objects.get(date=timezone.localdate() + timedelta(days=2))
+        self.assertIn(imported.pk, self.upserted(feed, "slot"))
+        self.assertEqual(self.upserted(feed, "token")[token.pk]["status"], "expired")
+
+
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", "student@example.com", "pw")
+        cls.slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate() + timedelta(days=1),
+            start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+
+    def setUp(self):
+        cache.clear()  # admission buckets
+        self.client.force_login(self.user)
+
+    def book(self, key="retry-1"):
+        return self.client.post(reverse("book_token"), {"slot": self.slot.pk, "idempotency_key": key})
+
+    def test_replay_returns_the_first_redirect_without_booking_again(self):
+        first = self.book()
+        replay = self.book()
+        self.assertRedirects(first, reverse("dashboard"), fetch_redirect_response=False)
+        self.assertRedirects(replay, reverse("dashboard"), fetch_redirect_response=False)
+        self.assertEqual(Token.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key="retry-1").status_code, 302)
+
+    @patch.object(idempotency, "IN_FLIGHT_WAIT_SECONDS", 0)
+    def test_retry_while_first_request_is_in_flight_gets_409(self):
+        IdempotencyKey.objects.create(user=self.user, endpoint="book_token", key="retry-1")
+        response = self.book()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+
+    def test_abandoned_placeholder_is_run_again(self):
+        record = IdempotencyKey.objects.create(user=self.user, endpoint="book_token", key="retry-1")
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            created_at=timezone.now() - timedelta(seconds=idempotency.IN_FLIGHT_TIMEOUT_SECONDS + 1)
+        )
+        self.assertRedirects(self.book(), reverse("dashboard"), fetch_redirect_response=False)
+        self.assertEqual(Token.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key="retry-1").status_code, 302)
+
+
+@plain_static
+class AdmissionControlTests(TestCase):
+    """Booking POSTs spend a user and a global token; a rejected request gets its tokens back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", "student@example.com", "pw")
+        cls.slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate() + timedelta(days=1),
+            start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def book(self):
+        return self.client.post(reverse("book_token"), {"slot": self.slot.pk})
+
+    def level(self, key, rate, burst):
+        return TokenBucket(BucketStore("default"), key, rate, burst).level()
+
+    # A global bucket that barely refills, so its level only moves when a request spends from it
+    @override_settings(ADMISSION_CONTROL={**ADMISSION_DEFAULTS, "GLOBAL_RATE": 0.001, "GLOBAL_BURST": 10})
+    def test_drained_user_bucket_gets_429_without_spending_global_tokens(self):
+        burst = ADMISSION_DEFAULTS["USER_BURST"]
+        for _ in range(burst):
+            self.assertEqual(self.book().status_code, 302)
+        response = self.book()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(int(self.level("global", 0.001, 10)), 10 - burst)
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION_DEFAULTS, "GLOBAL_RATE": 0.001, "GLOBAL_BURST": 1})
+    def test_global_refusal_refunds_the_user_token(self):
+        self.assertEqual(self.book().status_code, 302)
+        response = self.book()
+        self.assertEqual(response.status_code, 429)
+        burst = ADMISSION_DEFAULTS["USER_BURST"]
+        # One token for the booking that got in; the refused one was handed back
+        self.assertGreaterEqual(self.level(f"user:{self.user.pk}", ADMISSION_DEFAULTS["USER_RATE"], burst), burst - 1)
+
+
+@plain_static
+class IssuedAtQueryPlanTests(TestCase):
+    """Day and range filters on Token.issued_at must be index range scans, not per-row date conversions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "pw", is_staff=True)
+        slot = QueueSlot.objects.create(
+            service="library", date=timezone.localdate(), start_time=time(9), end_time=time(10), max_tokens=10,
+        )
+        issue_token(slot, cls.staff)
+
+    def assertIssuedAtRange(self, plan):
+        self.assertRegex(
+            plan, r"SEARCH core_token USING (COVERING )?INDEX core_token_issued_\w+ \(issued_at>\? AND issued_at<\?\)"
+        )
+
+    def test_window_filter_uses_issued_at_index(self):
+        window = RequestDates().today_window
+        queryset = Token.objects.filter(**window.lookup("issued_at")).order_by()
+        self.assertIssuedAtRange(queryset.explain())
+
+    def test_date_lookup_cannot_use_index(self):
+        queryset = Token.objects.filter(issued_at__date=timezone.localdate()).order_by()
+        plan = queryset.explain()
+        self.assertIn("SCAN core_token", plan)
+        self.assertNotIn("SEARCH core_token", plan)
+
+    def _token_queries(self, url_name):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return [
+            query["sql"] for query in captured.captured_queries
+            if 'FROM "core_token"' in query["sql"] and '"issued_at" >=' in query["sql"]
+        ]
+
+    def test_staff_views_range_scan_issued_at(self):
+        for url_name in ("admin_dashboard", "reports", "dashboard"):
+            with self.subTest(url_name):
+                queries = self._token_queries(url_name)
+                self.assertTrue(queries)
+                for sql in queries:
+                    self.assertIssuedAtRange(query_plan(sql))
+
+
+@override_settings(
+    TIME_ZONE="Asia/Kolkata",
+    DISPATCH={'LANE_WEIGHTS': {'priority': 100, 'standard': 1}, 'SERVICE_WEIGHTS': {}, 'MAX_WAIT_MINUTES': 30},
+)
+class DispatchTests(TestCase):
+    """Pre-booked tokens start waiting when their slot opens, whichever lane they are in."""
+
+    now = timezone.make_aware(datetime(2026, 3, 10, 12, 0))
+
+    def book(self, username, start, priority=False, issued_hours_ago=3):
+        user = User.objects.create_user(username)
+        if priority:
+            PriorityPass.objects.create(user=user, reason="accessibility", valid_from=date(2026, 3, 1))
+        slot, _ = QueueSlot.objects.get_or_create(
+            service="library", date=self.now.date(), start_time=start,
+            defaults={"end_time": time(13), "max_tokens": 10},
+        )
+        token = issue_token(slot, user)
+        Token.objects.filter(pk=token.pk).update(issued_at=self.now - timedelta(hours=issued_hours_ago))
+        return token
+
+    def test_prebooked_tokens_are_not_starving_when_their_slot_opens(self):
+        standard = [self.book(f"standard{i}", time(11, 55)) for i in range(3)]
+        priority = self.book("priority", time(11, 55), priority=True, issued_hours_ago=2)
+        self.assertEqual(priority.lane, "priority")
+        ids = Dispatcher().next_tokens(count=4, now=self.now)
+        self.assertEqual(ids, [priority.pk] + [token.pk for token in standard])
+
+    def test_token_waiting_past_the_cap_since_its_slot_opened_goes_first(self):
+        priority = [self.book(f"priority{i}", time(11, 50), priority=True) for i in range(3)]
+        overdue = self.book("overdue", time(11, 25))
+        recent = self.book("recent", time(11, 45))
+        ids = Dispatcher().next_tokens(count=5, now=self.now)
+        self.assertEqual(ids[0], overdue.pk)
+        self.assertEqual(ids[1:4], [token.pk for token in priority])
+        self.assertEqual(ids[4], recent.pk)
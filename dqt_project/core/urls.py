@@ -9,6 +9,7 @@ urlpatterns = [
     path('login/', views.user_login, name='login'),
     path('register/', views.register, name='register'),
     path('logout/', views.user_logout, name='user_logout'),
+    path('display/<str:service>/', views.display_board, name='display_board'),
     
     # ========================
     # USER DASHBOARD & PROFILE
@@ -16,22 +17,29 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('my-history/', views.my_history, name='my_history'),
     path('my-reports/', views.my_reports, name='my_reports'),
+    path('notifications/', views.notifications_inbox, name='notifications'),
+    path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/read-all/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
 
     # ========================
     # GENERAL TOKEN SYSTEM
     # ========================
     path('book-token/', views.book_token, name='book_token'),
     path('cancel-token/<int:token_id>/', views.cancel_token, name='cancel_token'),
+    path('leave-waitlist/<int:entry_id>/', views.leave_waitlist, name='leave_waitlist'),
     
     # ========================
-    # LIBRARY QUEUE SYSTEM
+    # SERVICE QUEUES
     # ========================
-    path('book-library/', views.book_library, name='book_library'),
+    path('book/<slug:service>/', views.book_service, name='book_service'),
+    path('book-library/', views.book_service, {'service': 'library'}, name='book_library'),
     
     # ========================
     # CANTEEN BOOKING SYSTEM
     # ========================
-    path('book-canteen/', views.book_canteen, name='book_canteen'),
+    path('book-canteen/', views.book_service, {'service': 'canteen'}, name='book_canteen'),
+    path('book-canteen/seat/', views.book_canteen_seat, name='book_canteen_seat'),
+    path('book-canteen/seat/<int:booking_id>/cancel/', views.cancel_canteen_booking, name='cancel_canteen_booking'),
     
    
     # ========================
@@ -41,4 +49,17 @@ urlpatterns = [
     path('system/complete-token/<int:token_id>/', views.complete_token, name='complete_token'),
     path('system/skip-token/<int:token_id>/', views.skip_token, name='skip_token'),
     path('system/reports/', views.reports, name='reports'),
+    path('system/changes/', views.change_feed, name='change_feed'),
+    path('system/dispatch/next/', views.dispatch_next, name='dispatch_next'),
+    path('system/checkin/', views.checkin_scanner, name='checkin_scanner'),
+    path('system/checkin/verify/', views.checkin_verify, name='checkin_verify'),
+    path('system/checkin/complete/', views.checkin_complete, name='checkin_complete'),
+    path('system/admission/', views.admission_status_view, name='admission_status'),
+    path('system/analytics/', views.analytics, name='analytics'),
+    path('system/analytics.json', views.analytics_export, name='analytics_export'),
+    path('system/capacity/', views.capacity_planning, name='capacity_planning'),
+    path('system/search/', views.staff_search, name='staff_search'),
+    path('system/profiles/', views.profiles, name='profiles'),
+    path('system/profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('system/profiles/<str:profile_id>.prof', views.profile_download, name='profile_download'),
 ]
\ No newline at end of file
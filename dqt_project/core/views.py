@@ -1,16 +1,44 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_GET, require_POST
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 from django.db.models import Count, Q  
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta
+import json
 import logging
-
-from .forms import BookingForm, UserRegisterForm
-from .models import QueueSlot, Token, VisitHistory, CanteenBooking, ActivityLog, Notification
+import time
+
+from . import analytics as analytics_data
+from .canteen import SeatBookingError, availability, book_seat, cancel_seat
+from .changes import changes_since, current_cursor
+from .checkin import CheckinError, checkin_payload, complete_checkins, verify_payload
+from .dates import request_dates
+from .dispatch import next_tokens, waiting_since
+from .display import get_snapshot
+from .events import issue_token, transition
+from .forms import AnalyticsRangeForm, BookingForm, CanteenTimeSlotBookingForm, CapacityPlanForm, UserRegisterForm
+from .models import QueueSlot, Token, VisitHistory, CanteenBooking, ActivityLog, Notification, WaitlistEntry
+from .idempotency import idempotent
+from .middleware import admission_status
+from .notifications import mark_all_read, mark_read
+from .pagecache import cache_anonymous_page
+from . import profiling
+from .replica import read_from_replica, replica_reads
+from .search import search
+from .services import get_service, service_label, with_services
+from .simulation import get_capacity_plan
+from . import stats
+from .waitlist import has_room, join_waitlist, lock_slot, promote_next, waitlist_position, with_positions
 from . import models
 from django.db import models
 from django.db import DatabaseError
@@ -18,9 +46,33 @@ from django.db import DatabaseError
 # HOME
 # -------------------------
 
+@cache_anonymous_page
 def home(request):
     return render(request, "core/home.html")
 
+# -------------------------
+# PUBLIC DISPLAY BOARDS
+# -------------------------
+
+@require_GET
+def display_board(request, service):
+    """Unauthenticated queue board for entrance screens, served from a shared snapshot."""
+    if get_service(service) is None:
+        raise Http404("Unknown service")
+
+    snapshot = get_snapshot(service)
+    if request.META.get("HTTP_IF_NONE_MATCH") == snapshot["etag"]:
+        response = HttpResponseNotModified()
+    elif "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+        response = HttpResponse(snapshot["gzip_body"], content_type="text/html; charset=utf-8")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(snapshot["body"], content_type="text/html; charset=utf-8")
+    response["ETag"] = snapshot["etag"]
+    response["Cache-Control"] = f"public, max-age={settings.DISPLAY_BOARD_TICK_SECONDS}"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
 # -------------------------
 # USER AUTH
 # -------------------------
@@ -28,11 +80,7 @@ def user_login(request):
     if request.method == "POST":
         email = request.POST.get("email")
         password = request.POST.get("password")
-        try:
-            user_obj = User.objects.get(email=email)
-            user = authenticate(request, username=user_obj.username, password=password)
-        except User.DoesNotExist:
-            user = None
+        user = authenticate(request, email=email, password=password)
 
         if user is not None:
             login(request, user)
@@ -74,11 +122,16 @@ logger = logging.getLogger(__name__)
 @login_required
 def dashboard(request):
     user = request.user
-    today = timezone.now().date()
+    dates = request_dates(request)
+    today = dates.today
     
     try:
-        # Get active tokens for the current user
-        active_tokens = Token.objects.filter(user=user, status="active").order_by("-issued_at")
+        # Get active tokens for the current user, each with its signed check-in code
+        active_tokens = list(
+            Token.objects.filter(user=user, status="active").select_related("slot").order_by("-issued_at")
+        )
+        for token in active_tokens:
+            token.checkin_code = checkin_payload(token)
         
         # Get upcoming canteen bookings
         upcoming_slots = CanteenBooking.objects.filter(
@@ -86,6 +139,11 @@ def dashboard(request):
             date__gte=today
         ).order_by("date", "time_slot")
         
+        # Waitlists the user is queued on, with their current position
+        waitlist_entries = with_positions(
+            WaitlistEntry.objects.filter(user=user).select_related('slot')
+        ).order_by('joined_at')
+        
         # Get notifications and activities
         activities = ActivityLog.objects.filter(user=user).order_by('-timestamp')[:10]
         notifications = Notification.objects.filter(user=user).order_by('-created_at')[:5]
@@ -95,31 +153,30 @@ def dashboard(request):
         recent_reports = []
         
         if user.is_staff:
-            # Today's statistics
-            today_stats = {
-                'total_tokens': Token.objects.filter(issued_at__date=today).count(),
-                'served_tokens': Token.objects.filter(status='completed', issued_at__date=today).count(),
-                'active_tokens': Token.objects.filter(status='active').count(),
-                'total_bookings': CanteenBooking.objects.filter(date=today).count(),
-            }
-            
-            # Recent reports data (last 7 days)
-            last_week = today - timedelta(days=7)
+            # Aggregate stats don't need read-your-writes; keep them off the primary
+            with replica_reads():
+                # Today's statistics
+                today_tokens = Token.objects.filter(**dates.today_window.lookup('issued_at'))
+                today_stats = {
+                    'total_tokens': today_tokens.count(),
+                    'served_tokens': today_tokens.filter(status='completed').count(),
+                    'active_tokens': Token.objects.filter(status='active').count(),
+                    'total_bookings': CanteenBooking.objects.filter(date=today).count(),
+                }
             
-            # Fixed: Use Count and Q from django.db.models
-            recent_reports = Token.objects.filter(
-                issued_at__date__gte=last_week
-            ).extra({
-                'date': "date(issued_at)"
-            }).values('date', 'slot__service').annotate(
-                total=Count('id'),
-                served=Count('id', filter=Q(status='completed')),
-                skipped=Count('id', filter=Q(status='skipped')),
-                cancelled=Count('id', filter=Q(status='cancelled'))
-            ).order_by('-date')[:5]
+                # Recent reports data (last 7 days), grouped by local issue date
+                recent_reports = list(Token.objects.filter(
+                    **dates.since(7).lookup('issued_at')
+                ).annotate(date=TruncDate('issued_at')).values('date', 'slot__service').annotate(
+                    total=Count('id'),
+                    served=Count('id', filter=Q(status='completed')),
+                    skipped=Count('id', filter=Q(status='skipped')),
+                    cancelled=Count('id', filter=Q(status='cancelled'))
+                ).order_by('-date')[:5])
         
         return render(request, "core/dashboard.html", {
             "active_tokens": active_tokens,
+            "waitlist_entries": waitlist_entries,
             "upcoming_slots": upcoming_slots,
             "notifications": notifications,
             "activities": activities,
@@ -132,6 +189,7 @@ def dashboard(request):
         # Return a simplified version or error page
         return render(request, "core/dashboard.html", {
             "active_tokens": [],
+            "waitlist_entries": [],
             "upcoming_slots": [],
             "notifications": [],
             "activities": [],
@@ -144,6 +202,7 @@ def dashboard(request):
         # Return a simplified version for any other errors
         return render(request, "core/dashboard.html", {
             "active_tokens": [],
+            "waitlist_entries": [],
             "upcoming_slots": [],
             "notifications": [],
             "activities": [],
@@ -157,18 +216,13 @@ def dashboard(request):
 # -------------------------
 
 @login_required
+@idempotent
 def book_token(request):
     if request.method == "POST":
         slot_id = request.POST.get("slot")
         try:
             slot = QueueSlot.objects.get(id=slot_id)
             
-            # Check if slot is full
-            current_tokens_count = Token.objects.filter(slot=slot, status="active").count()
-            if current_tokens_count >= slot.max_tokens:
-                messages.error(request, "This slot is full. Please choose another slot.")
-                return redirect("book_token")
-            
             # Check if user already has active token for this service
             existing_token = Token.objects.filter(
                 user=request.user, 
@@ -180,25 +234,13 @@ def book_token(request):
                 messages.error(request, f"You already have an active token for {slot.get_service_display()}.")
                 return redirect("dashboard")
             
-            # Generate token number
-            last_token = Token.objects.filter(slot=slot).order_by('-number').first()
-            number = last_token.number + 1 if last_token else 1
-
             with transaction.atomic():
-                token = Token.objects.create(
-                    slot=slot,
-                    user=request.user,
-                    number=number,
-                    status="active"
-                )
-                
-                # Log the activity
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action='token_booked',
-                    message=f'Token #{token.number} booked for {slot}',
-                    object_type='Token'
-                )
+                lock_slot(slot)
+                # Full slots (or slots with people already waiting) go to the waitlist
+                if not has_room(slot):
+                    return _join_waitlist_response(request, slot)
+
+                token = issue_token(slot, request.user)
                 
             messages.success(request, f"Token #{token.number} booked successfully for {slot.get_service_display()}!")
             return redirect("dashboard")
@@ -209,7 +251,7 @@ def book_token(request):
 
     # Get available slots (future slots with capacity)
     slots = QueueSlot.objects.filter(
-        date__gte=timezone.now().date()
+        date__gte=request_dates(request).today
     ).order_by("date", "start_time")
     
     return render(request, "core/book_token.html", {"slots": slots})
@@ -219,43 +261,121 @@ def cancel_token(request, token_id):
     token = get_object_or_404(Token, id=token_id, user=request.user, status="active")
     
     with transaction.atomic():
-        token.status = "cancelled"
-        token.save()
-        
-        # Create visit history record
-        VisitHistory.objects.create(
-            user=request.user,
-            slot=token.slot,
-            token_number=token.number,
-            outcome="cancelled"
-        )
-        
-        # Log the activity
-        ActivityLog.objects.create(
-            user=request.user,
-            action='token_cancelled',
-            message=f'Token #{token.number} cancelled',
-            object_type='Token'
-        )
+        if not transition(token, "cancelled", source="user"):
+            messages.error(request, f"Token #{token.number} was already updated.")
+            return redirect("dashboard")
+
+        # Hand the freed seat to the head of the waitlist
+        promote_next(token.slot)
     
     messages.info(request, f"Token #{token.number} cancelled.")
     return redirect("dashboard")
 
+
+@login_required
+@require_POST
+def leave_waitlist(request, entry_id):
+    entry = get_object_or_404(WaitlistEntry, id=entry_id, user=request.user)
+    slot = entry.slot
+    entry.delete()
+    messages.info(request, f"You have left the waitlist for {slot}.")
+    return redirect("dashboard")
+
+
+def _join_waitlist_response(request, slot):
+    with transaction.atomic():
+        entry, created = join_waitlist(request.user, slot)
+        # Seats may have been freed without a promotion (e.g. max_tokens raised)
+        promoted = promote_next(slot)
+
+    if promoted and promoted.user_id == request.user.id:
+        messages.success(request, f"Token #{promoted.number} booked successfully for {slot.get_service_display()}!")
+        return redirect("dashboard")
+
+    position = waitlist_position(entry)
+    if created:
+        messages.warning(request, f"This slot is full. You have been added to the waitlist at position #{position}.")
+    else:
+        messages.info(request, f"You are already on the waitlist for this slot at position #{position}.")
+    return redirect("dashboard")
+
 # -------------------------
-# BOOKING SERVICES (LIBRARY / CANTEEN)
+# BOOKING SERVICES
 # -------------------------
 
+def _canteen_seat_context(request):
+    """Seat booking panel on the canteen page (posts to book_canteen_seat)."""
+    return {
+        "seat_form": CanteenTimeSlotBookingForm(),
+        "seat_availability": availability(),
+        "seat_bookings": CanteenBooking.objects.filter(
+            user=request.user, status="confirmed", date__gte=timezone.localdate()
+        ).order_by("date", "time_slot"),
+    }
+
+# Extra panels for services that have more than a token queue
+SERVICE_EXTRA_CONTEXT = {
+    "canteen": _canteen_seat_context,
+}
+
 @login_required
-def book_library(request):
-    return book_generic(request, service="library", template="core/book_library.html")
+@idempotent
+def book_service(request, service):
+    config = get_service(service)
+    if config is None or not config.is_active:
+        raise Http404("Unknown service")
+
+    extra_context = None
+    if request.method != "POST" and service in SERVICE_EXTRA_CONTEXT:
+        extra_context = SERVICE_EXTRA_CONTEXT[service](request)
+    # Services without their own page share the generic one
+    template = [f"core/book_{service}.html", "core/book_service.html"]
+    return book_generic(request, service=service, template=template, extra_context=extra_context)
+
+@login_required
+@idempotent
+def book_canteen_seat(request):
+    if request.method != "POST":
+        return redirect("book_canteen")
+
+    form = CanteenTimeSlotBookingForm(request.POST)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect("book_canteen")
+
+    data = form.cleaned_data
+    try:
+        booking = book_seat(
+            request.user, data["date"], data["time_slot"],
+            purpose=data["purpose"], flexible=data["flexible"]
+        )
+    except SeatBookingError as error:
+        messages.error(request, str(error))
+        return redirect("book_canteen")
+    if booking is None:
+        messages.error(request, "That canteen time window is fully booked. Please pick another window.")
+        return redirect("book_canteen")
+
+    if booking.time_slot != data["time_slot"]:
+        messages.warning(
+            request,
+            f"{booking.get_time_slot_display()} was the nearest window with free seats, so you are booked there instead."
+        )
+    messages.success(request, f"Canteen seat booked for {booking.date} @ {booking.get_time_slot_display()}.")
+    return redirect("book_canteen")
 
 @login_required
-def book_canteen(request):
-    return book_generic(request, service="canteen", template="core/book_canteen.html")
+def cancel_canteen_booking(request, booking_id):
+    booking = get_object_or_404(CanteenBooking, id=booking_id, user=request.user)
+    if request.method == "POST" and cancel_seat(booking):
+        messages.info(request, f"Canteen booking for {booking.date} @ {booking.get_time_slot_display()} cancelled.")
+    return redirect("book_canteen")
 
-def book_generic(request, service, template):
+def book_generic(request, service, template, extra_context=None):
     if request.method == "POST":
-        form = BookingForm(request.POST)
+        form = BookingForm(request.POST, service_filter=service)
         if form.is_valid():
             slot = form.cleaned_data["slot"]
             
@@ -267,50 +387,62 @@ def book_generic(request, service, template):
             ).first()
             
             if existing_token:
-                messages.error(request, f"You already have an active token for {service}.")
+                messages.error(request, f"You already have an active token for {service_label(service)}.")
                 return redirect("dashboard")
             
             with transaction.atomic():
-                # Get active tokens count for the slot
-                used_numbers = Token.objects.filter(slot=slot, status="active").count()
-                
-                if used_numbers >= slot.max_tokens:
-                    messages.error(request, f"This {service} slot is full.")
-                    return redirect("dashboard")
+                lock_slot(slot)
+                # Full slots (or slots with people already waiting) go to the waitlist
+                if not has_room(slot):
+                    return _join_waitlist_response(request, slot)
 
-                # Find available number
-                last_token = Token.objects.filter(slot=slot).order_by('-number').first()
-                number = last_token.number + 1 if last_token else 1
-                
-                token = Token.objects.create(
-                    slot=slot,
-                    user=request.user,
-                    number=number,
-                    status="active"
-                )
+                token = issue_token(slot, request.user)
                 
-                # Log the activity
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action='token_booked',
-                    message=f'{service.capitalize()} Token #{token.number} booked',
-                    object_type='Token'
-                )
-                
-            messages.success(request, f"Booked {service.capitalize()} Token #{token.number} for {slot}.")
+            messages.success(request, f"Booked {service_label(service)} Token #{token.number} for {slot}.")
             return redirect("dashboard")
     else:
-        form = BookingForm()
-        # Filter slots by service
-        form.fields['slot'].queryset = QueueSlot.objects.filter(service=service, date__gte=timezone.now().date())
+        form = BookingForm(service_filter=service)
     
-    return render(request, template, {"form": form, "service": service})
+    return render(request, template, {
+        "form": form, "service": service, "service_info": get_service(service), **(extra_context or {})
+    })
+
+
+# -------------------------
+# NOTIFICATIONS
+# -------------------------
+@login_required
+def notifications_inbox(request):
+    paginator = Paginator(
+        Notification.objects.filter(user=request.user).order_by('-created_at'),
+        settings.NOTIFICATIONS_PER_PAGE
+    )
+    page = paginator.get_page(request.GET.get("page"))
+    return render(request, "core/notifications.html", {"page": page})
+
+@login_required
+def mark_notification_read(request, notification_id):
+    if request.method == "POST":
+        mark_read(request.user, [notification_id])
+    next_url = request.POST.get("next")
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect("notifications")
+
+@login_required
+def mark_all_notifications_read(request):
+    if request.method == "POST":
+        updated = mark_all_read(request.user)
+        if updated:
+            messages.success(request, f"Marked {updated} notification{'s' if updated != 1 else ''} as read.")
+    return redirect("notifications")
 
 
 # -------------------------
 # USER HISTORY
 # -------------------------
 @login_required
+@read_from_replica
 def my_history(request):
     tokens_history = Token.objects.filter(user=request.user).order_by("-issued_at")
     visit_history = VisitHistory.objects.filter(user=request.user).order_by("-timestamp")
@@ -339,138 +471,132 @@ def admin_dashboard(request):
     if not request.user.is_staff:
         return redirect('dashboard')
     
-    today = timezone.now().date()
-    print(f"🔍 DEBUG: Today's date is {today}")
-    
-    # Check ALL tokens first
-    all_tokens = Token.objects.all()
-    print(f"🔍 DEBUG: Total tokens in database: {all_tokens.count()}")
-    
-    # Check token dates and statuses
-    for token in all_tokens[:5]:  # First 5 tokens
-        print(f"🔍 DEBUG: Token #{token.id} - Date: {token.issued_at.date() if token.issued_at else 'No date'} - Status: {token.status}")
+    dates = request_dates(request)
+    today = dates.today
     
-    # Today's statistics - try different date filters
-    today_tokens = Token.objects.filter(issued_at__date=today)
-    print(f"🔍 DEBUG: Today tokens (date filter): {today_tokens.count()}")
-    
-    # Alternative date filter
-    today_tokens_alt = Token.objects.filter(
-        issued_at__year=today.year,
-        issued_at__month=today.month, 
-        issued_at__day=today.day
-    )
-    print(f"🔍 DEBUG: Today tokens (alternative filter): {today_tokens_alt.count()}")
-    
-    # Use the alternative filter if it works better
-    today_tokens = today_tokens_alt
+    # Today's statistics: an index range on issued_at, not a per-row date conversion
+    today_tokens = Token.objects.filter(**dates.today_window.lookup('issued_at'))
     
     total_tokens_today = today_tokens.count()
     served_today = today_tokens.filter(status='completed').count()
     
-    print(f"🔍 DEBUG: Total tokens today: {total_tokens_today}")
-    print(f"🔍 DEBUG: Served today: {served_today}")
-    
-    # Service-wise breakdown for today
-    library_today = today_tokens.filter(slot__service='library').count()
-    canteen_today = today_tokens.filter(slot__service='canteen').count()
-    
-    print(f"🔍 DEBUG: Library today: {library_today}")
-    print(f"🔍 DEBUG: Canteen today: {canteen_today}")
-    
-    # Check all statuses
-    all_pending = Token.objects.filter(status='pending')
-    all_active = Token.objects.filter(status='active')
-    all_completed = Token.objects.filter(status='completed')
-    
-    print(f"🔍 DEBUG: All pending tokens: {all_pending.count()}")
-    print(f"🔍 DEBUG: All active tokens: {all_active.count()}")
-    print(f"🔍 DEBUG: All completed tokens: {all_completed.count()}")
+    # Service-wise breakdown for today, one grouped query for every service
+    service_today = with_services(dict(
+        today_tokens.order_by().values_list('slot__service').annotate(total=Count('id'))
+    ))
     
     # Pending tokens (all time for now)
-    pending_tokens = all_pending
-    active_tokens = all_active
-    
-    print(f"🔍 DEBUG: Pending tokens: {pending_tokens.count()}")
-    print(f"🔍 DEBUG: Active tokens: {active_tokens.count()}")
+    pending_tokens = Token.objects.filter(status='pending')
+    active_tokens = Token.objects.filter(status='active')
     
     # ALL active tokens for the comprehensive table (including pending and active)
-    all_active_tokens = Token.objects.filter(status__in=['pending', 'active']).order_by('issued_at')
-    print(f"🔍 DEBUG: All active tokens for table: {all_active_tokens.count()}")
+    all_active_tokens = Token.objects.filter(status__in=['pending', 'active']).select_related('slot', 'user').order_by('issued_at')
+    
+    # Who the desks should call next, across lanes and services (core/dispatch.py)
+    desk_services = request.GET.getlist('service') or None
+    up_next = _dispatched(next_tokens(desk_services, count=settings.DISPATCH_PREVIEW_SIZE))
     
     context = {
         'total_tokens_today': total_tokens_today,
         'served_today': served_today,
-        'library_today': library_today,
-        'canteen_today': canteen_today,
+        'service_today': service_today,
         'pending_tokens': pending_tokens,
         'active_tokens': active_tokens,
         'all_active_tokens': all_active_tokens,  # This is for the table
+        'up_next': up_next,
+        'desk_services': desk_services or [],
         'today': today,
+        # The page polls the change feed from here instead of reloading
+        'change_cursor': current_cursor(),
+        'change_poll_seconds': settings.CHANGE_FEED_POLL_SECONDS,
     }
     
     return render(request, 'core/admin_dashboard.html', context)
 
 
 @user_passes_test(is_admin)
+@idempotent
 def complete_token(request, token_id):
     token = get_object_or_404(Token, id=token_id)
     
     with transaction.atomic():
-        token.mark_served()
-        
-        VisitHistory.objects.create(
-            user=token.user,
-            slot=token.slot,
-            token_number=token.number,
-            outcome="completed"
-        )
-        
-        # Create notification for user
-        Notification.objects.create(
-            user=token.user,
-            title="Token Completed",
-            message=f"Your token #{token.number} has been completed.",
-            notification_type='token_ready'
-        )
+        if not transition(token, "completed", source="staff"):
+            messages.error(request, f"Token #{token.number} was already updated.")
+            return redirect("admin_dashboard")
+
+        promote_next(token.slot)
     
     messages.success(request, f"Token #{token.number} marked as completed.")
     return redirect("admin_dashboard")
 
 @user_passes_test(is_admin)
+@idempotent
 def skip_token(request, token_id):
     token = get_object_or_404(Token, id=token_id)
     
     with transaction.atomic():
-        token.mark_skipped()
-        
-        VisitHistory.objects.create(
-            user=token.user,
-            slot=token.slot,
-            token_number=token.number,
-            outcome="skipped"
-        )
+        if not transition(token, "skipped", source="staff"):
+            messages.error(request, f"Token #{token.number} was already updated.")
+            return redirect("admin_dashboard")
+
+        promote_next(token.slot)
     
     messages.info(request, f"Token #{token.number} skipped.")
     return redirect("admin_dashboard")
 
+def _dispatched(token_ids):
+    """The tokens for `token_ids`, in dispatch order."""
+    tokens = Token.objects.select_related('slot', 'user').in_bulk(token_ids)
+    dispatched = [tokens[pk] for pk in token_ids if pk in tokens]
+    for token in dispatched:
+        token.waiting_since = waiting_since(token)
+    return dispatched
+
+@user_passes_test(is_admin)
+@require_GET
+def dispatch_next(request):
+    """The next tokens a desk serving ?service=... (repeatable; default all) should call, as JSON."""
+    try:
+        count = min(max(int(request.GET.get("count", 1)), 1), 50)
+    except ValueError:
+        count = 1
+    tokens = _dispatched(next_tokens(request.GET.getlist("service") or None, count=count))
+    now = timezone.now()
+    return JsonResponse({"tokens": [
+        {
+            "id": token.id,
+            "number": token.number,
+            "service": token.service,
+            "lane": token.lane,
+            "username": token.user.username,
+            "slot_start": token.slot.start_time.strftime("%H:%M"),
+            "waited_minutes": max(0, int((now - token.waiting_since).total_seconds() // 60)),
+        }
+        for token in tokens
+    ]})
+
+@user_passes_test(is_admin)
+@require_GET
+def change_feed(request):
+    """Tokens, slots and canteen bookings written since ?since=<cursor>, as JSON (core/changes.py)."""
+    return JsonResponse(changes_since(request.GET.get("since")))
+
 @user_passes_test(is_admin)
 def reports(request):
-    today = timezone.now().date()
+    dates = request_dates(request)
+    today = dates.today
+    today_tokens = Token.objects.filter(**dates.today_window.lookup("issued_at"))
     
-    total_today = Token.objects.filter(
-        status="completed",
-        issued_at__date=today
-    ).count()
+    total_today = today_tokens.filter(status="completed").count()
     
-    library_count = Token.objects.filter(slot__service="library", issued_at__date=today).count()
-    canteen_count = Token.objects.filter(slot__service="canteen", issued_at__date=today).count()
+    service_counts = with_services(dict(
+        today_tokens.order_by().values_list("slot__service").annotate(total=Count("id"))
+    ))
     active_tokens = Token.objects.filter(status="active").count()
     
     return render(request, "core/reports.html", {
         "total_today": total_today,
-        "library_count": library_count,
-        "canteen_count": canteen_count,
+        "service_counts": service_counts,
         "active_tokens": active_tokens,
         "today": today,
     })
@@ -494,39 +620,28 @@ def reports(request):
         # Show user-specific reports - redirect to my_reports
         return my_reports(request)
 
+@read_from_replica
 def admin_reports(request):
     """Staff-only system reports"""
-    today = timezone.now().date()
-    last_30_days = today - timedelta(days=30)
+    dates = request_dates(request)
     
-    # Generate report data - manual date extraction
+    # Last 30 days grouped by local issue date; the filter is an index range on issued_at
     reports_data = Token.objects.filter(
-        issued_at__date__gte=last_30_days
-    ).extra({
-        'date': "date(issued_at)"
-    }).values('date', 'slot__service').annotate(
+        **dates.since(30).lookup('issued_at')
+    ).annotate(date=TruncDate('issued_at')).values('date', 'slot__service').annotate(
         total=Count('id'),
         served=Count('id', filter=Q(status='completed')),
         skipped=Count('id', filter=Q(status='skipped')),
         cancelled=Count('id', filter=Q(status='cancelled'))
     ).order_by('-date', 'slot__service')
     
-    # Debug: print the data to see what's coming through
-    print("Reports data:", list(reports_data))
-    
     # Format data for template
     reports = []
     for stat in reports_data:
-        # Ensure date is properly formatted
-        date_obj = stat['date']
-        if isinstance(date_obj, str):
-            # If it's a string, convert to date object
-            from datetime import datetime
-            date_obj = datetime.strptime(date_obj, '%Y-%m-%d').date()
-        
         reports.append({
-            'date': date_obj,
+            'date': stat['date'],
             'queue_type': stat['slot__service'] or 'general',
+            'service': get_service(stat['slot__service']),
             'total': stat['total'],
             'served': stat['served'],
             'skipped': stat['skipped'],
@@ -552,71 +667,187 @@ def admin_reports(request):
 
 
 @login_required
+@read_from_replica
 def my_reports(request):
-    """User-specific reports page"""
+    """User-specific reports page, read from the precomputed UserStats rows"""
     user = request.user
-    today = timezone.now().date()
-    last_30_days = today - timedelta(days=30)
-    
-    # Token statistics
-    user_tokens = Token.objects.filter(user=user)
-    recent_tokens = user_tokens.filter(issued_at__date__gte=last_30_days)
-    
-    token_stats = {
-        'total_tokens': user_tokens.count(),
-        'completed_tokens': user_tokens.filter(status='completed').count(),
-        'active_tokens': user_tokens.filter(status='active').count(),
-        'cancelled_tokens': user_tokens.filter(status='cancelled').count(),
-    }
-    
-    # Canteen statistics
-    canteen_stats = {
-        'total_bookings': CanteenBooking.objects.filter(user=user).count(),
-        'recent_bookings': CanteenBooking.objects.filter(user=user, date__gte=last_30_days).count(),
-    }
-    
-    # Service usage statistics
-    service_stats_data = recent_tokens.values('slot__service').annotate(
-        total=Count('id'),
-        completed=Count('id', filter=Q(status='completed'))
-    ).order_by('-total')
-    
-    service_stats = []
-    for stat in service_stats_data:
-        service_stats.append({
-            'service': stat['slot__service'] or 'General',
-            'total': stat['total'],
-            'completed': stat['completed'],
-        })
-    
+    report = stats.report_for(user)
+
     # Recent tokens for activity feed
-    recent_tokens_list = recent_tokens.order_by('-issued_at')[:10]
-    
-    # Monthly breakdown
-    monthly_stats_data = user_tokens.extra({
-        'month': "strftime('%%Y-%%m', issued_at)"
-    }).values('month').annotate(
-        total=Count('id'),
-        completed=Count('id', filter=Q(status='completed')),
-        cancelled=Count('id', filter=Q(status='cancelled'))
-    ).order_by('-month')[:6]  # Last 6 months
-    
-    monthly_stats = []
-    for stat in monthly_stats_data:
-        monthly_stats.append({
-            'month': stat['month'],
-            'total': stat['total'],
-            'completed': stat['completed'],
-            'cancelled': stat['cancelled'],
-        })
+    recent_tokens_list = (
+        Token.objects.filter(user=user, issued_at__gte=timezone.now() - timedelta(days=30))
+        .select_related('slot')
+        .order_by('-issued_at')[:10]
+    )
     
     context = {
         "is_staff": False,
-        "token_stats": token_stats,
-        "canteen_stats": canteen_stats,
-        "service_stats": service_stats,
         "recent_tokens": recent_tokens_list,
-        "monthly_stats": monthly_stats,
+        **report,
     }
     
-    return render(request, "core/my_reports.html", context)
\ No newline at end of file
+    return render(request, "core/my_reports.html", context)
+
+
+@user_passes_test(is_admin)
+def admission_status_view(request):
+    """Admission control limits and current bucket levels (JSON)."""
+    return JsonResponse(admission_status(request))
+
+# -------------------------
+# STAFF ANALYTICS
+# -------------------------
+
+@user_passes_test(is_admin)
+@read_from_replica
+def analytics(request):
+    """Wait-time percentiles, hourly arrival rates and weekday x hour heatmaps."""
+    form = AnalyticsRangeForm(request.GET)
+    context = {"form": form, "numpy_missing": not analytics_data.numpy_available()}
+    if form.is_valid() and not context["numpy_missing"]:
+        result = analytics_data.get_analytics(form.cleaned_data["start"], form.cleaned_data["end"])
+        context.update({
+            "result": result,
+            "arrival_bars": analytics_data.arrival_bars(result),
+            "heatmaps": analytics_data.heatmap_tables(result),
+            "hours": range(24),
+        })
+    return render(request, "core/analytics.html", context)
+
+
+@user_passes_test(is_admin)
+@read_from_replica
+def analytics_export(request):
+    """The analytics page's data as JSON, for the same start/end parameters."""
+    form = AnalyticsRangeForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors.get_json_data()}, status=400)
+    if not analytics_data.numpy_available():
+        return JsonResponse({"error": "NumPy is not installed on this server."}, status=503)
+    return JsonResponse(analytics_data.get_analytics(form.cleaned_data["start"], form.cleaned_data["end"]))
+
+
+@user_passes_test(is_admin)
+@read_from_replica
+def capacity_planning(request):
+    """Simulated max_tokens / slot length recommendations per service."""
+    form = CapacityPlanForm(request.GET)
+    context = {"form": form, "numpy_missing": not analytics_data.numpy_available()}
+    if form.is_valid() and not context["numpy_missing"]:
+        context["plan"] = get_capacity_plan(form.cleaned_data["service"], form.cleaned_data["target_minutes"])
+    return render(request, "core/capacity_planning.html", context)
+
+# -------------------------
+# COUNTER CHECK-IN
+# -------------------------
+
+@user_passes_test(is_admin)
+def checkin_scanner(request):
+    """Counter page: scan token QR codes, verify them locally, complete them in batches."""
+    return render(request, "core/checkin_scanner.html", {
+        "batch_size": settings.CHECKIN_BATCH_SIZE,
+        "flush_seconds": settings.CHECKIN_FLUSH_SECONDS,
+    })
+
+@user_passes_test(is_admin)
+@require_GET
+def checkin_verify(request):
+    """Signature, counter and time-window check for one scan. Makes no queries."""
+    try:
+        token = verify_payload(request.GET.get("code", ""), service=request.GET.get("service") or None)
+    except CheckinError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True, **token})
+
+@user_passes_test(is_admin)
+def checkin_complete(request):
+    """
+    Complete a batch of scanned codes. Codes are verified again here, so the
+    scanner page is never trusted with token ids.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST a JSON body"}, status=405)
+    try:
+        body = json.loads(request.body)
+        codes = list(body["codes"])[:settings.CHECKIN_BATCH_SIZE]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected {\"codes\": [...]}"}, status=400)
+
+    results, verified = [], {}
+    for code in codes:
+        try:
+            token = verify_payload(code, service=body.get("service") or None)
+        except CheckinError as e:
+            results.append({"code": code, "status": "rejected", "error": str(e)})
+            continue
+        verified[code] = token
+    completed = set(complete_checkins([token["token_id"] for token in verified.values()]))
+    for code, token in verified.items():
+        results.append({
+            "code": code,
+            "number": token["number"],
+            "status": "completed" if token["token_id"] in completed else "already_updated",
+        })
+    return JsonResponse({"results": results, "completed": len(completed)})
+
+# -------------------------
+# STAFF PROFILING
+# -------------------------
+
+@user_passes_test(is_admin)
+def profiles(request):
+    """Slowest recently profiled requests, per URL name."""
+    return render(request, "core/profiles.html", {
+        "groups": profiling.slowest_by_url(),
+        "config": profiling.profiling_settings(),
+    })
+
+PROFILE_SORTS = ("cumulative", "tottime", "ncalls")
+
+@user_passes_test(is_admin)
+def profile_detail(request, profile_id):
+    meta = profiling.load_meta(profile_id)
+    if meta is None:
+        raise Http404("Profile not found (it may have rotated out)")
+    sort = request.GET.get("sort")
+    if sort not in PROFILE_SORTS:
+        sort = PROFILE_SORTS[0]
+    return render(request, "core/profile_detail.html", {
+        "sort": sort,
+        "sorts": PROFILE_SORTS,
+        "meta": meta,
+        "functions": profiling.top_functions(profile_id, sort=sort),
+        "query_origins": profiling.queries_by_origin(meta),
+    })
+
+@user_passes_test(is_admin)
+def profile_download(request, profile_id):
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise Http404("Profile not found (it may have rotated out)")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name, content_type="application/octet-stream")
+
+# -------------------------
+# STAFF SEARCH
+# -------------------------
+
+SEARCH_RESULTS_PER_SECTION = 20
+
+@user_passes_test(is_admin)
+def staff_search(request):
+    """Full-text search over users, the activity log and notifications (core/search.py)."""
+    query = request.GET.get("q", "").strip()
+    context = {"query": query}
+    if query:
+        started = time.perf_counter()
+        limit = SEARCH_RESULTS_PER_SECTION
+        context["users"] = list(search(User.objects.order_by("username"), query)[:limit])
+        context["activities"] = list(
+            search(ActivityLog.objects.select_related("user").order_by("-id"), query)[:limit]
+        )
+        context["notifications"] = list(
+            search(Notification.objects.select_related("user").order_by("-id"), query)[:limit]
+        )
+        context["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        context["limit"] = limit
+    return render(request, "core/staff_search.html", context)
@@ -0,0 +1,74 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+
+from .events import issue_token
+from .models import ActivityLog, QueueSlot, Token, WaitlistEntry
+
+
+def lock_slot(slot):
+    """
+    Take the slot's row lock before counting its seats, so concurrent
+    bookings of one slot run one after another instead of both passing the
+    check. The no-op UPDATE also makes SQLite take its write lock here,
+    where select_for_update() does nothing. Call inside a transaction.
+    """
+    QueueSlot.objects.filter(pk=slot.pk).update(max_tokens=F('max_tokens'))
+    slot.refresh_from_db(fields=['max_tokens'])
+
+
+def has_room(slot):
+    """A free seat and nobody already waiting for it. Call after lock_slot()."""
+    return slot.active_tokens_count() < slot.max_tokens and not slot.waitlist.exists()
+
+
+def join_waitlist(user, slot):
+    """Add the user to the slot's waitlist. Returns (entry, created)."""
+    try:
+        with transaction.atomic():
+            entry = WaitlistEntry.objects.create(slot=slot, user=user)
+    except IntegrityError:
+        return WaitlistEntry.objects.get(slot=slot, user=user), False
+
+    ActivityLog.objects.create(
+        user=user,
+        action='waitlist_joined',
+        message=f'Joined the waitlist for {slot}',
+        object_type='WaitlistEntry'
+    )
+    return entry, True
+
+
+def waitlist_position(entry):
+    return WaitlistEntry.objects.filter(slot_id=entry.slot_id, id__lte=entry.id).count()
+
+
+def with_positions(queryset):
+    """Annotate each entry with its 1-based position in its slot's waitlist."""
+    ahead = WaitlistEntry.objects.filter(
+        slot=OuterRef('slot'), id__lte=OuterRef('id')
+    ).values('slot').annotate(c=Count('id')).values('c')
+    return queryset.annotate(position=Subquery(ahead))
+
+
+def promote_next(slot):
+    """
+    Issue a token to the head of the slot's waitlist if the slot has room.
+
+    Must be called inside the transaction that freed the seat so the
+    promotion commits (or rolls back) together with it.
+    """
+    lock_slot(slot)
+    if slot.active_tokens_count() >= slot.max_tokens:
+        return None
+
+    for entry in slot.waitlist.select_for_update().select_related('user').order_by('id'):
+        # The user may have booked another slot for this service meanwhile.
+        if Token.objects.filter(user=entry.user, slot__service=slot.service, status="active").exists():
+            entry.delete()
+            continue
+
+        token = issue_token(slot, entry.user, source="waitlist")
+        entry.delete()
+        return token
+
+    return None
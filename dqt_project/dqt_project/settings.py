@@ -47,7 +47,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.AdmissionControlMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -59,13 +61,23 @@ TEMPLATES = [
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),  # Global templates directory
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Parse each template once per process; runserver's autoreloader
+            # still resets the cache when a template file changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.notifications',
+                'core.context_processors.layout_cache',
+                'core.context_processors.services',
             ],
         },
     },
@@ -81,9 +93,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Read-only copy used by reports and history views (see core/replica.py).
+    # Refresh it with `manage.py refresh_replica` or REPLICA_REFRESH_INTERVAL.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['core.replica.ReplicaRouter']
+
+# Reads fall back to the primary when the replica is older than this.
+REPLICA_MAX_LAG_SECONDS = 120
+# Seconds between in-process replica refreshes; None disables the refresher.
+REPLICA_REFRESH_INTERVAL = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,6 +151,15 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# collectstatic writes content-hashed names plus .gz/.br siblings; outside
+# DEBUG they are served by core.assets.serve_static with long-lived caching.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.assets.CompressedManifestStaticFilesStorage'},
+}
+STATIC_UNHASHED_MAX_AGE = 300  # seconds, for assets requested by their unhashed name
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -142,4 +179,138 @@ MESSAGE_TAGS = {
     messages.SUCCESS: 'success',
     messages.WARNING: 'warning',
     messages.ERROR: 'danger',
-}
\ No newline at end of file
+}
+
+# Token expiry
+# Active tokens are expired once their slot's end time plus this grace period has passed.
+TOKEN_EXPIRY_GRACE_MINUTES = 15
+TOKEN_EXPIRY_CHUNK_SIZE = 500
+# Seconds between in-process sweeps; None disables the scheduler (use `manage.py expire_tokens`).
+TOKEN_EXPIRY_SWEEP_INTERVAL = None
+
+# Idempotency keys
+# Stored responses for booking/staff POSTs are replayed for this long.
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Caches
+# Point 'default' at a shared backend (Redis/Memcached) in production so rate
+# limits apply across workers; admission control falls back to process memory.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Sessions are read from the cache and written through to the database, so a
+# cache miss (or restart) falls back to django_session instead of logging out.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Email or username sign-in. The per-request user comes from the cache only
+# when 'default' above is shared by every worker; with LocMemCache it is
+# loaded from the database, since other workers could not invalidate it.
+AUTHENTICATION_BACKENDS = ['core.backends.EmailBackend']
+AUTH_USER_CACHE_SECONDS = 5 * 60
+
+# Admission control for booking endpoints (see core/middleware.py).
+# Rates are requests per second; bursts are bucket sizes.
+ADMISSION_CONTROL = {
+    'VIEWS': ['book_token', 'book_service', 'book_library', 'book_canteen', 'book_canteen_seat'],
+    'METHODS': ['POST'],
+    'USER_RATE': 0.2,
+    'USER_BURST': 3,
+    'GLOBAL_RATE': 50.0,
+    'GLOBAL_BURST': 100,
+    'MAX_IN_FLIGHT': 8,
+    'CACHE_ALIAS': 'default',
+}
+
+# Canteen seat booking
+# Seats per time window per day; windows not listed use the default.
+CANTEEN_SLOT_CAPACITY = {
+    'default': 50,
+    '12:00-1:00': 80,
+    '1:00-2:00': 80,
+}
+# How many days ahead (including today) seats can be booked and shown
+CANTEEN_BOOKING_DAYS_AHEAD = 7
+CANTEEN_AVAILABILITY_CACHE_SECONDS = 30
+
+# Public display boards (/display/<service>/)
+# Snapshots are rebuilt at most once per tick, or sooner when the queue changes.
+DISPLAY_BOARD_TICK_SECONDS = 5
+
+# Notifications
+NOTIFICATIONS_PER_PAGE = 20
+# Default TTL for read notifications; per-type TTLs go in RETENTION below
+NOTIFICATION_READ_TTL_DAYS = 30
+
+# Retention for the activity log and read notifications (core/retention.py).
+# TTLs are days per action / notification_type; run `manage.py apply_retention`
+# from cron. Deleted rows are counted into DailyRollup first.
+RETENTION = {
+    'ACTIVITY_TTL_DAYS': {'default': 180, 'login': 30},
+    'NOTIFICATION_TTL_DAYS': {'system': 14},
+    'CHUNK_SIZE': 500,
+    'PAUSE_SECONDS': 0.1,
+    'ROLLUP': True,
+}
+
+# Change feed (core/changes.py): system/changes/?since=<cursor> returns the
+# tokens, slots and canteen bookings written after the cursor. Run
+# `manage.py compact_change_feed` from cron; readers idle for longer than
+# the retention window get a reset and reload in full.
+CHANGE_FEED_RETENTION_HOURS = 24
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_POLL_SECONDS = 5
+
+# Weighted fair dispatch across priority lanes and services (core/dispatch.py).
+# Lanes and services share desk time in proportion to their weights while they
+# have tokens waiting; MAX_WAIT_MINUTES caps how long any token waits behind them.
+DISPATCH = {
+    'LANE_WEIGHTS': {'priority': 3, 'standard': 1},
+    'SERVICE_WEIGHTS': {},
+    'MAX_WAIT_MINUTES': 30,
+}
+DISPATCH_PREVIEW_SIZE = 5
+
+# Template caching: {% cache %} fragments around the nav/footer and the home
+# page body, plus whole-page caching of anonymous pages (core/pagecache.py).
+LAYOUT_FRAGMENT_CACHE_SECONDS = 60 * 60
+PAGE_CACHE_SECONDS = 5 * 60
+
+# Token events
+# Seconds between background projector runs. None projects each request's
+# events right after it commits; set an interval to keep requests append-only
+# and run `manage.py project_events` or the in-process projector instead.
+TOKEN_EVENT_PROJECTION_INTERVAL = None
+
+# Staff analytics (core/analytics.py; needs NumPy)
+ANALYTICS_DEFAULT_DAYS = 90
+ANALYTICS_MAX_DAYS = 366
+ANALYTICS_CACHE_SECONDS = 10 * 60
+
+# Capacity planning simulator (core/simulation.py; needs NumPy)
+SIMULATION_HISTORY_DAYS = 90
+SIMULATION_P95_TARGET_MINUTES = 20
+SIMULATION_MAX_TOKENS = 60
+SIMULATION_REPLICATIONS = 500
+# Largest share of admitted tokens whose service may start after the slot ends
+SIMULATION_MAX_OVERRUN = 0.05
+
+# Request profiling (core/middleware.py ProfilingMiddleware, core/profiling.py).
+# Staff add ?profile=1 or an X-Profile: 1 header; profiles land in a ring
+# directory listed at /system/profiles/.
+PROFILING = {
+    'SAMPLE_EVERY': 0,
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_PROFILES': 200,
+}
+
+# Counter check-in (core/checkin.py). Token QR codes are valid from this many
+# minutes before their slot starts until this many minutes after it ends.
+CHECKIN_EARLY_MINUTES = 15
+CHECKIN_GRACE_MINUTES = 15
+# The scanner page sends completions in batches of up to this many codes,
+# or whatever it has every CHECKIN_FLUSH_SECONDS
+CHECKIN_BATCH_SIZE = 20
+CHECKIN_FLUSH_SECONDS = 2
@@ -0,0 +1,73 @@
+// Staff dashboard: poll the change feed and apply token deltas to the active-token table
+document.addEventListener('DOMContentLoaded', function() {
+    const root = document.getElementById('active-tokens');
+    if (!root) {
+        return;
+    }
+    const newTokens = document.getElementById('active-tokens-new');
+    const pollMs = parseInt(root.dataset.pollSeconds, 10) * 1000;
+    const statusClasses = {active: 'bg-primary', completed: 'bg-success', skipped: 'bg-danger', cancelled: 'bg-secondary'};
+    let cursor = root.dataset.cursor;
+    let added = 0;
+
+    function removeRow(row) {
+        row.classList.add('table-secondary');
+        setTimeout(() => row.remove(), 1500);
+    }
+
+    function applyTokens(tokens) {
+        for (const id of tokens.deleted) {
+            const row = root.querySelector(`tr[data-token-id="${id}"]`);
+            if (row) {
+                removeRow(row);
+            }
+        }
+        for (const token of tokens.upserted) {
+            const row = root.querySelector(`tr[data-token-id="${token.id}"]`);
+            if (!row) {
+                // New tokens need the server-rendered action forms; offer a refresh
+                if (token.status === 'active') {
+                    added += 1;
+                }
+                continue;
+            }
+            if (token.status === 'active' || token.status === 'pending') {
+                continue;
+            }
+            const badge = row.children[3].querySelector('.badge');
+            badge.className = `badge ${statusClasses[token.status] || 'bg-dark'}`;
+            badge.textContent = token.status.charAt(0).toUpperCase() + token.status.slice(1);
+            removeRow(row);
+        }
+        if (added) {
+            newTokens.textContent = `${added} new token${added === 1 ? '' : 's'} - refresh`;
+            newTokens.classList.remove('d-none');
+        }
+    }
+
+    async function poll() {
+        try {
+            const response = await fetch(`${root.dataset.changesUrl}?since=${encodeURIComponent(cursor)}`, {credentials: 'same-origin'});
+            if (response.ok) {
+                const feed = await response.json();
+                if (feed.reset) {
+                    window.location.reload();
+                    return;
+                }
+                cursor = feed.cursor;
+                if (feed.changes.token) {
+                    applyTokens(feed.changes.token);
+                }
+                if (feed.more) {
+                    setTimeout(poll, 0);
+                    return;
+                }
+            }
+        } catch (error) {
+            // Offline for a moment; try again on the next tick
+        }
+        setTimeout(poll, pollMs);
+    }
+
+    setTimeout(poll, pollMs);
+});
@@ -0,0 +1,96 @@
+// Counter check-in: verify each scan at once, complete verified codes in batches
+document.addEventListener('DOMContentLoaded', function() {
+    const root = document.getElementById('checkin');
+    const csrfToken = root.querySelector('[name=csrfmiddlewaretoken]').value;
+    const service = document.getElementById('checkin-service');
+    const input = document.getElementById('checkin-code');
+    const log = document.getElementById('checkin-log');
+    const pendingCount = document.getElementById('checkin-pending');
+    const batchSize = parseInt(root.dataset.batchSize, 10);
+    const recent = new Map();  // code -> time last seen, to ignore camera re-reads
+    let pending = [];
+    let flushing = false;
+
+    function addLine(text, kind) {
+        const item = document.createElement('li');
+        item.className = `list-group-item list-group-item-${kind}`;
+        item.textContent = `${new Date().toLocaleTimeString()}  ${text}`;
+        log.prepend(item);
+        while (log.children.length > 50) {
+            log.lastChild.remove();
+        }
+    }
+
+    async function scan(code) {
+        code = code.trim();
+        const now = Date.now();
+        if (!code || now - (recent.get(code) || 0) < 5000) {
+            return;
+        }
+        recent.set(code, now);
+        const params = new URLSearchParams({code: code, service: service.value});
+        const response = await fetch(`${root.dataset.verifyUrl}?${params}`, {credentials: 'same-origin'});
+        const result = await response.json();
+        if (!result.ok) {
+            addLine(result.error, 'danger');
+            return;
+        }
+        addLine(`Token #${result.number} verified`, 'info');
+        pending.push(code);
+        pendingCount.textContent = pending.length;
+        if (pending.length >= batchSize) {
+            flush();
+        }
+    }
+
+    async function flush() {
+        if (flushing || !pending.length) {
+            return;
+        }
+        flushing = true;
+        const batch = pending.splice(0, batchSize);
+        pendingCount.textContent = pending.length;
+        try {
+            const response = await fetch(root.dataset.completeUrl, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken},
+                body: JSON.stringify({codes: batch, service: service.value}),
+            });
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            const body = await response.json();
+            body.results.forEach(result => {
+                if (result.status === 'completed') {
+                    addLine(`Token #${result.number} completed`, 'success');
+                } else if (result.status === 'already_updated') {
+                    addLine(`Token #${result.number} was already completed or cancelled`, 'warning');
+                } else {
+                    addLine(result.error, 'danger');
+                }
+            });
+        } catch (error) {
+            // Keep the codes and retry with the next flush
+            pending = batch.concat(pending);
+            pendingCount.textContent = pending.length;
+            addLine(`Could not send completions (${error.message}); retrying`, 'danger');
+        } finally {
+            flushing = false;
+        }
+    }
+
+    input.addEventListener('keydown', event => {
+        if (event.key === 'Enter') {
+            event.preventDefault();
+            scan(input.value);
+            input.value = '';
+        }
+    });
+    setInterval(flush, parseFloat(root.dataset.flushSeconds) * 1000);
+    window.addEventListener('beforeunload', flush);
+
+    if (window.Html5QrcodeScanner) {
+        new Html5QrcodeScanner('checkin-camera', {fps: 10, qrbox: 240}, false).render(scan);
+    }
+});
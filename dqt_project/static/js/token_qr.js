@@ -0,0 +1,11 @@
+// Draw each active token's signed check-in code as a QR code
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.token-qr[data-code]').forEach(el => {
+        new QRCode(el, {
+            text: el.dataset.code,
+            width: 112,
+            height: 112,
+            correctLevel: QRCode.CorrectLevel.M,
+        });
+    });
+});